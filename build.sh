@@ -1 +1,2 @@
-pyinstaller src/lagrangepointgui/sim_gui.py --noconfirm --noconsole --add-data 'src/lagrangepointgui/default_presets.toml:.'
+python -m src.lagrangepointsimulator.aot_build
+pyinstaller src/lagrangepointgui/sim_gui.py --noconfirm --hidden-import src.lagrangepointsimulator._aot_kernels --noconsole --add-data 'src/lagrangepointgui/default_presets.toml:.'
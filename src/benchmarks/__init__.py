@@ -0,0 +1 @@
+"""Benchmark suite for both packages. Run it from the repository root with: python -m src.benchmarks.suite"""
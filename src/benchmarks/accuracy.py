@@ -0,0 +1,342 @@
+"""Measures the accuracy of the integrators against golden trajectories of the presets and records work-precision
+data: the runtime of each integrator and time step against its errors.
+Run it from the repository root with: python -m src.benchmarks.accuracy
+
+Each preset is simulated for NUM_ORBITS orbits of its planet with time steps that give a power of 2 steps per orbit.
+The golden trajectories are extrapolated from two simulations with much smaller time steps.
+They're stored in benchmark_results/golden and only computed again if a preset or the settings change.
+
+Each run is written to benchmark_results/accuracy_latest.json. If a baseline exists the script exits with a non-zero
+status when any error grew by more than the threshold, so an optimization can be shown not to cost accuracy.
+Use --save-baseline to store the results of a run as the new baseline.
+"""
+import argparse
+import json
+import sys
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.benchmarks.suite import RESULTS_DIR, Record, environment_info
+from src.lagrangepointgui.cli import Job, preset_job
+from src.lagrangepointgui.presets import read_presets
+from src.lagrangepointsimulator.constants import AU, HOURS, YEARS
+from src.lagrangepointsimulator.simulator import POSITION_AND_VELOCITY_NAMES, Simulator
+from src.lagrangepointsimulator.warmup import kernel_warmup
+
+FORMAT_VERSION = 1
+
+GOLDEN_DIR_NAME = "golden"
+
+NUM_ORBITS = 10
+
+# the states are compared with the golden trajectory this many times per orbit
+SAMPLES_PER_ORBIT = 8
+
+STEPS_PER_ORBIT = tuple(2**exponent for exponent in range(6, 14))
+
+# the golden trajectory is extrapolated from simulations with this many times as many steps per orbit
+# as the most in STEPS_PER_ORBIT, and twice as many
+GOLDEN_REFINEMENT = 8
+
+NUM_REPEATS = 3
+
+# maximum allowed relative increase in an error compared to the baseline
+DEFAULT_THRESHOLD = 0.01
+
+# increases in the errors smaller than this, in AU, are ignored since they're at the level of rounding error
+ABSOLUTE_TOLERANCE = 1e-12
+
+# the default largest final error of the satellite's position, in AU, used to suggest a time step for each preset
+DEFAULT_TOLERANCE = 1e-4
+
+
+def simulate_fastmath(sim: Simulator) -> None:
+    sim.kernel_variant = "fastmath"
+    sim.simulate()
+
+
+def simulate_recording_float32(sim: Simulator) -> None:
+    sim.record_dtype = "float32"
+    sim.simulate()
+
+
+# integrator name: function which simulates a Simulator with it.
+# the variants integrate the same way in double precision, so their errors should match the precise integrator's
+# down to the rounding errors that fastmath and recording in single precision add
+INTEGRATORS: dict[str, Callable[[Simulator], object]] = {
+    "drift_kick_drift": Simulator.simulate,
+    "drift_kick_drift_fastmath": simulate_fastmath,
+    "drift_kick_drift_float32": simulate_recording_float32,
+}
+
+
+def configure(params: dict[str, Any], steps_per_orbit: int) -> Simulator:
+    """Returns a Simulator with params whose time step gives steps_per_orbit steps per orbit of the planet
+    and which simulates NUM_ORBITS orbits.
+    """
+    sim = Simulator()
+
+    for attribute_name, value in params.items():
+        setattr(sim, attribute_name, value)
+
+    sim.time_step = sim.orbital_period / steps_per_orbit / HOURS
+
+    num_steps = NUM_ORBITS * steps_per_orbit
+    # slightly less than the exact time so that rounding error can't add a step
+    sim.num_years = num_steps * sim.time_step_in_seconds / YEARS * (1 - 1e-12)
+
+    if sim.num_steps != num_steps:
+        msg = f"Expected {num_steps} steps but the simulator has {sim.num_steps}."
+        raise RuntimeError(msg)
+
+    return sim
+
+
+def sample_states(sim: Simulator, steps_per_orbit: int) -> NDArray[np.double]:
+    """Returns the positions and velocities of a simulated Simulator configured with steps_per_orbit
+    at SAMPLES_PER_ORBIT times per orbit, with shape (number of samples, 6, 3).
+    """
+    stride = steps_per_orbit // SAMPLES_PER_ORBIT
+
+    return np.stack([getattr(sim, name)[::stride] for name in POSITION_AND_VELOCITY_NAMES], axis=1)
+
+
+def compute_golden_trajectory(params: dict[str, Any]) -> NDArray[np.double]:
+    """Returns the sampled states of the orbit defined by params, extrapolated from two simulations
+    whose time steps differ by a factor of 2. The integrator is symmetric so its error only has even powers
+    of the time step, and Richardson extrapolation removes the leading, second order, term.
+    """
+    steps_per_orbit = max(STEPS_PER_ORBIT) * GOLDEN_REFINEMENT
+
+    samples = []
+    for refinement in (1, 2):
+        sim = configure(params, refinement * steps_per_orbit)
+        sim.simulate()
+
+        samples.append(sample_states(sim, refinement * steps_per_orbit))
+
+    coarse, fine = samples
+
+    return (4 * fine - coarse) / 3
+
+
+def golden_trajectory(job: Job, golden_dir: Path) -> NDArray[np.double]:
+    """Returns the golden trajectory of job, loading it from golden_dir if it was computed with the same parameters
+    and settings and computing and saving it otherwise.
+    """
+    metadata = {
+        "version": FORMAT_VERSION,
+        "params": job.params,
+        "num_orbits": NUM_ORBITS,
+        "samples_per_orbit": SAMPLES_PER_ORBIT,
+        "steps_per_orbit": max(STEPS_PER_ORBIT) * GOLDEN_REFINEMENT,
+    }
+
+    path = golden_dir / f"{_file_name(job.name)}.npz"
+
+    if path.exists():
+        with np.load(path, allow_pickle=False) as file:
+            if json.loads(str(file["metadata"])) == metadata:
+                return file["states"]
+
+    states = compute_golden_trajectory(job.params)
+
+    golden_dir.mkdir(parents=True, exist_ok=True)
+    with Path.open(path, "wb") as file:
+        np.savez(file, metadata=np.array(json.dumps(metadata)), states=states)
+
+    return states
+
+
+def _file_name(name: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_" else "_" for char in name)
+
+
+def measure(
+    params: dict[str, Any],
+    integrator: Callable[[Simulator], object],
+    steps_per_orbit: int,
+    golden: NDArray[np.double],
+) -> dict[str, float]:
+    """Returns the best runtime of simulating params with integrator and steps_per_orbit,
+    the final and largest errors of the satellite's position, in AU,
+    and the largest relative changes in the satellite's Jacobi constant and the total energy.
+    """
+    sim = configure(params, steps_per_orbit)
+
+    seconds = np.inf
+    for _ in range(NUM_REPEATS):
+        start = perf_counter()
+        integrator(sim)
+        seconds = min(seconds, perf_counter() - start)
+
+    sat_pos_index = POSITION_AND_VELOCITY_NAMES.index("sat_pos")
+    sat_pos_error = np.linalg.norm(
+        sample_states(sim, steps_per_orbit)[:, sat_pos_index] - golden[:, sat_pos_index],
+        axis=1,
+    )
+
+    total_energy = sim.calc_total_energy()
+
+    return {
+        "time_step": sim.time_step,
+        "num_steps": sim.num_steps,
+        "seconds": seconds,
+        "final_position_error": float(sat_pos_error[-1]) / AU,
+        "max_position_error": float(sat_pos_error.max()) / AU,
+        "jacobi_max_relative_change": sim.calc_jacobi_drift()["max_relative_change"],
+        "energy_max_relative_change": float(np.abs(total_energy / total_energy[0] - 1).max()),
+    }
+
+
+def run_harness(jobs: list[Job], integrator_names: list[str], golden_dir: Path) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+
+    for job in jobs:
+        golden = golden_trajectory(job, golden_dir)
+
+        for integrator_name in integrator_names:
+            for steps_per_orbit in STEPS_PER_ORBIT:
+                name = f"{job.name}/{integrator_name}/{steps_per_orbit}"
+                result = measure(job.params, INTEGRATORS[integrator_name], steps_per_orbit, golden)
+                results[name] = result
+
+                print(
+                    f"{name}: {result['seconds'] * 1e3:.3f} ms, final error {result['final_position_error']:.3e} AU, "
+                    f"Jacobi drift {result['jacobi_max_relative_change']:.3e}",
+                )
+
+    return results
+
+
+def make_record(results: dict[str, dict[str, float]]) -> Record:
+    return {
+        "version": FORMAT_VERSION,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "environment": environment_info(),
+        "settings": {
+            "num_orbits": NUM_ORBITS,
+            "samples_per_orbit": SAMPLES_PER_ORBIT,
+            "golden_refinement": GOLDEN_REFINEMENT,
+        },
+        "results": results,
+    }
+
+
+def find_accuracy_regressions(record: Record, baseline: Record, threshold: float) -> list[str]:
+    """Returns the names of the runs whose final or largest position error grew by more than threshold
+    relative to the baseline, ignoring increases smaller than ABSOLUTE_TOLERANCE.
+    """
+    regressions: list[str] = []
+
+    for name, result in record["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name}: not in baseline")
+            continue
+
+        for error_name in ("final_position_error", "max_position_error"):
+            error = result[error_name]
+            baseline_error = baseline["results"][name][error_name]
+
+            if error > baseline_error * (1 + threshold) and error - baseline_error > ABSOLUTE_TOLERANCE:
+                print(f"{name}: {error_name} {baseline_error:.3e} -> {error:.3e} AU REGRESSION")
+                regressions.append(name)
+                break
+
+    return regressions
+
+
+def suggest_time_steps(record: Record, tolerance: float) -> dict[str, float | None]:
+    """Returns the largest time step, in hours, of each preset and integrator whose final position error
+    is at most tolerance, or None if none of them are accurate enough.
+    """
+    suggestions: dict[str, float | None] = {}
+
+    for name, result in record["results"].items():
+        preset_and_integrator = name.rsplit("/", 1)[0]
+        suggestions.setdefault(preset_and_integrator, None)
+
+        if result["final_position_error"] <= tolerance:
+            suggestion = suggestions[preset_and_integrator]
+            suggestions[preset_and_integrator] = max(result["time_step"], suggestion or 0.0)
+
+    return suggestions
+
+
+def load_record(path: Path) -> Record | None:
+    try:
+        with Path.open(path) as file:
+            record: Record = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    if record.get("version") != FORMAT_VERSION:
+        msg = f"{path} has format version {record.get('version')}, expected {FORMAT_VERSION}."
+        raise ValueError(msg)
+
+    return record
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", action="append", help="only run this preset, can be repeated")
+    parser.add_argument("--integrator", action="append", choices=INTEGRATORS, help="only run this integrator")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative error increase")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="final position error in AU used to suggest a time step for each preset",
+    )
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--baseline", type=Path, help="defaults to accuracy_baseline.json in the results directory")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    presets, _ = read_presets()
+    try:
+        jobs = [preset_job(name, presets) for name in args.preset or presets]
+    except ValueError as e:
+        parser.error(str(e))
+
+    kernel_warmup.run()
+
+    record = make_record(run_harness(jobs, args.integrator or list(INTEGRATORS), args.results_dir / GOLDEN_DIR_NAME))
+
+    args.results_dir.mkdir(parents=True, exist_ok=True)
+    with Path.open(args.results_dir / "accuracy_latest.json", "w") as file:
+        json.dump(record, file, indent=2)
+
+    print(f"\nLargest time steps with a final position error of at most {args.tolerance:g} AU:")
+    for name, time_step in suggest_time_steps(record, args.tolerance).items():
+        print(f"{name}: {'none' if time_step is None else f'{time_step:.4g} hours'}")
+
+    baseline_path: Path = args.baseline or args.results_dir / "accuracy_baseline.json"
+
+    if args.save_baseline:
+        with Path.open(baseline_path, "w") as file:
+            json.dump(record, file, indent=2)
+
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if (baseline := load_record(baseline_path)) is None:
+        print(f"No baseline found at {baseline_path}. Run with --save-baseline to create one.")
+        return
+
+    print(f"\nCompared to baseline from {baseline['timestamp']}:")
+    if regressions := find_accuracy_regressions(record, baseline, args.threshold):
+        print(f"{len(regressions)} run(s) lost accuracy by more than {args.threshold:.0%}.")
+        sys.exit(1)
+
+    print("No run lost accuracy.")
+
+
+if __name__ == "__main__":
+    main()
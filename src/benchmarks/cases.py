@@ -0,0 +1,265 @@
+"""The benchmarks run by the suite. Importing this module registers them."""
+import os
+import tempfile
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from src.benchmarks.registry import BenchmarkSkippedError, benchmark, register
+from src.lagrangepointsimulator import Simulator
+from src.lagrangepointsimulator.constants import HOURS, YEARS
+from src.lagrangepointsimulator.storage import BYTES_PER_ROW
+
+NUM_STEPS = (10**4, 10**5, 10**6)
+
+# size of the simulations used by the benchmarks that don't vary the number of steps
+DEFAULT_NUM_STEPS = 10**6
+
+# number of times the states are interpolated at, the most the plotter interpolates
+MAX_INTERPOLATED_TIMES = 10**5
+
+
+def _num_years(num_steps: int) -> float:
+    """Returns the number of years which gives num_steps steps with the default time step."""
+    return num_steps * Simulator().time_step_in_seconds / YEARS
+
+
+def _simulated(num_steps: int = DEFAULT_NUM_STEPS) -> Simulator:
+    sim = Simulator(num_years=_num_years(num_steps))
+    sim.simulate()
+
+    return sim
+
+
+def _simulate_reusing_arrays(num_steps: int) -> Callable[[], object]:
+    return _simulated(num_steps).simulate
+
+
+def _simulate_reallocating_arrays(num_steps: int) -> Callable[[], object]:
+    sim = _simulated(num_steps)
+
+    # alternating between simulations which differ by one step forces the arrays to be reallocated every time
+    years = (_num_years(num_steps), _num_years(num_steps) + HOURS / YEARS)
+
+    def simulate() -> None:
+        sim.num_years = years[sim.num_years == years[0]]
+        sim.simulate()
+
+    return simulate
+
+
+for _num_steps in NUM_STEPS:
+    register(f"simulate/reuse/{_num_steps:.0e}", partial(_simulate_reusing_arrays, _num_steps))
+    register(f"simulate/reallocate/{_num_steps:.0e}", partial(_simulate_reallocating_arrays, _num_steps))
+
+
+@benchmark(f"simulate/decimated/{DEFAULT_NUM_STEPS:.0e}")
+def _simulate_decimated() -> Callable[[], object]:
+    sim = Simulator(num_years=_num_years(DEFAULT_NUM_STEPS))
+    # a budget of about 1% of the full arrays stores every 100th step
+    sim.memory_budget = DEFAULT_NUM_STEPS * BYTES_PER_ROW // 100
+    sim.simulate()
+
+    return sim.simulate
+
+
+def _simulate_with(**attributes: str) -> Callable[[], object]:
+    sim = Simulator(num_years=_num_years(DEFAULT_NUM_STEPS))
+    for attribute_name, value in attributes.items():
+        setattr(sim, attribute_name, value)
+
+    sim.simulate()
+
+    return sim.simulate
+
+
+register(f"simulate/float32/{DEFAULT_NUM_STEPS:.0e}", partial(_simulate_with, record_dtype="float32"))
+register(f"simulate/contiguous/{DEFAULT_NUM_STEPS:.0e}", partial(_simulate_with, layout="contiguous"))
+register(f"simulate/fastmath/{DEFAULT_NUM_STEPS:.0e}", partial(_simulate_with, kernel_variant="fastmath"))
+
+
+@benchmark(f"states_at/{MAX_INTERPOLATED_TIMES:.0e}")
+def _states_at() -> Callable[[], object]:
+    sim = Simulator(num_years=_num_years(DEFAULT_NUM_STEPS))
+    sim.output_stride = 100
+    sim.simulate()
+
+    return partial(sim.states_at, np.linspace(0, sim.sim_time, MAX_INTERPOLATED_TIMES))
+
+
+@benchmark(f"transform_to_corotating/{DEFAULT_NUM_STEPS:.0e}")
+def _transform_to_corotating() -> Callable[[], object]:
+    sim = _simulated()
+
+    return partial(sim.transform_to_corotating, sim.sat_pos)
+
+
+@benchmark("transform_to_corotating/1e+03")
+def _transform_short_run_to_corotating() -> Callable[[], object]:
+    # short enough that the serial variant is used
+    sim = _simulated(10**3)
+
+    return partial(sim.transform_to_corotating, sim.sat_pos)
+
+
+@benchmark("dispatch/calibrate")
+def _calibrate_dispatch() -> Callable[[], object]:
+    from src.lagrangepointsimulator.dispatch import calibrate
+
+    return calibrate
+
+
+@benchmark(f"calc_conserved_quantities/{DEFAULT_NUM_STEPS:.0e}")
+def _calc_conserved_quantities() -> Callable[[], object]:
+    return _simulated().calc_conserved_quantities
+
+
+@benchmark(f"calc_jacobi_constant/{DEFAULT_NUM_STEPS:.0e}")
+def _calc_jacobi_constant() -> Callable[[], object]:
+    return _simulated().calc_jacobi_constant
+
+
+@benchmark("choose_time_step/default")
+def _choose_time_step() -> Callable[[], object]:
+    return Simulator().choose_time_step
+
+
+@benchmark("presets/read_presets")
+def _read_presets() -> Callable[[], object]:
+    from src.lagrangepointgui.presets import read_presets
+
+    return read_presets
+
+
+@benchmark("presets/safe_eval")
+def _safe_eval() -> Callable[[], object]:
+    from src.lagrangepointgui.safe_eval import safe_eval
+
+    return partial(safe_eval, "sun_mass / 25 + 2 * jupiter_mass")
+
+
+@benchmark("ensemble/100_samples/1e+05")
+def _run_ensemble() -> Callable[[], object]:
+    from src.lagrangepointsimulator.ensemble import InitialConditionSpread, run_ensemble
+
+    sim = Simulator(num_years=_num_years(10**5), perturbation_size=0.01)
+    spread = InitialConditionSpread(perturbation_size=0.001, speed=1e-4)
+
+    return partial(run_ensemble, sim, spread, 100, seed=0)
+
+
+@benchmark("poincare_section/1e+06")
+def _poincare_section() -> Callable[[], object]:
+    from src.lagrangepointsimulator.poincare import compute_poincare_section
+
+    sim = Simulator(num_years=_num_years(10**6), perturbation_size=0.05)
+
+    return partial(compute_poincare_section, sim)
+
+
+@benchmark("events/1e+06")
+def _find_events() -> Callable[[], object]:
+    from src.lagrangepointsimulator.events import find_events
+
+    sim = Simulator(num_years=_num_years(10**6), perturbation_size=0.05)
+
+    return partial(find_events, sim)
+
+
+# removed when the suite exits
+_temp_dirs: list[tempfile.TemporaryDirectory[str]] = []
+
+
+def _temp_path(file_name: str) -> Path:
+    temp_dir = tempfile.TemporaryDirectory()
+    _temp_dirs.append(temp_dir)
+
+    return Path(temp_dir.name) / file_name
+
+
+def _save_run(*, compress: bool) -> Callable[[], object]:
+    from src.lagrangepointsimulator.trajectory_io import save_run
+
+    sim = _simulated()
+    path = _temp_path("run.npz")
+
+    return partial(save_run, sim, path, compress=compress)
+
+
+def _load_run(*, compress: bool) -> Callable[[], object]:
+    from src.lagrangepointsimulator.trajectory_io import load_run, save_run
+
+    path = _temp_path("run.npz")
+    save_run(_simulated(), path, compress=compress)
+
+    return partial(load_run, path)
+
+
+for _compress, _label in ((True, "compressed"), (False, "uncompressed")):
+    register(f"trajectory_io/save_run/{_label}/{DEFAULT_NUM_STEPS:.0e}", partial(_save_run, compress=_compress))
+    register(f"trajectory_io/load_run/{_label}/{DEFAULT_NUM_STEPS:.0e}", partial(_load_run, compress=_compress))
+
+
+# kept alive for the lifetime of the suite once created
+_qt_app: object = None
+
+
+@benchmark(f"plotter/prepare_orbit_data/{DEFAULT_NUM_STEPS:.0e}")
+def _prepare_orbit_data() -> Callable[[], object]:
+    global _qt_app  # noqa: PLW0603
+
+    try:
+        from PyQt6.QtWidgets import QApplication
+
+        from src.lagrangepointgui.orbit_plotter import Plotter, decimate_orbit
+    except ImportError as e:
+        msg = f"GUI dependencies are not installed: {e}"
+        raise BenchmarkSkippedError(msg) from e
+
+    # the plots are never shown so no display is needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _qt_app = QApplication.instance() or QApplication([])
+
+    plotter = Plotter(_simulated())
+
+    def prepare_orbit_data() -> None:
+        arr_step = plotter.array_step()
+        inertial = (plotter.sim.star_pos, plotter.sim.planet_pos, plotter.sim.sat_pos)
+
+        for arr in inertial + plotter.calc_corotating_positions():
+            decimate_orbit(arr, arr_step)
+
+    return prepare_orbit_data
+
+
+@benchmark("plotter/ensemble_overlay/1000_samples")
+def _plot_ensemble_overlay() -> Callable[[], object]:
+    global _qt_app  # noqa: PLW0603
+
+    try:
+        from PyQt6.QtWidgets import QApplication
+
+        from src.lagrangepointgui.orbit_plotter import Plotter
+    except ImportError as e:
+        msg = f"GUI dependencies are not installed: {e}"
+        raise BenchmarkSkippedError(msg) from e
+
+    from src.lagrangepointsimulator.ensemble import InitialConditionSpread, run_ensemble
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _qt_app = QApplication.instance() or QApplication([])
+
+    sim = Simulator(num_years=_num_years(10**5), perturbation_size=0.01)
+    spread = InitialConditionSpread(perturbation_size=0.001, speed=1e-4)
+    stats = run_ensemble(sim, spread, 1000, seed=0, keep_trajectories=True)
+    groups = np.arange(1000) % 4
+
+    plotter = Plotter(sim)
+
+    def plot_ensemble_overlay() -> None:
+        plotter.plot_ensemble_overlay(stats, groups)
+        plotter.timer.timeout.emit()
+
+    return plot_ensemble_overlay
@@ -0,0 +1,31 @@
+"""Holds the registry of benchmarks run by the suite."""
+from collections.abc import Callable
+from typing import TypeAlias
+
+# A benchmark's setup function does any expensive preparation and returns the function to be timed.
+BenchmarkSetup: TypeAlias = Callable[[], Callable[[], object]]
+
+# benchmark name: setup function
+BENCHMARKS: dict[str, BenchmarkSetup] = {}
+
+
+class BenchmarkSkippedError(Exception):
+    """Raised by a setup function when its benchmark can't be run, e.g. because an optional dependency is missing."""
+
+
+def register(name: str, setup: BenchmarkSetup) -> None:
+    if name in BENCHMARKS:
+        msg = f"A benchmark named '{name}' is already registered."
+        raise ValueError(msg)
+
+    BENCHMARKS[name] = setup
+
+
+def benchmark(name: str) -> Callable[[BenchmarkSetup], BenchmarkSetup]:
+    """Decorator which registers a setup function under name."""
+
+    def decorator(setup: BenchmarkSetup) -> BenchmarkSetup:
+        register(name, setup)
+        return setup
+
+    return decorator
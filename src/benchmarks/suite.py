@@ -0,0 +1,201 @@
+"""Runs the benchmarks in cases.py, records the results, and compares them against a baseline.
+Run it from the repository root with: python -m src.benchmarks.suite
+
+Each run is written to benchmark_results/latest.json and appended to benchmark_results/history.jsonl.
+If a baseline exists the script exits with a non-zero status when any benchmark is slower than
+the baseline by more than the threshold. Use --save-baseline to store the results of a run as the new baseline.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from statistics import median
+from timeit import Timer
+from typing import Any, TypeAlias
+
+import src.benchmarks.cases  # noqa: F401  registers the benchmarks
+from src.benchmarks.registry import BENCHMARKS, BenchmarkSkippedError
+
+FORMAT_VERSION = 1
+
+RESULTS_DIR = Path("benchmark_results")
+
+# maximum allowed relative slowdown compared to the baseline
+DEFAULT_THRESHOLD = 0.2
+
+NUM_REPEATS = 5
+
+Record: TypeAlias = dict[str, Any]
+
+
+@dataclass
+class BenchmarkResult:
+    # seconds per call
+    best: float
+    median: float
+    calls_per_repeat: int
+    repeats: int
+
+
+def run_benchmark(name: str) -> BenchmarkResult:
+    func = BENCHMARKS[name]()
+
+    # the first call compiles kernels and fills caches
+    func()
+
+    timer = Timer(func)
+    calls_per_repeat, _ = timer.autorange()
+    times = [total / calls_per_repeat for total in timer.repeat(repeat=NUM_REPEATS, number=calls_per_repeat)]
+
+    return BenchmarkResult(min(times), median(times), calls_per_repeat, NUM_REPEATS)
+
+
+def run_suite(name_filter: str = "") -> dict[str, BenchmarkResult]:
+    results: dict[str, BenchmarkResult] = {}
+
+    for name in BENCHMARKS:
+        if name_filter not in name:
+            continue
+
+        try:
+            results[name] = run_benchmark(name)
+        except BenchmarkSkippedError as e:
+            print(f"{name}: skipped, {e}")
+            continue
+
+        print(f"{name}: {_format_seconds(results[name].best)}")
+
+    return results
+
+
+def environment_info() -> dict[str, str]:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+    for module_name in ("numpy", "numba"):
+        module = sys.modules.get(module_name)
+        info[module_name] = getattr(module, "__version__", "not imported")
+
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S603, S607
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["commit"] = "unknown"
+
+    return info
+
+
+def make_record(results: dict[str, BenchmarkResult]) -> Record:
+    return {
+        "version": FORMAT_VERSION,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "environment": environment_info(),
+        "results": {name: asdict(result) for name, result in results.items()},
+    }
+
+
+def save_record(record: Record, results_dir: Path) -> None:
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    with Path.open(results_dir / "latest.json", "w") as file:
+        json.dump(record, file, indent=2)
+
+    with Path.open(results_dir / "history.jsonl", "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def load_record(path: Path) -> Record | None:
+    try:
+        with Path.open(path) as file:
+            record: Record = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    if record.get("version") != FORMAT_VERSION:
+        msg = f"{path} has format version {record.get('version')}, expected {FORMAT_VERSION}."
+        raise ValueError(msg)
+
+    return record
+
+
+def find_regressions(record: Record, baseline: Record, threshold: float) -> list[str]:
+    """Prints the change of each benchmark relative to the baseline
+    and returns the names of the benchmarks which slowed down by more than threshold.
+    """
+    regressions: list[str] = []
+
+    for name, result in record["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name}: not in baseline")
+            continue
+
+        ratio = result["best"] / baseline["results"][name]["best"]
+
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+
+        status = "REGRESSION" if regressed else "ok"
+        print(f"{name}: {ratio - 1:+.1%} {status}")
+
+    return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+
+    return f"{seconds / 1e-9:.3f} ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown")
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--baseline", type=Path, help="defaults to baseline.json in the results directory")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    baseline_path: Path = args.baseline or args.results_dir / "baseline.json"
+
+    record = make_record(run_suite(args.filter))
+    save_record(record, args.results_dir)
+
+    if args.save_baseline:
+        with Path.open(baseline_path, "w") as file:
+            json.dump(record, file, indent=2)
+
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if (baseline := load_record(baseline_path)) is None:
+        print(f"No baseline found at {baseline_path}. Run with --save-baseline to create one.")
+        return
+
+    print(f"\nCompared to baseline from {baseline['timestamp']}:")
+    if regressions := find_regressions(record, baseline, args.threshold):
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
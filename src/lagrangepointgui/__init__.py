@@ -1 +1,21 @@
-from src.lagrangepointgui.orbit_plotter import Plotter
+"""GUI for the Lagrange point simulator.
+Plotter is imported on first access so that the modules which don't need Qt, such as presets and safe_eval,
+can be imported without it.
+"""
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from src.lagrangepointgui.orbit_plotter import Plotter  # noqa: TCH004
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    if name == "Plotter":
+        from src.lagrangepointgui.orbit_plotter import Plotter
+
+        return Plotter
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+__all__ = ["Plotter"]
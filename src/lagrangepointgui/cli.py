@@ -0,0 +1,388 @@
+"""Command-line batch runner which simulates presets or parameter files without the GUI.
+It doesn't import Qt so it can be used on machines without the GUI dependencies.
+
+Examples, run from the repository root:
+    python -m src.lagrangepointgui.cli --list-presets
+    python -m src.lagrangepointgui.cli --preset "Sun Jupiter" --preset "Earth Moon" --num-years 100
+    python -m src.lagrangepointgui.cli --all-presets --workers 8 --trajectories --output-dir results
+    python -m src.lagrangepointgui.cli --preset "Sun Jupiter" --num-years 1000 --time-step auto
+
+A parameter file is a TOML file with the same format as a single preset. Its keys can be either the labels used
+in the GUI or the attribute names of the Simulator class, and it can list presets to use as bases:
+    bases = ["Sun Earth"]
+    num_years = 50
+    perturbation_size = 0.01
+    speed = "1 + 1e-3"
+
+For each simulation a JSON summary is written to the output directory
+and, with --trajectories, the run is also saved with trajectory_io.save_run
+so that it can be loaded in the GUI, using Load Run, or with trajectory_io.load_run without simulating it again.
+
+With --checkpoint-dir, each simulation periodically saves a checkpoint there. Running the same command again
+resumes unfinished simulations from their checkpoints and skips the ones that finished.
+The summary of a resumed simulation only covers the steps after the checkpoint.
+
+With --time-step auto, the time step of each simulation is chosen by Simulator.choose_time_step as the largest one
+whose short pilot simulations change the satellite's Jacobi constant by at most --time-step-tolerance.
+
+With --service, the simulations are run by the local simulation service, see service.py, instead of in this process.
+Simulations which were already run by anyone using the service are taken from its cache.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+import numpy as np
+import tomllib
+
+from src.lagrangepointgui.params import (
+    AUTO_TIME_STEP,
+    SIMULATION_PARAMS,
+    Input,
+    evaluate_params,
+)
+from src.lagrangepointgui.presets import Expr, ParamPresets, read_presets, resolve_preset
+from src.lagrangepointgui.safe_eval import safe_eval
+from src.lagrangepointsimulator.checkpoint import Checkpoint
+from src.lagrangepointsimulator.constants import AU
+from src.lagrangepointsimulator.dispatch import init_worker
+from src.lagrangepointsimulator.simulator import Simulator
+from src.lagrangepointsimulator.step_selection import DEFAULT_TOLERANCE
+from src.lagrangepointsimulator.trajectory_io import load_run, save_run
+
+if TYPE_CHECKING:
+    from src.lagrangepointgui.service import Address
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    # Simulator attribute name: value
+    params: dict[str, Input]
+
+
+def default_preset() -> dict[str, Expr]:
+    """Returns the default values of the GUI's input fields."""
+    return {label: default for label, (default, _) in SIMULATION_PARAMS.items()}
+
+
+def preset_job(name: str, presets: ParamPresets) -> Job:
+    if name not in presets:
+        msg = f"Unknown preset '{name}'."
+        raise ValueError(msg)
+
+    return Job(name, evaluate_params(default_preset() | resolve_preset(name, presets)))
+
+
+def param_file_job(path: Path, presets: ParamPresets) -> Job:
+    with Path.open(path, "rb") as file:
+        param_file = tomllib.load(file)
+
+    # the parameter file is treated as a preset with its file name as the preset's name
+    name = path.stem
+    preset = resolve_preset(name, presets | {name: param_file})
+
+    return Job(name, evaluate_params(default_preset() | preset))
+
+
+def with_chosen_time_step(job: Job, tolerance: float) -> Job:
+    """Returns job with the time step chosen by Simulator.choose_time_step for tolerance.
+    Prints a warning if no time step met the tolerance.
+    Raises a ValueError if its parameters or tolerance are invalid.
+    """
+    sim = Simulator()
+
+    try:
+        for attribute_name, value in job.params.items():
+            setattr(sim, attribute_name, value)
+    except TypeError as e:
+        raise ValueError(str(e)) from e
+
+    choice = sim.choose_time_step(tolerance)
+
+    if not choice.met_tolerance:
+        print(f"Warning: {job.name}: {choice.describe()}")
+
+    return Job(job.name, job.params | {"time_step": choice.time_step})
+
+
+def run_job(
+    job: Job,
+    output_dir: Path,
+    *,
+    save_trajectory: bool,
+    checkpoint_dir: Path | None = None,
+    checkpoint_interval: float = Simulator.CHECKPOINT_INTERVAL,
+) -> dict[str, Any]:
+    """Simulates job and writes its summary, and optionally its trajectory, to output_dir.
+    Returns the summary.
+    If checkpoint_dir is given, a checkpoint is saved there every checkpoint_interval seconds.
+    A simulation with the same parameters as an unfinished checkpoint is resumed from it,
+    and a finished one whose summary was written isn't simulated again.
+    """
+    file_stem = output_dir / _file_name(job.name)
+    summary_path = file_stem.with_suffix(".json")
+
+    sim = Simulator()
+    sim.checkpoint_interval = checkpoint_interval
+
+    for attribute_name, value in job.params.items():
+        setattr(sim, attribute_name, value)
+
+    checkpoint_path = checkpoint_dir / f"{file_stem.name}.checkpoint.npz" if checkpoint_dir is not None else None
+    checkpoint = _matching_checkpoint(sim, checkpoint_path)
+
+    if checkpoint is not None and checkpoint.completed and summary_path.exists():
+        with Path.open(summary_path) as file:
+            return cast(dict[str, Any], json.load(file))
+
+    if checkpoint is not None and not checkpoint.completed:
+        sim = Simulator.resume(checkpoint, checkpoint_path=checkpoint_path)
+    else:
+        sim.simulate(checkpoint_path=checkpoint_path)
+
+    summary = summarize(job, sim)
+
+    with Path.open(summary_path, "w") as file:
+        json.dump(summary, file, indent=2)
+
+    if save_trajectory:
+        save_run(sim, file_stem.with_suffix(".npz"))
+
+    return summary
+
+
+def _matching_checkpoint(sim: Simulator, checkpoint_path: Path | None) -> Checkpoint | None:
+    """Returns the checkpoint saved at checkpoint_path if it exists and has the same parameters as sim."""
+    if checkpoint_path is None or not checkpoint_path.exists():
+        return None
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+
+    return checkpoint if checkpoint.params == sim.params() else None
+
+
+def summarize(job: Job, sim: Simulator) -> dict[str, Any]:
+    # the rows before the step a simulation was resumed from aren't available
+    start = sim.resumed_from_step
+
+    sat_pos_corotating = sim.transform_to_corotating(sim.sat_pos[start:], sim.time_points()[start:])
+    distance_from_lagrange_point = np.linalg.norm(sat_pos_corotating - sim.lagrange_point_trans[:2], axis=1)
+
+    return {
+        "name": job.name,
+        "params": job.params,
+        "num_steps": sim.num_steps,
+        "resumed_from_step": start,
+        "final_sat_pos_au": (sim.sat_pos[-1] / AU).tolist(),
+        "final_sat_vel": sim.sat_vel[-1].tolist(),
+        "max_distance_from_lagrange_point_au": float(distance_from_lagrange_point.max()) / AU,
+        "final_distance_from_lagrange_point_au": float(distance_from_lagrange_point[-1]) / AU,
+        "jacobi_drift": sim.calc_jacobi_drift(),
+        "run_stats": sim.last_run_stats.to_dict() if sim.last_run_stats is not None else None,
+    }
+
+
+def _file_name(job_name: str) -> str:
+    return re.sub(r"[^\w-]+", "_", job_name).strip("_") or "simulation"
+
+
+def run_jobs(
+    jobs: Iterable[Job],
+    output_dir: Path,
+    *,
+    save_trajectories: bool,
+    workers: int,
+    checkpoint_dir: Path | None = None,
+    checkpoint_interval: float = Simulator.CHECKPOINT_INTERVAL,
+) -> list[dict[str, Any]]:
+    """Runs the jobs in a pool of worker processes, or in this process if workers is 1.
+    Returns their summaries in the same order as jobs.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if checkpoint_dir is not None:
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = list(jobs)
+    run = partial(
+        run_job,
+        output_dir=output_dir,
+        save_trajectory=save_trajectories,
+        checkpoint_dir=checkpoint_dir,
+        checkpoint_interval=checkpoint_interval,
+    )
+
+    if workers == 1:
+        return [run(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = [executor.submit(run, job) for job in jobs]
+
+        return [future.result() for future in futures]
+
+
+def run_jobs_in_service(
+    jobs: Iterable[Job],
+    output_dir: Path,
+    *,
+    save_trajectories: bool,
+    address: "Address | None" = None,
+    priority: int,
+) -> list[dict[str, Any]]:
+    """Has the simulation service at address, by default the one set in the environment, simulate the jobs
+    and writes their summaries, and optionally their trajectories, to output_dir.
+    Returns the summaries in the same order as jobs.
+    """
+    # the service imports this module to set up its workers
+    from src.lagrangepointgui.service import SimulationClient
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def request(job: Job) -> Path:
+        with SimulationClient(address) as client:
+            return client.simulate(job.params, priority)
+
+    jobs = list(jobs)
+
+    # every job has its own connection so that they're all queued at once and the service decides which run first
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        paths = list(executor.map(request, jobs))
+
+    # the summaries are calculated in this thread since the parallel kernels can't be called from several at once
+    summaries = []
+    for job, path in zip(jobs, paths, strict=True):
+        file_stem = output_dir / _file_name(job.name)
+        summary = summarize(job, load_run(path))
+
+        with Path.open(file_stem.with_suffix(".json"), "w") as file:
+            json.dump(summary, file, indent=2)
+
+        if save_trajectories:
+            # the run is copied from the service's cache, which saves it uncompressed
+            shutil.copyfile(path, file_stem.with_suffix(".npz"))
+
+        summaries.append(summary)
+
+    return summaries
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", action="append", default=[], help="name of a preset to simulate")
+    parser.add_argument("--all-presets", action="store_true", help="simulate every preset")
+    parser.add_argument("--params", action="append", default=[], type=Path, help="parameter file to simulate")
+    parser.add_argument("--num-years", help="overrides the number of years of every simulation")
+    parser.add_argument(
+        "--time-step",
+        help=f"overrides the time step, in hours, of every simulation, or chooses it if it's '{AUTO_TIME_STEP}'",
+    )
+    parser.add_argument(
+        "--time-step-tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="largest relative change in the Jacobi constant of the time steps chosen by --time-step auto",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--output-dir", type=Path, default=Path("results"))
+    parser.add_argument("--trajectories", action="store_true", help="also save the positions and velocities")
+    parser.add_argument("--list-presets", action="store_true", help="list the presets and exit")
+    parser.add_argument("--checkpoint-dir", type=Path, help="directory to save checkpoints to and resume from")
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=Simulator.CHECKPOINT_INTERVAL,
+        help="minimum number of seconds in between checkpoints",
+    )
+    parser.add_argument(
+        "--service",
+        nargs="?",
+        const="",
+        metavar="ADDRESS",
+        help="run the simulations in the simulation service at ADDRESS, by default $LAGRANGE_SIM_SERVICE",
+    )
+    parser.add_argument("--priority", type=int, help="priority of the simulations in the service, lower runs first")
+
+    return parser.parse_args()
+
+
+def _run_jobs_in_service(jobs: list[Job], args: argparse.Namespace) -> list[dict[str, Any]]:
+    from src.lagrangepointgui.service import BATCH_PRIORITY, parse_address
+
+    if args.checkpoint_dir is not None:
+        msg = "--checkpoint-dir can't be used with --service."
+        raise SystemExit(msg)
+
+    try:
+        return run_jobs_in_service(
+            jobs,
+            args.output_dir,
+            save_trajectories=args.trajectories,
+            address=parse_address(args.service) if args.service else None,
+            priority=BATCH_PRIORITY if args.priority is None else args.priority,
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e)) from e
+
+
+def main() -> None:
+    args = _parse_args()
+    presets, _ = read_presets()
+
+    if args.list_presets:
+        print("\n".join(presets))
+        return
+
+    preset_names: list[str] = list(presets) if args.all_presets else args.preset
+
+    try:
+        jobs = [preset_job(name, presets) for name in preset_names]
+        jobs += [param_file_job(path, presets) for path in args.params]
+
+        choose_time_step = args.time_step is not None and args.time_step.strip().lower() == AUTO_TIME_STEP
+
+        overrides = {"num_years": args.num_years, "time_step": None if choose_time_step else args.time_step}
+        overrides = {attribute_name: safe_eval(value) for attribute_name, value in overrides.items() if value}
+
+        jobs = [Job(job.name, job.params | overrides) for job in jobs]
+
+        if choose_time_step:
+            jobs = [with_chosen_time_step(job, args.time_step_tolerance) for job in jobs]
+
+    except (ValueError, TypeError, OSError, tomllib.TOMLDecodeError) as e:
+        raise SystemExit(str(e)) from e
+
+    if not jobs:
+        msg = "Nothing to simulate. Use --preset, --all-presets, or --params."
+        raise SystemExit(msg)
+
+    if args.service is not None:
+        summaries = _run_jobs_in_service(jobs, args)
+    else:
+        workers = max(1, min(args.workers, len(jobs)))
+        summaries = run_jobs(
+            jobs,
+            args.output_dir,
+            save_trajectories=args.trajectories,
+            workers=workers,
+            checkpoint_dir=args.checkpoint_dir,
+            checkpoint_interval=args.checkpoint_interval,
+        )
+
+    with Path.open(args.output_dir / "summary.json", "w") as file:
+        json.dump(summaries, file, indent=2)
+
+    for summary in summaries:
+        max_distance = summary["max_distance_from_lagrange_point_au"]
+        print(f"{summary['name']}: max distance from Lagrange point {max_distance:.4g} AU")
+
+
+if __name__ == "__main__":
+    main()
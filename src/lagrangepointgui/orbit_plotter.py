@@ -9,10 +9,12 @@ from typing import TypeAlias, cast
 import numpy as np
 import pyqtgraph as pg  # type: ignore[import-untyped]
 from numpy.linalg import norm
+from numpy.typing import NDArray
 from PyQt6.QtCore import QTimer
 
 from src.lagrangepointsimulator import Simulator
 from src.lagrangepointsimulator.constants import AU, HOURS, YEARS
+from src.lagrangepointsimulator.ensemble import EnsembleStats
 from src.lagrangepointsimulator.sim_types import Array1D, Array2D
 
 PlotArgs: TypeAlias = dict[str, str | int]
@@ -20,6 +22,38 @@ PlotArgs: TypeAlias = dict[str, str | int]
 AnimatePlotFunc: TypeAlias = Callable[[], None]
 
 
+STAR_ARGS: PlotArgs = {
+    "pen": "y",
+    "brush": "y",
+    "size": 10,
+    "name": "Star",
+}
+
+PLANET_ARGS: PlotArgs = {
+    "pen": "b",
+    "brush": "b",
+    "size": 10,
+    "name": "Planet",
+}
+
+SAT_ARGS: PlotArgs = {
+    "pen": "g",
+    "brush": "g",
+    "size": 10,
+    "name": "Satellite",
+}
+
+BODY_ARGS = (STAR_ARGS, PLANET_ARGS, SAT_ARGS)
+
+# largest number of points of each orbit which are plotted
+MAX_PLOTTED_POINTS = 10**5
+
+# largest number of points of all the trajectories in an overlay which are plotted
+MAX_OVERLAY_POINTS = 10**6
+
+OVERLAY_MARKER_SIZE = 5
+
+
 def _create_orbit_plot(title: str) -> pg.PlotWidget:
     plot = pg.PlotWidget(title=title)
     plot.setLabel("bottom", "x", units="AU")
@@ -41,6 +75,26 @@ def _plot_components(plot: pg.PlotWidget, arr: Array2D, times: Array1D) -> None:
         plot.plot(times, arr_component, name=component, pen=pen)
 
 
+def decimate_orbit(arr: Array2D, arr_step: int) -> Array2D:
+    """Returns the x and y coordinates, in AU, of every arr_step-th position in arr."""
+    return arr[::arr_step, :2] / AU
+
+
+def pack_trajectories(trajectories: NDArray[np.double], arr_step: int) -> tuple[Array1D, Array1D, NDArray[np.bool_]]:
+    """Returns the x and y coordinates, in AU, of every arr_step-th position of trajectories,
+    with shape (number of trajectories, number of positions, 2 or more), one trajectory after the other,
+    and whether each point is connected to the next, which it isn't at the end of each trajectory,
+    so that they can all be drawn by a single curve.
+    """
+    decimated = trajectories[:, ::arr_step, :2] / AU
+    num_trajectories, num_points = decimated.shape[:2]
+
+    connect = np.ones((num_trajectories, num_points), dtype=np.bool_)
+    connect[:, -1] = False
+
+    return decimated[..., 0].ravel(), decimated[..., 1].ravel(), connect.ravel()
+
+
 def _create_conserved_plot(quantity_name: str) -> pg.PlotWidget:
     """Initializes the plot axes and title for the conserved quantities plots."""
     plot = pg.PlotWidget(title=f"Relative Change in {quantity_name} vs Time")
@@ -71,10 +125,17 @@ class Plotter:
         self._total_momentum: Array2D = np.array([[]])
         self._total_angular_momentum: Array2D = np.empty_like(self._total_momentum)
         self._total_energy: Array1D = np.array([])
+        self._jacobi_constant: Array1D = np.array([])
+
+        # used to draw the orbits chunk by chunk while the simulation is running
+        self._next_index_to_plot = 0
+        self._progressive_curves: list[pg.PlotDataItem] = []
+        self._progressive_data: list[list[Array2D]] = []
 
         self.linear_momentum_plot = _create_conserved_plot("Linear Momentum")
         self.angular_momentum_plot = _create_conserved_plot("Angular Momentum")
         self.energy_plot = _create_conserved_plot("Energy")
+        self.jacobi_constant_plot = _create_conserved_plot("Jacobi Constant")
 
     def toggle_animation(self) -> None:
         if self.timer.isActive():
@@ -96,8 +157,10 @@ class Plotter:
         self.timer.timeout.connect(animate_inertial)
         self.timer.timeout.connect(animate_corotating)
 
-    def plot_index_generator(self) -> Generator[int, None, None]:
-        """This generator yields the index of the next point to plot."""
+    def plot_index_generator(self, num_points: int | None = None) -> Generator[int, None, None]:
+        """This generator yields the index of the next point to plot,
+        of num_points evenly spaced points which default to the rows of the arrays.
+        """
         time_step_default = 1 * HOURS
 
         # maximum rate of plot update is too slow
@@ -108,20 +171,27 @@ class Plotter:
         rate = ceil(
             100 / 3 * time_step_default / abs(self.sim.time_step_in_seconds) * self.sim.orbital_period / (1 * YEARS),
         )
+        if num_points is None:
+            num_points = len(self.sim.star_pos)
+
+        # the points of decimated or interpolated simulations are several steps apart
+        rate = max(1, ceil(rate * (num_points - 1) / max(self.sim.num_steps, 1)))
+
+        last_row = num_points - 1
         i = 0
         while True:
             i = i + rate
 
-            if i >= self.sim.num_steps:
+            if i >= last_row:
                 i = 0
 
             yield i
 
-    def array_step(self, num_points_to_plot: int = 10**5) -> int:
+    def array_step(self, num_points_to_plot: int = MAX_PLOTTED_POINTS) -> int:
         # no need to plot all points
         # step size when plotting
         # i.e. if points_plotted_step = 10 then plot every 10th point
-        points_plotted_step = int((self.sim.num_steps + 1) / num_points_to_plot)
+        points_plotted_step = int(len(self.sim.star_pos) / num_points_to_plot)
 
         return points_plotted_step or 1
 
@@ -142,32 +212,11 @@ class Plotter:
         legend: pg.LegendItem = plot.addLegend()
         legend.clear()
 
-        star_args: PlotArgs = {
-            "pen": "y",
-            "brush": "y",
-            "size": 10,
-            "name": "Star",
-        }
-
-        planet_args: PlotArgs = {
-            "pen": "b",
-            "brush": "b",
-            "size": 10,
-            "name": "Planet",
-        }
-
-        sat_args: PlotArgs = {
-            "pen": "g",
-            "brush": "g",
-            "size": 10,
-            "name": "Satellite",
-        }
-
-        arrays_and_args = ((star_pos, star_args), (planet_pos, planet_args), (sat_pos, sat_args))
+        arrays_and_args = tuple(zip((star_pos, planet_pos, sat_pos), BODY_ARGS, strict=True))
 
         arr_step = self.array_step()
         for arr, args in arrays_and_args:
-            plot.plot(arr[::arr_step, :2] / AU, **args)
+            plot.plot(decimate_orbit(arr, arr_step), **args)
 
         anim_plot = pg.ScatterPlotItem()
 
@@ -180,7 +229,7 @@ class Plotter:
 
         plot.autoRange()
 
-        idx_gen = self.plot_index_generator()
+        idx_gen = self.plot_index_generator(len(star_pos))
 
         def animate_plot() -> None:
             i = next(idx_gen)
@@ -192,6 +241,122 @@ class Plotter:
 
         return animate_plot
 
+    def plot_trajectories(
+        self,
+        plot: pg.PlotWidget,
+        trajectories: NDArray[np.double],
+        groups: NDArray[np.int64] | None = None,
+    ) -> AnimatePlotFunc:
+        """Plots many trajectories of satellites, with shape (number of trajectories, number of positions, 2 or more),
+        in meters, whose positions are at the same times. The trajectories in each of groups, which is the group of
+        each trajectory and by default puts them all in one, are drawn by a single curve in the group's colour,
+        and are decimated with the same step so that at most MAX_OVERLAY_POINTS points are drawn in total.
+        Returns a function which is called by the timer to move a marker along every trajectory at once.
+        """
+        plot.clear()
+        plot.disableAutoRange()
+
+        num_trajectories, num_points = trajectories.shape[:2]
+        if groups is None:
+            groups = np.zeros(num_trajectories, dtype=np.int64)
+
+        group_labels, group_of_trajectory = np.unique(groups, return_inverse=True)
+        colours = [pg.intColor(i, hues=len(group_labels)) for i in range(len(group_labels))]
+
+        arr_step = max(1, ceil(num_trajectories * num_points / MAX_OVERLAY_POINTS))
+        for i, colour in enumerate(colours):
+            x, y, connect = pack_trajectories(trajectories[group_of_trajectory == i], arr_step)
+            plot.addItem(pg.PlotCurveItem(x, y, connect=connect, pen=colour, skipFiniteCheck=True))
+
+        # the markers are all replaced at once each frame, which is much faster than adding them one by one
+        anim_plot = pg.ScatterPlotItem(pen=None, size=OVERLAY_MARKER_SIZE)
+        brushes = [pg.mkBrush(colours[i]) for i in group_of_trajectory]
+        positions_in_au = trajectories[..., :2] / AU
+        anim_plot.setData(pos=positions_in_au[:, 0], brush=brushes)
+
+        plot.addItem(anim_plot)
+        plot.autoRange()
+
+        idx_gen = self.plot_index_generator(num_points)
+
+        def animate_plot() -> None:
+            anim_plot.setData(pos=positions_in_au[:, next(idx_gen)], brush=brushes)
+
+        return animate_plot
+
+    def plot_ensemble_overlay(self, stats: EnsembleStats, groups: NDArray[np.int64] | None = None) -> None:
+        """Plots the trajectories of an ensemble run with keep_trajectories, from this Plotter's Simulator,
+        in the corotating plot and animates them with the timer. groups is passed to plot_trajectories.
+        Raises a ValueError if the trajectories weren't kept.
+        """
+        if stats.trajectories is None:
+            msg = "The ensemble must be run with keep_trajectories=True for its trajectories to be plotted."
+            raise ValueError(msg)
+
+        # the trajectories are relative to the Lagrange point
+        _, lagrange_point = self.sim.initial_state()
+        animate_corotating = self.plot_trajectories(
+            self.corotating_plot,
+            stats.trajectories + lagrange_point[:2],
+            groups,
+        )
+
+        self._add_lagrange_point_to_corotating_plot(lagrange_point)
+
+        with suppress(TypeError):
+            self.timer.timeout.disconnect()
+
+        self.timer.timeout.connect(animate_corotating)
+
+    def start_progressive_plot(self) -> None:
+        """Clears the orbit plots so that they can be drawn chunk by chunk,
+        by calling extend_progressive_plot, while the simulation is running.
+        """
+        self._next_index_to_plot = 0
+        self._progressive_curves = []
+
+        for plot in (self.inertial_plot, self.corotating_plot):
+            plot.clear()
+            plot.enableAutoRange()
+
+            legend: pg.LegendItem = plot.addLegend()
+            legend.clear()
+
+            self._progressive_curves.extend(plot.plot(**args) for args in BODY_ARGS)
+
+        self._progressive_data = [[] for _ in self._progressive_curves]
+
+        self._add_lagrange_point_to_corotating_plot()
+
+    def extend_progressive_plot(self, steps_done: int) -> None:
+        """Appends the steps computed since the last call to the curves created by start_progressive_plot.
+        The new points are decimated in the same way as in plot_orbit.
+        """
+        indices = range(self._next_index_to_plot, self.sim.last_row_of_step(steps_done) + 1, self.array_step())
+        if not indices:
+            return
+
+        self._next_index_to_plot = indices[-1] + indices.step
+
+        rows = slice(indices.start, indices.stop, indices.step)
+        times = self.sim.time_points_of_rows(np.arange(indices.start, indices.stop, indices.step))
+
+        # copying the decimated rows keeps them contiguous which avoids compiling another version of the transform
+        inertial_chunks = [
+            np.ascontiguousarray(arr[rows]) for arr in (self.sim.star_pos, self.sim.planet_pos, self.sim.sat_pos)
+        ]
+        # the simulation is still running so the previews aren't counted in its run's statistics
+        corotating_chunks = [self.sim.transform_to_corotating(arr, times, record=False) for arr in inertial_chunks]
+
+        for curve, data, chunk in zip(
+            self._progressive_curves,
+            self._progressive_data,
+            inertial_chunks + corotating_chunks,
+            strict=True,
+        ):
+            data.append(chunk[:, :2] / AU)
+            curve.setData(np.concatenate(data))
+
     @staticmethod
     def plot_point(scatter_plot: pg.ScatterPlotItem, pos: Array1D, args: PlotArgs) -> None:
         """Plots pos on scatter_plot.
@@ -202,14 +367,39 @@ class Plotter:
             **args,
         )
 
+    def orbit_positions(self) -> tuple[Array1D, Array2D, Array2D, Array2D]:
+        """Returns the times and positions of the star, planet, and satellite to plot.
+        Decimated simulations with fewer than MAX_PLOTTED_POINTS rows are interpolated at up to that many
+        evenly spaced times, so that their orbits and animations are as smooth as those of full simulations.
+        """
+        sim = self.sim
+
+        if sim.record_every == 1 or len(sim.star_pos) >= MAX_PLOTTED_POINTS:
+            return sim.time_points(), sim.star_pos, sim.planet_pos, sim.sat_pos
+
+        times = np.linspace(0, sim.sim_time, min(sim.num_steps + 1, MAX_PLOTTED_POINTS))
+        states = sim.states_at(times)
+
+        return times, states[0], states[2], states[4]
+
     def plot_inertial_orbit(self) -> AnimatePlotFunc:
-        return self.plot_orbit(self.inertial_plot, self.sim.star_pos, self.sim.planet_pos, self.sim.sat_pos)
+        _, star_pos, planet_pos, sat_pos = self.orbit_positions()
+
+        return self.plot_orbit(self.inertial_plot, star_pos, planet_pos, sat_pos)
+
+    def calc_corotating_positions(self) -> tuple[Array2D, Array2D, Array2D]:
+        """Returns the positions of the star, planet, and satellite in the corotating frame."""
+        times, star_pos, planet_pos, sat_pos = self.orbit_positions()
+
+        star_pos_corotating = self.sim.transform_to_corotating(star_pos, times)
+        planet_pos_corotating = self.sim.transform_to_corotating(planet_pos, times)
+        sat_pos_corotating = self.sim.transform_to_corotating(sat_pos, times)
+
+        return star_pos_corotating, planet_pos_corotating, sat_pos_corotating
 
     def plot_corotating_orbit(self) -> AnimatePlotFunc:
         """Plots the orbits of the system simulated in the corotating frame."""
-        star_pos_corotating = self.sim.transform_to_corotating(self.sim.star_pos)
-        planet_pos_corotating = self.sim.transform_to_corotating(self.sim.planet_pos)
-        sat_pos_corotating = self.sim.transform_to_corotating(self.sim.sat_pos)
+        star_pos_corotating, planet_pos_corotating, sat_pos_corotating = self.calc_corotating_positions()
 
         animate_corotating_plot = self.plot_orbit(
             self.corotating_plot,
@@ -222,12 +412,13 @@ class Plotter:
 
         return animate_corotating_plot
 
-    def _add_lagrange_point_to_corotating_plot(self) -> None:
+    def _add_lagrange_point_to_corotating_plot(self, lagrange_point: Array1D | None = None) -> None:
         lagrange_point_plot = pg.ScatterPlotItem()
 
         self.corotating_plot.addItem(lagrange_point_plot)
 
-        lagrange_point = self.sim.lagrange_point_trans
+        if lagrange_point is None:
+            lagrange_point = self.sim.lagrange_point_trans
 
         lagrange_point_plot.addPoints(
             pos=[lagrange_point[:2] / AU],
@@ -245,7 +436,7 @@ class Plotter:
 
     def plot_conserved_quantities(self) -> None:
         """Plots the relative change in the conserved quantities:
-        linear and angular momenta, and energy.
+        linear and angular momenta, energy, and the satellite's Jacobi constant.
         """
         # slice the arrays so that we only plot at most 10**5 points.
         arr_step = self.array_step()
@@ -255,6 +446,7 @@ class Plotter:
         self.linear_momentum_plot.clear()
         self.angular_momentum_plot.clear()
         self.energy_plot.clear()
+        self.jacobi_constant_plot.clear()
 
         total_momentum = self._total_momentum[::arr_step]
         self.plot_relative_change_in_linear_momentum(total_momentum, times_in_years)
@@ -265,6 +457,11 @@ class Plotter:
         total_energy = self._total_energy[::arr_step]
         self.plot_relative_change_in_energy(total_energy, times_in_years)
 
+        # relative to the step the simulation started, or was resumed, from as in Simulator.calc_jacobi_drift
+        initial_jacobi_constant = self._jacobi_constant[self.sim.resumed_from_step]
+        jacobi_constant = self._jacobi_constant[::arr_step]
+        self.jacobi_constant_plot.plot(times_in_years, jacobi_constant / initial_jacobi_constant - 1)
+
     def get_conserved_quantities(self) -> None:
         (
             total_momentum,
@@ -275,6 +472,7 @@ class Plotter:
         self._total_momentum = total_momentum
         self._total_angular_momentum = total_angular_momentum
         self._total_energy = total_energy
+        self._jacobi_constant = self.sim.calc_jacobi_constant()
 
     def plot_relative_change_in_linear_momentum(
         self,
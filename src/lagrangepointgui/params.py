@@ -0,0 +1,73 @@
+"""Defines the parameters shown in the GUI and their corresponding attributes in the Simulator class,
+and evaluates their expressions.
+Used by both the GUI and the command-line batch runner so it mustn't import Qt.
+"""
+from typing import TypeAlias
+
+from src.lagrangepointgui.presets import Expr
+from src.lagrangepointgui.safe_eval import safe_eval
+
+LAGRANGE_LABEL = "Lagrange label"
+
+TIME_STEP_LABEL = "time step (hours)"
+
+# entered as the time step to choose it automatically, see Simulator.choose_time_step
+AUTO_TIME_STEP = "auto"
+
+Params: TypeAlias = dict[str, tuple[str, str]]
+
+# parameter label in gui: (default value, attribute name in Simulator)
+SIMULATION_PARAMS: Params = {
+    "number of years": ("10.0", "num_years"),
+    TIME_STEP_LABEL: ("1.0", "time_step"),
+}
+
+SATELLITE_PARAMS: Params = {
+    "perturbation size": ("0.0", "perturbation_size"),
+    "perturbation angle": ("", "perturbation_angle"),
+    "initial speed": ("1.0", "speed"),
+    "initial velocity angle": ("", "vel_angle"),
+}
+
+LAGRANGE_PARAM: Params = {LAGRANGE_LABEL: ("L4", "lagrange_label")}
+
+SYSTEM_PARAMS: Params = {
+    "star mass": ("sun_mass", "star_mass"),
+    "planet mass": ("earth_mass", "planet_mass"),
+    "planet distance": ("1.0", "planet_distance"),
+}
+
+Input: TypeAlias = str | float | None
+
+ALL_PARAMS = SIMULATION_PARAMS | SATELLITE_PARAMS | LAGRANGE_PARAM | SYSTEM_PARAMS
+
+# used to translate param labels used in gui to attribute names in simulator class
+PARAM_LABEL_TO_ATTRIBUTE_NAME = {param_label: attribute for param_label, (_, attribute) in ALL_PARAMS.items()}
+
+ATTRIBUTE_NAMES = set(PARAM_LABEL_TO_ATTRIBUTE_NAME.values())
+
+
+def evaluate_params(preset: dict[str, Expr]) -> dict[str, Input]:
+    """Translates the keys of preset to Simulator attribute names and evaluates its expressions.
+    Raises a ValueError if a key is unknown or an expression is invalid.
+    """
+    params: dict[str, Input] = {}
+
+    for key, value in preset.items():
+        attribute_name = PARAM_LABEL_TO_ATTRIBUTE_NAME.get(key, key)
+
+        if attribute_name not in ATTRIBUTE_NAMES:
+            msg = f"Unknown parameter '{key}'."
+            raise ValueError(msg)
+
+        if attribute_name == PARAM_LABEL_TO_ATTRIBUTE_NAME[LAGRANGE_LABEL] or not isinstance(value, str):
+            params[attribute_name] = value
+            continue
+
+        try:
+            params[attribute_name] = safe_eval(value)
+        except (ValueError, TypeError) as e:
+            msg = f"Invalid expression for '{key}'.\n{e}"
+            raise ValueError(msg) from e
+
+    return params
@@ -0,0 +1,223 @@
+"""Simulates presets in the background so that choosing one in the GUI displays it without waiting.
+
+Prefetching is opt-in. It's enabled by setting the LAGRANGE_SIM_PREFETCH environment variable either to "all",
+to simulate every preset, or to a number n, to simulate the n most recently used presets,
+which are remembered between sessions in recent_presets.json next to the preset files.
+The presets are simulated with the current simulation parameters on the idle cores and the runs are kept
+in a RunCache, which discards the least recently used runs once it holds more than its maximum number of bytes.
+The GUI cancels prefetching whenever the user starts a simulation and restarts it once the simulation has finished,
+so prefetching never competes with the user for the cores.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from src.lagrangepointgui.params import Input, evaluate_params
+from src.lagrangepointgui.presets import dir_path, preset_registry
+from src.lagrangepointgui.service import simulation_key
+from src.lagrangepointsimulator.cancellation import CancellationToken, SimulationCancelledError
+from src.lagrangepointsimulator.simulator import POSITION_AND_VELOCITY_NAMES, Simulator
+from src.lagrangepointsimulator.storage import default_memory_budget
+
+PREFETCH_VARIABLE = "LAGRANGE_SIM_PREFETCH"
+
+recent_presets_path = dir_path / "recent_presets.json"
+
+# number of recently used presets which are remembered
+MAX_RECENT_PRESETS = 20
+
+
+def prefetch_setting() -> int | None:
+    """Returns the number of most recently used presets to prefetch set in the environment,
+    None to prefetch every preset, or 0 if prefetching isn't enabled or the setting is invalid.
+    """
+    setting = os.environ.get(PREFETCH_VARIABLE, "").strip().lower()
+
+    if setting == "all":
+        return None
+
+    try:
+        return max(0, int(setting))
+    except ValueError:
+        return 0
+
+
+def read_recent_presets() -> list[str]:
+    """Returns the names of the most recently used presets, most recent first."""
+    try:
+        with recent_presets_path.open() as file:
+            names = json.load(file)
+    except (OSError, ValueError):
+        return []
+
+    return [name for name in names if isinstance(name, str)] if isinstance(names, list) else []
+
+
+def record_recent_preset(name: str) -> list[str]:
+    """Moves name to the front of the recently used presets and returns them."""
+    names = [name] + [recent for recent in read_recent_presets() if recent != name]
+    names = names[:MAX_RECENT_PRESETS]
+
+    # the presets are still prefetched in this session if the directory isn't writable
+    try:
+        with recent_presets_path.open("w") as file:
+            json.dump(names, file)
+    except OSError:
+        pass
+
+    return names
+
+
+def presets_to_prefetch(preset_names: Sequence[str], setting: int | None) -> list[str]:
+    """Returns the presets out of preset_names to prefetch with setting, as returned by prefetch_setting,
+    with the most recently used first.
+    """
+    if setting == 0:
+        return []
+
+    recent = [name for name in read_recent_presets() if name in preset_names]
+
+    if setting is None:
+        return recent + [name for name in preset_names if name not in recent]
+
+    return recent[:setting]
+
+
+def preset_jobs(preset_names: Sequence[str], params: dict[str, Input]) -> list[dict[str, Input]]:
+    """Returns params, Simulator attribute name: value, with each of the presets applied.
+    Presets which can't be evaluated are skipped.
+    """
+    jobs = [_preset_job(name, params) for name in preset_names]
+
+    return [job for job in jobs if job is not None]
+
+
+def _preset_job(preset_name: str, params: dict[str, Input]) -> dict[str, Input] | None:
+    try:
+        return params | evaluate_params(preset_registry.resolve(preset_name))
+    except ValueError:
+        return None
+
+
+def simulation_bytes(sim: Simulator) -> int:
+    return sum(getattr(sim, name).nbytes for name in POSITION_AND_VELOCITY_NAMES)
+
+
+class RunCache:
+    """Simulated Simulators by their simulation_key, holding at most max_bytes of arrays,
+    by default a quarter of the memory budget. The least recently used runs are discarded first.
+    """
+
+    def __init__(self, max_bytes: int | None = None) -> None:
+        self.max_bytes = default_memory_budget() // 4 if max_bytes is None else max_bytes
+
+        self._lock = threading.Lock()
+        self._runs: OrderedDict[str, Simulator] = OrderedDict()
+        self._num_bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._runs
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._runs)
+
+    def get(self, key: str) -> Simulator | None:
+        with self._lock:
+            sim = self._runs.get(key)
+
+            if sim is not None:
+                self._runs.move_to_end(key)
+
+            return sim
+
+    def put(self, key: str, sim: Simulator) -> None:
+        """Adds sim unless it's larger than the cache, discarding the least recently used runs to make room."""
+        num_bytes = simulation_bytes(sim)
+        if num_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if (previous := self._runs.pop(key, None)) is not None:
+                self._num_bytes -= simulation_bytes(previous)
+
+            self._runs[key] = sim
+            self._num_bytes += num_bytes
+
+            while self._num_bytes > self.max_bytes:
+                _, discarded = self._runs.popitem(last=False)
+                self._num_bytes -= simulation_bytes(discarded)
+
+    def holds(self, sim: Simulator) -> bool:
+        """Whether sim is one of the cached runs, which mustn't be modified."""
+        with self._lock:
+            return any(cached is sim for cached in self._runs.values())
+
+
+class PresetPrefetcher:
+    """Simulates the parameters it's given on num_workers background threads, by default one per core
+    except one for the GUI, and puts the runs in cache.
+    """
+
+    def __init__(self, cache: RunCache, num_workers: int | None = None) -> None:
+        self.cache = cache
+        self.num_workers = max(1, (os.cpu_count() or 1) - 1) if num_workers is None else num_workers
+
+        self._executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._tokens: set[CancellationToken] = set()
+
+    def prefetch(self, jobs: Sequence[dict[str, Input]]) -> None:
+        """Cancels the simulations being prefetched and prefetches jobs, Simulator attribute name: value,
+        in order. Jobs which are already cached or whose parameters are invalid are skipped.
+        """
+        self.cancel()
+
+        with self._lock:
+            for params in jobs:
+                token = CancellationToken()
+                self._tokens.add(token)
+                self._executor.submit(self._simulate, params, token)
+
+    def cancel(self) -> None:
+        """Stops the simulations being prefetched, and those queued, after their current chunk of steps."""
+        with self._lock:
+            for token in self._tokens:
+                token.cancel()
+
+            self._tokens.clear()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _simulate(self, params: dict[str, Input], token: CancellationToken) -> None:
+        try:
+            if token.cancelled:
+                return
+
+            sim = Simulator()
+            try:
+                for attribute_name, value in params.items():
+                    setattr(sim, attribute_name, value)
+            except (TypeError, ValueError):
+                return
+
+            key = simulation_key(sim)
+            if key in self.cache:
+                return
+
+            try:
+                sim.simulate(cancellation_token=token)
+            except (SimulationCancelledError, OSError, ValueError):
+                return
+
+            self.cache.put(key, sim)
+
+        finally:
+            with self._lock:
+                self._tokens.discard(token)
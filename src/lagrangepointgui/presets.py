@@ -1,8 +1,10 @@
 """Reads user defined presets and constants for usage in GUI."""
 import os
 import sys
+from collections.abc import Sequence
 from pathlib import Path
-from typing import TypeAlias
+from threading import Lock
+from typing import TypeAlias, cast
 
 import tomllib
 
@@ -22,12 +24,123 @@ Bases: TypeAlias = list[str]
 ParamPresets: TypeAlias = dict[str, dict[str, Expr | Bases]]
 Constants: TypeAlias = dict[str, float | int]
 
+# modification time and size of a file, or None if it doesn't exist
+FileStamp: TypeAlias = tuple[int, int] | None
+
+
+class PresetRegistry:
+    """Holds the presets and constants read from a sequence of preset files.
+    Later files overwrite the presets and constants of earlier ones.
+    The files are only read again when their modification times or sizes change,
+    and each preset's bases are only resolved once per read.
+    """
+
+    def __init__(self, paths: Sequence[Path]) -> None:
+        self.paths = tuple(paths)
+
+        self._lock = Lock()
+        self._stamps: tuple[FileStamp, ...] | None = None
+        self._presets: ParamPresets = {}
+        self._constants: Constants = {}
+        self._resolved: dict[str, dict[str, Expr]] = {}
+
+        # incremented every time the files are read, can be used to invalidate caches of values derived from them
+        self.version = 0
+
+    def read(self) -> tuple[ParamPresets, Constants]:
+        """Returns the presets and constants. The returned dicts are shared and mustn't be modified."""
+        with self._lock:
+            self._reload_if_changed()
+
+            return self._presets, self._constants
+
+    def resolve(self, name: str) -> dict[str, Expr]:
+        """Returns the parameters of the preset name with its bases applied. See resolve_preset."""
+        with self._lock:
+            self._reload_if_changed()
+
+            return dict(resolve_preset(name, self._presets, self._resolved))
+
+    def _reload_if_changed(self) -> None:
+        stamps = tuple(_file_stamp(path) for path in self.paths)
+        if stamps == self._stamps:
+            return
+
+        presets: ParamPresets = {}
+        constants: Constants = {}
+        for path in self.paths:
+            file_presets, file_constants = _read_preset(path)
+            presets |= file_presets
+            constants |= file_constants
+
+        self._presets = presets
+        self._constants = constants
+        self._resolved = {}
+        self._stamps = stamps
+        self.version += 1
+
+
+def _file_stamp(path: Path) -> FileStamp:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+preset_registry = PresetRegistry((default_presets_path, user_presets_path))
+
 
 def read_presets() -> tuple[ParamPresets, Constants]:
-    default_params, default_consts = _read_preset(default_presets_path)
-    user_params, user_consts = _read_preset(user_presets_path)
+    return preset_registry.read()
+
+
+def resolve_preset(
+    name: str,
+    presets: ParamPresets,
+    resolved: dict[str, dict[str, Expr]] | None = None,
+) -> dict[str, Expr]:
+    """Returns the parameters of the preset name with its bases applied first, in the order they're written.
+    Later values overwrite earlier ones.
+    If given, resolved is used to memoize the resolved presets and the returned dict mustn't be modified.
+    Raises a ValueError if a preset doesn't exist or a preset is its own base, directly or indirectly.
+    """
+    if resolved is None:
+        resolved = {}
+
+    return _resolve_preset(name, presets, resolved, ())
+
+
+def _resolve_preset(
+    name: str,
+    presets: ParamPresets,
+    resolved: dict[str, dict[str, Expr]],
+    path: tuple[str, ...],
+) -> dict[str, Expr]:
+    if name in resolved:
+        return resolved[name]
+
+    if name in path:
+        cycle = " -> ".join((*path[path.index(name) :], name))
+        msg = f"Preset '{name}' is its own base: {cycle}"
+        raise ValueError(msg)
+
+    if name not in presets:
+        msg = f"Unknown preset '{name}'."
+        raise ValueError(msg)
+
+    preset = presets[name]
+
+    params: dict[str, Expr] = {}
+    for base in cast(Bases, preset.get("bases", [])):
+        params |= _resolve_preset(base, presets, resolved, (*path, name))
+
+    params |= {param: cast(Expr, value) for param, value in preset.items() if param != "bases"}
+
+    resolved[name] = params
 
-    return default_params | user_params, default_consts | user_consts
+    return params
 
 
 def _read_preset(file_path: Path) -> tuple[ParamPresets, Constants]:
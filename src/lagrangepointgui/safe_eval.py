@@ -1,31 +1,52 @@
-"""Contains a function to safely evaluate input expressions."""
-from src.lagrangepointgui.presets import read_presets
+"""Contains a function to safely evaluate input expressions.
+Expressions are parsed into an abstract syntax tree which is checked against a whitelist of nodes
+before being compiled. Compiled expressions and their results are cached.
+"""
+import ast
+from functools import lru_cache
+from types import CodeType
+
+from src.lagrangepointgui.presets import preset_registry
 from src.lagrangepointsimulator.constants import CONSTANTS
 
-ALLOWED_CHARS = set("0123456789.+-*/()e")
+ALLOWED_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Pow, ast.UAdd, ast.USub)
+
+ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, *ALLOWED_OPERATORS)
+
+CACHE_SIZE = 1024
 
 
 def safe_eval(expr: str) -> int | float | None:
     """safe eval function used on expressions that contain developer and user defined constants.
     Returns the result of the expression as a float or int. If the expression is empty, returns None.
     Raises a ValueError if the expression contains anything other than
-    the constants, digits, the usual arithmetic operators, parens, or scientific notation.
+    the constants, numbers, the arithmetic operators +, -, *, /, //, **, and parens.
     """
 
+    expr = expr.strip()
+
     if not expr:
         return None
 
-    expr = expr.strip()
+    _, user_constants = preset_registry.read()
+
+    # the version changes whenever the user constants are reloaded which invalidates the cached results
+    return _evaluate(expr, preset_registry.version, tuple(user_constants.items()))
 
-    _, user_constants = read_presets()
 
-    all_constants = CONSTANTS | user_constants
+@lru_cache(maxsize=CACHE_SIZE)
+def _evaluate(expr: str, _constants_version: int, user_constants: tuple[tuple[str, float | int], ...]) -> int | float:
+    code, names = _compile(expr)
 
-    _validate_expr(expr, all_constants)
+    all_constants = CONSTANTS | dict(user_constants)
+
+    if unknown_names := [name for name in names if name not in all_constants]:
+        msg = f"Unknown constant(s): {', '.join(unknown_names)}."
+        raise ValueError(msg)
 
     try:
-        res = eval(expr, all_constants)
-    except (NameError, SyntaxError, ZeroDivisionError) as err:
+        res = eval(code, {"__builtins__": {}}, all_constants)
+    except (ZeroDivisionError, OverflowError) as err:
         raise ValueError(str(err)) from err
 
     if not isinstance(res, int | float):
@@ -35,21 +56,34 @@ def safe_eval(expr: str) -> int | float | None:
     return res
 
 
-def _validate_expr(expr: str, constants: dict[str, float | int]) -> None:
-    """Ensures that the expression only contains constants, digits,
-    the usual arithmetic operators, parens, or scientific notation.
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile(expr: str) -> tuple[CodeType, tuple[str, ...]]:
+    """Returns the compiled expression and the names of the constants it uses.
+    Raises a ValueError if the expression isn't valid.
     """
-    cleaned_expr = _remove_constants(expr, constants)
-    chars_in_expr = set(cleaned_expr)
-    if not chars_in_expr.issubset(ALLOWED_CHARS):
-        msg = "invalid constant or syntax in expression."
-        raise ValueError(msg)
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as err:
+        msg = f"invalid syntax in expression: {err.msg}."
+        raise ValueError(msg) from err
+
+    names: list[str] = []
+    for node in ast.walk(tree):
+        _validate_node(node)
+
+        if isinstance(node, ast.Name) and node.id not in names:
+            names.append(node.id)
 
+    return compile(tree, "<expression>", "eval"), tuple(names)
 
-def _remove_constants(expr: str, constants: dict[str, float | int]) -> str:
-    """remove constants in the expression"""
 
-    for constant_name in constants:
-        expr = expr.replace(constant_name, "")
+def _validate_node(node: ast.AST) -> None:
+    """Ensures that the node is a constant, a number, an arithmetic operator, or an operation using them."""
+    if not isinstance(node, ALLOWED_NODES):
+        msg = f"invalid constant or syntax in expression: {type(node).__name__} is not allowed."
+        raise ValueError(msg)  # noqa: TRY004
 
-    return expr
+    # bool is a subclass of int but isn't a number
+    if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, int | float)):
+        msg = f"invalid constant or syntax in expression: {node.value!r} is not a number."
+        raise ValueError(msg)  # noqa: TRY004
@@ -0,0 +1,490 @@
+"""Local simulation service which runs the simulations of several clients, such as the GUIs and batch runs
+of everyone using a workstation, on one pool of worker processes and shares their results.
+
+Start it from the repository root with:
+    python -m src.lagrangepointgui.service --workers 8
+
+The GUI uses it when the LAGRANGE_SIM_SERVICE environment variable is set to its address,
+either host:port or the path of a Unix socket, and the batch runner uses it with --service.
+Connections are authenticated with the key in the LAGRANGE_SIM_SERVICE_KEY environment variable. If it isn't set,
+the service generates a random key into service.key in its cache directory, which only its user can read,
+and clients read it from there, or from the file in the LAGRANGE_SIM_SERVICE_KEY_FILE environment variable.
+Requests and replies are JSON so a client can't make the service run arbitrary code.
+
+The Unix socket, the cache directory and the runs and key in it are private to the service's user. With --group,
+they belong to that group instead and its members can read them and connect to the socket, so everyone in it
+can share the service. --socket-mode overrides the permissions of the socket.
+
+Simulations are identified by their parameters. A request for a simulation which is queued or running waits for it
+instead of starting another one. Finished simulations are saved uncompressed in the cache directory and the clients
+memory-map them from there, so everyone shares the same copy in the page cache. The cache is kept between restarts
+and the least recently used runs are deleted when it's larger than its maximum size.
+Queued simulations are run in order of priority, lower values first, and otherwise in the order they were requested.
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Self
+
+from src.lagrangepointgui.params import Input
+from src.lagrangepointsimulator.dispatch import init_worker
+from src.lagrangepointsimulator.simulator import PARAM_NAMES, Simulator
+from src.lagrangepointsimulator.trajectory_io import load_run, save_run
+
+ADDRESS_VARIABLE = "LAGRANGE_SIM_SERVICE"
+
+AUTHKEY_VARIABLE = "LAGRANGE_SIM_SERVICE_KEY"
+
+KEY_FILE_VARIABLE = "LAGRANGE_SIM_SERVICE_KEY_FILE"
+
+DEFAULT_ADDRESS = "localhost:47615"
+
+DEFAULT_CACHE_DIR = Path("service_cache")
+
+KEY_FILE_NAME = "service.key"
+
+# number of random bytes in a generated key
+KEY_BYTES = 32
+
+# permissions of the socket, the cache directory, and the runs and key in it,
+# either private to the service's user or shared with the members of its group
+PRIVATE_FILE_MODE = 0o600
+
+PRIVATE_DIR_MODE = 0o700
+
+SHARED_FILE_MODE = 0o640
+
+SHARED_SOCKET_MODE = 0o660
+
+# the set-group-ID bit gives the runs saved in the directory its group
+SHARED_DIR_MODE = 0o2750
+
+DEFAULT_MAX_CACHE_GB = 20.0
+
+# number of seconds after a run was last requested during which it isn't deleted from the cache
+EVICTION_GRACE_PERIOD = 600
+
+# priorities of the simulations requested by the GUI, which someone is waiting for, and by batch runs
+INTERACTIVE_PRIORITY = 0
+
+BATCH_PRIORITY = 10
+
+# either (host, port) or the path of a Unix socket
+Address = tuple[str, int] | str
+
+
+def parse_address(address: str) -> Address:
+    host, separator, port = address.rpartition(":")
+
+    if separator and port.isdigit():
+        return host or "localhost", int(port)
+
+    return address
+
+
+def service_address() -> Address | None:
+    """Returns the address of the service set in the environment, or None if it isn't set."""
+    address = os.environ.get(ADDRESS_VARIABLE)
+
+    return parse_address(address) if address else None
+
+
+def key_file(cache_dir: Path = DEFAULT_CACHE_DIR) -> Path:
+    """Returns the path of the key file set in the environment, or otherwise of the one in cache_dir."""
+    path = os.environ.get(KEY_FILE_VARIABLE)
+
+    return Path(path) if path else cache_dir / KEY_FILE_NAME
+
+
+def _authkey() -> bytes:
+    """Returns the key set in the environment, or otherwise the one in key_file.
+    Raises a ConnectionError if neither is available.
+    """
+    if authkey := os.environ.get(AUTHKEY_VARIABLE):
+        return authkey.encode()
+
+    path = key_file()
+    try:
+        return path.read_bytes().strip()
+    except OSError as e:
+        msg = (
+            f"The key of the simulation service can't be read from {path}. "
+            f"Set {AUTHKEY_VARIABLE} to the key, or {KEY_FILE_VARIABLE} to the path of the service's key file."
+        )
+        raise ConnectionError(msg) from e
+
+
+def _service_authkey(path: Path, file_mode: int, group: str | None) -> bytes:
+    """Returns the key set in the environment, or otherwise the one in path, which is generated if it doesn't exist.
+    The key file is given file_mode and group.
+    """
+    if authkey := os.environ.get(AUTHKEY_VARIABLE):
+        return authkey.encode()
+
+    try:
+        # the file is only ever readable by the service's user until its permissions are set
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, PRIVATE_FILE_MODE)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as file:
+            file.write(secrets.token_hex(KEY_BYTES))
+
+    _set_permissions(path, file_mode, group)
+
+    return path.read_bytes().strip()
+
+
+def _set_permissions(path: Path, mode: int, group: str | None) -> None:
+    """Gives path to group, if it's given, and sets its mode."""
+    if group is not None:
+        shutil.chown(path, group=group)
+
+    path.chmod(mode)
+
+
+def normalized_params(sim: Simulator) -> dict[str, Any]:
+    """Returns the parameters of sim with every number as a float, so that parameters which only differ
+    in whether a number was written as an int, such as 5 and 5.0, are the same.
+    """
+    return {
+        name: float(value) if isinstance(value, int | float) and not isinstance(value, bool) else value
+        for name, value in sim.params().items()
+    }
+
+
+def simulation_key(sim: Simulator) -> str:
+    """Returns a key which is the same for every Simulator with the same parameters."""
+    params = json.dumps(normalized_params(sim), sort_keys=True)
+
+    return hashlib.sha256(params.encode()).hexdigest()
+
+
+def _simulate_to_cache(params: dict[str, Any], path: Path, file_mode: int) -> None:
+    """Simulates params in a worker process and saves the run uncompressed to path with file_mode."""
+    sim = Simulator(**params)
+    sim.simulate()
+
+    # the run only appears at path once it's complete
+    partial_path = path.with_suffix(f".{os.getpid()}.partial")
+    save_run(sim, partial_path, compress=False)
+    partial_path.chmod(file_mode)
+    partial_path.replace(path)
+
+
+class SimulationService:
+    """Schedules the requested simulations on a pool of worker processes and caches their results.
+    The cache directory and the runs and key in it are shared with group if it's given, and otherwise private.
+    The key is read from or generated into key_path, by default key_file(cache_dir).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        workers: int,
+        max_cache_bytes: float,
+        *,
+        group: str | None = None,
+        key_path: Path | None = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_cache_bytes = max_cache_bytes
+        self.group = group
+        self.file_mode = PRIVATE_FILE_MODE if group is None else SHARED_FILE_MODE
+
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        # reentrant since a done callback is called by the thread that adds it if the future has already finished
+        self._lock = threading.RLock()
+        # (priority, request number, key) of the queued simulations.
+        # a simulation requested again with a higher priority has an entry for each priority
+        self._queue: list[tuple[int, int, str]] = []
+        self._request_numbers = itertools.count()
+        # key: (parameters, future of the path of the run) of the simulations which are queued or running
+        self._pending: dict[str, tuple[dict[str, Any], Future[Path]]] = {}
+        self._num_running = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        _set_permissions(self.cache_dir, PRIVATE_DIR_MODE if group is None else SHARED_DIR_MODE, group)
+
+        self._authkey = _service_authkey(key_file(cache_dir) if key_path is None else key_path, self.file_mode, group)
+
+    def request(self, params: dict[str, Input], priority: int) -> tuple[Future[Path], bool]:
+        """Returns a future of the path of the run with params and whether the run was already cached.
+        Raises a ValueError or TypeError if params are invalid.
+        """
+        if unknown := set(params) - set(PARAM_NAMES):
+            msg = f"Unknown parameters {', '.join(sorted(unknown))}."
+            raise ValueError(msg)
+
+        sim = Simulator()
+        for attribute_name, value in params.items():
+            setattr(sim, attribute_name, value)
+
+        key = simulation_key(sim)
+        path = self.cache_dir / f"{key}.npz"
+
+        with self._lock:
+            if path.exists():
+                # the modification time orders the runs by when they were last used
+                path.touch()
+
+                future: Future[Path] = Future()
+                future.set_result(path)
+                return future, True
+
+            if key not in self._pending:
+                self._pending[key] = (normalized_params(sim), Future())
+
+            heapq.heappush(self._queue, (priority, next(self._request_numbers), key))
+            self._start_queued()
+
+            return self._pending[key][1], False
+
+    def status(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": len(self._pending) - self._num_running,
+                "running": self._num_running,
+                "cached": sum(1 for _ in self.cache_dir.glob("*.npz")),
+            }
+
+    def _start_queued(self) -> None:
+        """Starts the queued simulations with the highest priorities on the idle workers. Must hold the lock."""
+        while self._queue and self._num_running < self.workers:
+            _, _, key = heapq.heappop(self._queue)
+
+            # the simulation was requested again with a different priority and has already been started
+            if key not in self._pending or self._pending[key][1].running():
+                continue
+
+            params, future = self._pending[key]
+            future.set_running_or_notify_cancel()
+            self._num_running += 1
+
+            path = self.cache_dir / f"{key}.npz"
+            worker_future = self._executor.submit(_simulate_to_cache, params, path, self.file_mode)
+            worker_future.add_done_callback(partial(self._on_finished, key, path))
+
+    def _on_finished(self, key: str, path: Path, worker_future: Future[None]) -> None:
+        with self._lock:
+            _, future = self._pending.pop(key)
+            self._num_running -= 1
+
+            if (error := worker_future.exception()) is not None:
+                future.set_exception(error)
+            else:
+                self._evict()
+                future.set_result(path)
+
+            self._start_queued()
+
+    def _evict(self) -> None:
+        """Deletes the least recently used runs while the cache is larger than its maximum size.
+        Runs used in the last EVICTION_GRACE_PERIOD seconds are kept so that the clients waiting for them can open them.
+        Must hold the lock.
+        """
+        runs = sorted((path.stat().st_mtime, path.stat().st_size, path) for path in self.cache_dir.glob("*.npz"))
+        cache_bytes = sum(size for _, size, _ in runs)
+
+        for last_used, size, path in runs:
+            if cache_bytes <= self.max_cache_bytes or time.time() - last_used < EVICTION_GRACE_PERIOD:
+                break
+
+            try:
+                path.unlink()
+            except OSError:
+                # runs which a client has open can't be deleted on Windows
+                continue
+
+            cache_bytes -= size
+
+    def serve(self, address: Address, socket_mode: int | None = None) -> None:
+        """Accepts connections at address until interrupted, serving each connection in its own thread.
+        A Unix socket is given socket_mode, by default private or shared with the service's group.
+        """
+        with Listener(address, authkey=self._authkey) as listener:
+            if isinstance(address, str):
+                if socket_mode is None:
+                    socket_mode = PRIVATE_FILE_MODE if self.group is None else SHARED_SOCKET_MODE
+
+                _set_permissions(Path(address), socket_mode, self.group)
+
+            print(f"Serving simulations at {address} with {self.workers} workers, caching runs in {self.cache_dir}")
+
+            while True:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    print(f"Rejected connection: {e}")
+                    continue
+
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _serve_connection(self, connection: Connection) -> None:
+        """Replies to the requests of a client until it disconnects.
+        Each request is a JSON object which is either {"request": "simulate", "params": {...}, "priority": int},
+        whose reply is {"path": str, "cached": bool}, or {"request": "status"}.
+        A request which fails is replied to with {"error": str}.
+        """
+        with connection:
+            while True:
+                try:
+                    message = json.loads(connection.recv_bytes())
+                except (EOFError, OSError):
+                    return
+                except ValueError:
+                    _send(connection, {"error": "Requests must be JSON objects."})
+                    continue
+
+                try:
+                    reply = self._reply(message)
+                except Exception as e:  # noqa: BLE001
+                    # the client is told about every error so that it doesn't wait forever
+                    reply = {"error": str(e) or type(e).__name__}
+
+                try:
+                    _send(connection, reply)
+                except OSError:
+                    return
+
+    def _reply(self, message: Any) -> dict[str, Any]:  # noqa: ANN401
+        request = message.get("request") if isinstance(message, dict) else None
+
+        if request == "status":
+            return self.status()
+
+        if request == "simulate":
+            future, cached = self.request(message["params"], int(message.get("priority", INTERACTIVE_PRIORITY)))
+
+            return {"path": str(future.result().resolve()), "cached": cached}
+
+        msg = f"Unknown request {request!r}."
+        raise ValueError(msg)
+
+
+def _send(connection: Connection, message: dict[str, Any]) -> None:
+    connection.send_bytes(json.dumps(message).encode())
+
+
+class SimulationClient:
+    """Connection to the simulation service.
+    Raises a ConnectionError if the service isn't running at address, its key can't be read,
+    or it doesn't have the same key.
+    """
+
+    def __init__(self, address: Address | None = None) -> None:
+        if address is None:
+            address = service_address() or parse_address(DEFAULT_ADDRESS)
+
+        try:
+            self._connection = Client(address, authkey=_authkey())
+        except AuthenticationError as e:
+            msg = f"The simulation service at {address} has a different key."
+            raise ConnectionError(msg) from e
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def simulate(self, params: dict[str, Input], priority: int = INTERACTIVE_PRIORITY) -> Path:
+        """Waits for the service to simulate the Simulator with params, attribute name: value,
+        and returns the path of the run in its cache, which can be loaded with load_run.
+        Raises a ValueError if the parameters are invalid or the simulation failed.
+        """
+        reply = self._request({"request": "simulate", "params": params, "priority": priority})
+
+        return Path(reply["path"])
+
+    def status(self) -> dict[str, int]:
+        """Returns the number of workers of the service and its numbers of queued, running and cached simulations."""
+        return self._request({"request": "status"})
+
+    def _request(self, message: dict[str, Any]) -> dict[str, Any]:
+        _send(self._connection, message)
+
+        try:
+            reply: dict[str, Any] = json.loads(self._connection.recv_bytes())
+        except EOFError as e:
+            msg = "The simulation service closed the connection."
+            raise ConnectionError(msg) from e
+
+        if "error" in reply:
+            raise ValueError(reply["error"])
+
+        return reply
+
+
+def request_simulation(
+    params: dict[str, Input],
+    address: Address | None = None,
+    *,
+    priority: int = INTERACTIVE_PRIORITY,
+) -> Simulator:
+    """Returns the Simulator with params simulated by the service, memory-mapped from its cache."""
+    with SimulationClient(address) as client:
+        return load_run(client.simulate(params, priority))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--address",
+        default=os.environ.get(ADDRESS_VARIABLE, DEFAULT_ADDRESS),
+        help=f"host:port or the path of a Unix socket, defaults to ${ADDRESS_VARIABLE} or {DEFAULT_ADDRESS}",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-cache-gb", type=float, default=DEFAULT_MAX_CACHE_GB, help="maximum size of the cache")
+    parser.add_argument(
+        "--group",
+        help="group whose members can connect to the Unix socket and read the cache and key, on Unix only",
+    )
+    parser.add_argument(
+        "--socket-mode",
+        type=partial(int, base=8),
+        help="octal permissions of the Unix socket, by default 600, or 660 with --group",
+    )
+    args = parser.parse_args()
+
+    try:
+        service = SimulationService(
+            args.cache_dir,
+            max(1, args.workers),
+            args.max_cache_gb * 1e9,
+            group=args.group,
+        )
+    except (OSError, LookupError) as e:
+        raise SystemExit(str(e)) from e
+
+    try:
+        service.serve(parse_address(args.address), args.socket_mode)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
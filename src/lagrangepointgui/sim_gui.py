@@ -1,62 +1,70 @@
-# ruff: noqa: N802 N803 N806 N812
+# ruff: noqa: N802 N803 N806 N812 N815
 import sys
 from collections.abc import Callable
-from typing import TypeAlias, cast
 
-from PyQt6.QtCore import QObject, QRunnable, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtCore import QObject, QRunnable, Qt, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import (
     QApplication,
     QCheckBox,
     QComboBox,
     QErrorMessage,
+    QFileDialog,
     QFormLayout,
     QHBoxLayout,
     QLabel,
     QLineEdit,
     QMainWindow,
+    QProgressBar,
     QPushButton,
     QVBoxLayout,
     QWidget,
 )
 
 from src.lagrangepointgui.orbit_plotter import Plotter
+from src.lagrangepointgui.params import (
+    AUTO_TIME_STEP,
+    LAGRANGE_LABEL,
+    LAGRANGE_PARAM,
+    PARAM_LABEL_TO_ATTRIBUTE_NAME,
+    SATELLITE_PARAMS,
+    SIMULATION_PARAMS,
+    SYSTEM_PARAMS,
+    TIME_STEP_LABEL,
+    Input,
+    Params,
+)
+from src.lagrangepointgui.prefetch import PresetPrefetcher, RunCache
+from src.lagrangepointgui.prefetch import prefetch_setting as prefetchSetting
+from src.lagrangepointgui.prefetch import preset_jobs as presetJobs
+from src.lagrangepointgui.prefetch import presets_to_prefetch as presetsToPrefetch
+from src.lagrangepointgui.prefetch import record_recent_preset as recordRecentPreset
+from src.lagrangepointgui.presets import preset_registry as presetRegistry
 from src.lagrangepointgui.presets import read_presets as readPresets
 from src.lagrangepointgui.safe_eval import safe_eval as safeEval
-from src.lagrangepointsimulator import Simulator
-
-LAGRANGE_LABEL = "Lagrange label"
-
-Params: TypeAlias = dict[str, tuple[str, str]]
+from src.lagrangepointgui.service import Address
+from src.lagrangepointgui.service import request_simulation as requestSimulation
+from src.lagrangepointgui.service import service_address as serviceAddress
+from src.lagrangepointgui.service import simulation_key as simulationKey
+from src.lagrangepointsimulator import CancellationToken, SimulationCancelledError, Simulator
+from src.lagrangepointsimulator.step_selection import TimeStepChoice
+from src.lagrangepointsimulator.trajectory_io import load_run as loadRun
+from src.lagrangepointsimulator.trajectory_io import save_run as saveRun
+from src.lagrangepointsimulator.warmup import kernel_warmup, launch_threading_layer
 
-# parameter label in gui: (default value, attribute name in Simulator)
-SIMULATION_PARAMS: Params = {
-    "number of years": ("10.0", "num_years"),
-    "time step (hours)": ("1.0", "time_step"),
-}
-
-SATELLITE_PARAMS: Params = {
-    "perturbation size": ("0.0", "perturbation_size"),
-    "perturbation angle": ("", "perturbation_angle"),
-    "initial speed": ("1.0", "speed"),
-    "initial velocity angle": ("", "vel_angle"),
-}
+SIMULATE = "Simulate"
 
-LAGRANGE_PARAM: Params = {LAGRANGE_LABEL: ("L4", "lagrange_label")}
+TOGGLE_ANIMATION = "Toggle Animation"
 
-SYSTEM_PARAMS: Params = {
-    "star mass": ("sun_mass", "star_mass"),
-    "planet mass": ("earth_mass", "planet_mass"),
-    "planet distance": ("1.0", "planet_distance"),
-}
+PLOT_CONSERVED = "Plot Conserved Quantities"
 
-Input: TypeAlias = str | float | None
+CANCEL = "Cancel"
 
-SIMULATE = "Simulate"
+SAVE_RUN = "Save Run"
 
-TOGGLE_ANIMATION = "Toggle Animation"
+LOAD_RUN = "Load Run"
 
-PLOT_CONSERVED = "Plot Conserved Quantities"
+RUN_FILE_FILTER = "Simulation Runs (*.npz)"
 
 
 # noinspection PyPep8Naming
@@ -70,6 +78,8 @@ class _SimUi(QMainWindow):
         self.presetBox = QComboBox()
         self.buttons: dict[str, QPushButton] = {}
         self.autoPlotConserved = QCheckBox("Auto Plot Conserved")
+        self.progressBar = QProgressBar()
+        self.cancelButton = QPushButton(CANCEL)
 
         self.setWindowTitle("Orbits near Lagrange Points")
 
@@ -85,6 +95,7 @@ class _SimUi(QMainWindow):
         self._inputsLayout = QFormLayout()
         inputAndOrbitsLayout.addLayout(self._inputsLayout)
         self._addButtons()
+        self._addProgressBar()
         self._addPresetBox()
         self._addInputFields()
         inputAndOrbitsLayout.addWidget(self._plotter.inertial_plot)
@@ -96,6 +107,7 @@ class _SimUi(QMainWindow):
         conservedPlotsLayout.addWidget(self._plotter.linear_momentum_plot)
         conservedPlotsLayout.addWidget(self._plotter.angular_momentum_plot)
         conservedPlotsLayout.addWidget(self._plotter.energy_plot)
+        conservedPlotsLayout.addWidget(self._plotter.jacobi_constant_plot)
 
         self.resize(mainLayout.sizeHint())
 
@@ -109,6 +121,30 @@ class _SimUi(QMainWindow):
 
         buttonsLayout.addWidget(self.autoPlotConserved)
 
+        runFileButtonsLayout = QHBoxLayout()
+        self._inputsLayout.addRow(runFileButtonsLayout)
+
+        for btnText in (SAVE_RUN, LOAD_RUN):
+            self.buttons[btnText] = QPushButton(btnText)
+            runFileButtonsLayout.addWidget(self.buttons[btnText])
+
+    def _addProgressBar(self) -> None:
+        progressLayout = QHBoxLayout()
+        self._inputsLayout.addRow(progressLayout)
+
+        self.progressBar.setRange(0, 100)
+        progressLayout.addWidget(self.progressBar)
+
+        self.cancelButton.setEnabled(False)
+        progressLayout.addWidget(self.cancelButton)
+
+    def setProgress(self, percent: int) -> None:
+        self.progressBar.setValue(percent)
+
+    def resetProgress(self) -> None:
+        self.progressBar.reset()
+        self.cancelButton.setEnabled(False)
+
     def _addPresetBox(self) -> None:
         presets, _ = readPresets()
         self.presetBox.addItems(presets)
@@ -149,10 +185,26 @@ class _SimUi(QMainWindow):
         self.inputFields[LAGRANGE_LABEL] = field
         self._inputsLayout.addRow(LAGRANGE_LABEL, box)
 
+    def setSimulator(self, sim: Simulator) -> None:
+        """Set the simulator whose results are plotted."""
+        self._plotter.sim = sim
+
+    def isPlotted(self) -> bool:
+        """Whether the results of a completed simulation are plotted."""
+        return self._plotted
+
     def updateOrbitPlots(self) -> None:
         self._plotted = True
         self._plotter.plot_orbit_inertial_and_corotating()
 
+    def startProgressiveOrbitPlots(self) -> None:
+        # the plots can't be animated or used for conserved quantities until the simulation has finished
+        self._plotted = False
+        self._plotter.start_progressive_plot()
+
+    def extendProgressiveOrbitPlots(self, stepsDone: int) -> None:
+        self._plotter.extend_progressive_plot(stepsDone)
+
     def toggleAnimation(self) -> None:
         if not self._plotted:
             _displayErrorMessage("No plots to animate.")
@@ -175,6 +227,7 @@ class _SimUi(QMainWindow):
 
     def getInputs(self) -> dict[str, Input]:
         """Get the parameters from the input fields. Returns a dict of parameter label to value.
+        The time step is AUTO_TIME_STEP if it should be chosen automatically.
         Raises a ValueError if any of the numerical fields can't be evaluated."""
         inputs: dict[str, Input] = {}
         for fieldLabel, field in self.inputFields.items():
@@ -184,6 +237,10 @@ class _SimUi(QMainWindow):
                 inputs[fieldLabel] = fieldText
                 continue
 
+            if fieldLabel == TIME_STEP_LABEL and fieldText.strip().lower() == AUTO_TIME_STEP:
+                inputs[fieldLabel] = AUTO_TIME_STEP
+                continue
+
             try:
                 value = safeEval(fieldText)
             except (ValueError, TypeError) as e:
@@ -194,11 +251,10 @@ class _SimUi(QMainWindow):
 
         return inputs
 
-
-ALL_PARAMS = SIMULATION_PARAMS | SATELLITE_PARAMS | LAGRANGE_PARAM | SYSTEM_PARAMS
-
-# used to translate param labels used in gui to attribute names in simulator class
-PARAM_LABEL_TO_ATTRIBUTE_NAME = {paramLabel: attribute for paramLabel, (_, attribute) in ALL_PARAMS.items()}
+    def setInputs(self, inputs: dict[str, Input]) -> None:
+        """Set the input fields from a dict of parameter label to value."""
+        for fieldLabel, value in inputs.items():
+            self.inputFields[fieldLabel].setText("" if value is None else str(value))
 
 
 def _translateInputs(inputs: dict[str, Input]) -> dict[str, Input]:
@@ -207,6 +263,13 @@ def _translateInputs(inputs: dict[str, Input]) -> dict[str, Input]:
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
+    cancelled = pyqtSignal()
+    # message of the error which stopped the work
+    error = pyqtSignal(str)
+    # percentage of the work completed
+    progress = pyqtSignal(int)
+    # number of simulation steps completed, emitted after each chunk of steps
+    chunkFinished = pyqtSignal(int)
 
 
 class ExpensiveFuncRunner(QRunnable):
@@ -215,19 +278,96 @@ class ExpensiveFuncRunner(QRunnable):
         self.expensiveFunc = expensiveFunc
         self.signals = WorkerSignals()
 
+    # noinspection PyUnresolvedReferences
     def run(self) -> None:
-        self.expensiveFunc()
-        # noinspection PyUnresolvedReferences
+        try:
+            self.expensiveFunc()
+        except SimulationCancelledError:
+            self.signals.cancelled.emit()
+            return
+
+        except (OSError, ValueError) as e:
+            self.signals.error.emit(str(e))
+            return
+
         self.signals.finished.emit()
 
 
+class SimulationRunner(ExpensiveFuncRunner):
+    """Runs a simulation, reporting its progress after each chunk of steps."""
+
+    def __init__(self, sim: Simulator, cancellationToken: CancellationToken) -> None:
+        super().__init__(lambda: sim.simulate(self.reportProgress, cancellationToken))
+        self.sim = sim
+        self.cancellationToken = cancellationToken
+
+    # noinspection PyUnresolvedReferences
+    def reportProgress(self, stepsDone: int, numSteps: int) -> None:
+        self.signals.chunkFinished.emit(stepsDone)
+        self.signals.progress.emit(100 * stepsDone // numSteps)
+
+
 class _SimCtrl:
     def __init__(self, model: Simulator, view: _SimUi) -> None:
+        # the model whose results are displayed.
+        # new simulations run on a spare model so the displayed results stay live
+        # until the first chunk of the new simulation is ready.
         self._model = model
+        self._spareModels: list[Simulator] = []
+        self._runningModels: list[Simulator] = []
         self._view = view
         self._connectSignals()
         self._addReturnPressed()
         self._calculating = False
+        self._cancellationToken: CancellationToken | None = None
+        # whether the displayed model is a simulation which is running or was cancelled,
+        # whose arrays are only filled in up to the steps done
+        self._displayingPartialRun = False
+        # simulations are run by the local simulation service if its address is set in the environment
+        self._serviceAddress = serviceAddress()
+        # presets are simulated in the background if it's enabled in the environment.
+        # the service already shares the runs of every client so presets aren't prefetched when it's used
+        self._prefetchSetting = prefetchSetting()
+        self._prefetcher: PresetPrefetcher | None = None
+        if self._prefetchSetting != 0 and self._serviceAddress is None:
+            self._prefetcher = PresetPrefetcher(RunCache())
+        # importing Numba takes a while so the warm-up starts once the event loop is running
+        # which allows the window to be shown first
+        QTimer.singleShot(0, self._warmUpKernels)
+
+    # noinspection PyUnresolvedReferences
+    def _warmUpKernels(self) -> None:
+        """Compile the simulation kernels in the background so that the first simulation isn't slowed down."""
+        self._view.statusBar().showMessage(kernel_warmup.summary())  # type: ignore[union-attr]
+
+        launch_threading_layer()
+        runnable = ExpensiveFuncRunner(kernel_warmup.run)
+        runnable.signals.finished.connect(
+            lambda: self._view.statusBar().showMessage(kernel_warmup.summary()),  # type: ignore[union-attr]
+        )
+        # the kernels are compiled once by the warm-up instead of by every prefetching thread
+        runnable.signals.finished.connect(self._startPrefetching)
+        _startInThreadPool(runnable)
+
+    def _startPrefetching(self) -> None:
+        """Simulate the presets to prefetch, with the current simulation parameters, in the background.
+        Nothing is prefetched while a simulation is running."""
+        if self._prefetcher is None or self._cancellationToken is not None:
+            return
+
+        try:
+            attributeNameToValue = _translateInputs(self._view.getInputs())
+        except ValueError:
+            return
+
+        presets, _ = readPresets()
+        presetNames = presetsToPrefetch(list(presets), self._prefetchSetting)
+
+        self._prefetcher.prefetch(presetJobs(presetNames, attributeNameToValue))
+
+    def shutdown(self) -> None:
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown()
 
     # noinspection PyUnresolvedReferences
     def _connectSignals(self) -> None:
@@ -235,28 +375,34 @@ class _SimCtrl:
             SIMULATE: self._simulate,
             TOGGLE_ANIMATION: self._toggleAnimation,
             PLOT_CONSERVED: self._plotConservedQuantities,
+            SAVE_RUN: self._saveRun,
+            LOAD_RUN: self._loadRun,
         }
         for btnText, btn in self._view.buttons.items():
             action = btnActions[btnText]
             btn.clicked.connect(action)
 
         self._view.presetBox.activated.connect(self._applySelectedPreset)
+        self._view.cancelButton.clicked.connect(self._cancelSimulation)
 
     def _applySelectedPreset(self) -> None:
         presetName = self._view.presetBox.currentText()
         self._applyPreset(presetName)
 
+        # with prefetching, choosing a preset displays its run, which is instant if it has been prefetched
+        if self._prefetcher is not None:
+            recordRecentPreset(presetName)
+            self._simulate()
+
     def _applyPreset(self, presetName: str) -> None:
-        presets, _ = readPresets()
-        preset = presets[presetName]
-        bases = cast(list[str], preset.get("bases", []))
-        for base in bases:
-            self._applyPreset(base)
+        try:
+            preset = presetRegistry.resolve(presetName)
 
-        for paramLabel, value in preset.items():
-            if paramLabel == "bases":
-                continue
+        except ValueError as e:
+            _displayErrorMessage(str(e))
+            return
 
+        for paramLabel, value in preset.items():
             field = self._view.inputFields[paramLabel]
             field.setText(str(value))
 
@@ -278,36 +424,291 @@ class _SimCtrl:
             _displayErrorMessage(str(e))
             return
 
+        if paramLabelToValue[TIME_STEP_LABEL] == AUTO_TIME_STEP:
+            self._chooseTimeStep(paramLabelToValue)
+            return
+
         attributeNameToValue = _translateInputs(paramLabelToValue)
 
+        sim = self._spareModels.pop() if self._spareModels else Simulator()
+
         try:
             for attributeName, value in attributeNameToValue.items():
-                setattr(self._model, attributeName, value)
+                setattr(sim, attributeName, value)
 
         except (TypeError, ValueError) as e:
-            msg = str(e)
-            # replace attribute names with parameter labels
-            for paramLabel, attributeName in PARAM_LABEL_TO_ATTRIBUTE_NAME.items():
-                msg = msg.replace(attributeName, paramLabel)
+            self._spareModels.append(sim)
+            _displayErrorMessage(_paramErrorMessage(e))
+            return
 
-            _displayErrorMessage(msg)
+        # starting a new simulation replaces the one already running
+        self._cancelSimulation()
+
+        if (cachedSim := self._prefetchedRun(sim)) is not None:
+            self._releaseModel(sim)
+            self._displayRun(cachedSim)
+            self._view.statusBar().showMessage("Displayed a prefetched run.")  # type: ignore[union-attr]
             return
 
-        self._view.stopAnimation()
-        onFinishFuncs = [self._view.updateOrbitPlots]
+        if self._prefetcher is not None:
+            # the user's simulation gets every core
+            self._prefetcher.cancel()
+
+        if self._serviceAddress is not None:
+            self._runSimulationInService(sim, self._serviceAddress)
+        else:
+            self._runSimulationInThread(sim)
+
+    def _chooseTimeStep(self, paramLabelToValue: dict[str, Input]) -> None:
+        """Choose the time step in the background from short pilot simulations,
+        then show it in its field and simulate with it."""
+        del paramLabelToValue[TIME_STEP_LABEL]
+
+        sim = Simulator()
+        try:
+            for attributeName, value in _translateInputs(paramLabelToValue).items():
+                setattr(sim, attributeName, value)
+
+        except (TypeError, ValueError) as e:
+            _displayErrorMessage(_paramErrorMessage(e))
+            return
+
+        choices: list[TimeStepChoice] = []
+
+        self._disableButtonsExceptToggleAnimation()
+        self._view.statusBar().showMessage("Choosing the time step...")  # type: ignore[union-attr]
+        self._runInThread(lambda: choices.append(sim.choose_time_step()), [lambda: self._onTimeStepChosen(choices[0])])
+
+    def _onTimeStepChosen(self, choice: TimeStepChoice) -> None:
+        self._view.inputFields[TIME_STEP_LABEL].setText(f"{choice.time_step:.4g}")
+        self._view.statusBar().showMessage(choice.describe())  # type: ignore[union-attr]
+
+        if not choice.met_tolerance:
+            _displayErrorMessage(choice.describe())
+
+        self._simulate()
+
+    def _prefetchedRun(self, sim: Simulator) -> Simulator | None:
+        """The prefetched run with the same parameters as sim, if there is one."""
+        if self._prefetcher is None:
+            return None
+
+        return self._prefetcher.cache.get(simulationKey(sim))
+
+    # noinspection PyUnresolvedReferences
+    def _runSimulationInThread(self, sim: Simulator) -> None:
+        token = CancellationToken()
+        self._cancellationToken = token
+
+        runnable = SimulationRunner(sim, token)
+        runnable.signals.progress.connect(lambda percent: self._onSimulationProgress(token, percent))
+        runnable.signals.chunkFinished.connect(lambda stepsDone: self._onChunkFinished(sim, token, stepsDone))
+        runnable.signals.finished.connect(lambda: self._onSimulationFinished(sim, token))
+        runnable.signals.cancelled.connect(lambda: self._onSimulationCancelled(sim, token))
+
+        self._view.setProgress(0)
+        self._view.cancelButton.setEnabled(True)
+        self._updateRunButtons()
+
+        self._runningModels.append(sim)
+        _startInThreadPool(runnable)
+
+    # noinspection PyUnresolvedReferences
+    def _runSimulationInService(self, sim: Simulator, address: Address) -> None:
+        """Have the simulation service run the simulation and display the run from its cache once it's finished.
+        The service doesn't report progress and a cancelled simulation still finishes in the service
+        but isn't displayed.
+        """
+        token = CancellationToken()
+        self._cancellationToken = token
+
+        params = sim.params()
+        # sim was only used to check the inputs
+        self._releaseModel(sim)
+
+        loaded: list[Simulator] = []
+        runnable = ExpensiveFuncRunner(lambda: loaded.append(requestSimulation(params, address)))
+        runnable.signals.finished.connect(lambda: self._onServiceSimulationFinished(loaded[0], token))
+        runnable.signals.error.connect(lambda message: self._onServiceSimulationFailed(message, token))
+
+        self._view.setProgress(0)
+        self._view.cancelButton.setEnabled(True)
+        self._updateRunButtons()
+        self._view.statusBar().showMessage(f"Simulating in the service at {address}")  # type: ignore[union-attr]
+
+        _startInThreadPool(runnable)
+
+    def _onServiceSimulationFinished(self, sim: Simulator, token: CancellationToken) -> None:
+        if token is not self._cancellationToken:
+            return
+
+        # the run is displayed like a simulation which finished in this process
+        self._runningModels.append(sim)
+        self._onSimulationFinished(sim, token)
+
+    def _onServiceSimulationFailed(self, message: str, token: CancellationToken) -> None:
+        if token is not self._cancellationToken:
+            return
+
+        self._cancelSimulation()
+        _displayErrorMessage(message)
+
+    def _cancelSimulation(self) -> None:
+        if self._cancellationToken is None:
+            return
+
+        self._cancellationToken.cancel()
+        self._cancellationToken = None
+        self._view.resetProgress()
+        self._updateRunButtons()
+
+    def _onSimulationProgress(self, token: CancellationToken, percent: int) -> None:
+        if token is self._cancellationToken:
+            self._view.setProgress(percent)
+
+    def _onChunkFinished(self, sim: Simulator, token: CancellationToken, stepsDone: int) -> None:
+        if token is not self._cancellationToken:
+            return
+
+        if sim is not self._model:
+            self._displayModel(sim)
+            self._displayingPartialRun = True
+            self._updateRunButtons()
+            self._view.startProgressiveOrbitPlots()
+
+        self._view.extendProgressiveOrbitPlots(stepsDone)
+
+    def _onSimulationFinished(self, sim: Simulator, token: CancellationToken) -> None:
+        self._runningModels.remove(sim)
+
+        # the last chunk can finish after the simulation was cancelled
+        if token is not self._cancellationToken:
+            self._releaseModel(sim)
+            self._startPrefetching()
+            return
+
+        self._cancellationToken = None
+        self._view.resetProgress()
+
+        if sim is not self._model:
+            self._displayModel(sim)
+
+        self._displayingPartialRun = False
+        self._updateRunButtons()
+
+        self._view.updateOrbitPlots()
+
+        if sim.storage_plan is not None and sim.storage_plan.mode != "full":
+            # the run didn't fit in the memory budget so the user is told how it was stored instead
+            self._view.statusBar().showMessage(sim.storage_plan.describe())  # type: ignore[union-attr]
+
         if self._view.autoPlotConserved.isChecked():
-            onFinishFuncs.append(self._plotConservedQuantities)
+            self._plotConservedQuantities()
+
+        self._startPrefetching()
+
+    def _onSimulationCancelled(self, sim: Simulator, token: CancellationToken) -> None:
+        self._runningModels.remove(sim)
+        self._releaseModel(sim)
+
+        if token is self._cancellationToken:
+            self._cancelSimulation()
+
+        if sim is self._model:
+            self._view.statusBar().showMessage(  # type: ignore[union-attr]
+                "Cancelled. The run is only partly simulated so it can't be saved "
+                "or have its conserved quantities plotted.",
+            )
+
+        self._startPrefetching()
+
+    def _displayModel(self, sim: Simulator) -> None:
+        previousModel = self._model
+        self._model = sim
+        self._displayingPartialRun = False
+
+        self._view.stopAnimation()
+        self._view.setSimulator(sim)
+
+        self._releaseModel(previousModel)
+
+    def _releaseModel(self, sim: Simulator) -> None:
+        """Make sim available for new simulations if it is neither displayed, still running, nor prefetched."""
+        if sim is self._model or sim in self._runningModels:
+            return
+
+        if self._prefetcher is not None and self._prefetcher.cache.holds(sim):
+            return
+
+        self._spareModels.append(sim)
 
-        self._disableButtons()
-        self._runInThread(self._model.simulate, onFinishFuncs)
+    def _saveRun(self) -> None:
+        if self._calculating:
+            return
+
+        if not self._view.isPlotted():
+            _displayErrorMessage("No simulation to save.")
+            return
+
+        if self._displayingPartialRun:
+            _displayErrorMessage("Only finished simulations can be saved.")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self._view, SAVE_RUN, "", RUN_FILE_FILTER)
+        if not path:
+            return
+
+        sim = self._model
+
+        self._disableButtonsExceptToggleAnimation()
+        self._runInThread(
+            lambda: saveRun(sim, path),
+            [lambda: self._view.statusBar().showMessage(f"Saved run to {path}")],  # type: ignore[union-attr]
+        )
+
+    def _loadRun(self) -> None:
+        if self._calculating:
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self._view, LOAD_RUN, "", RUN_FILE_FILTER)
+        if not path:
+            return
+
+        loaded: list[Simulator] = []
+
+        self._disableButtonsExceptToggleAnimation()
+        self._runInThread(lambda: loaded.append(loadRun(path)), [lambda: self._onRunLoaded(loaded[0])])
+
+    def _onRunLoaded(self, sim: Simulator) -> None:
+        """Display a loaded run without simulating it."""
+        # a loaded run replaces the simulation that is running
+        self._cancelSimulation()
+
+        self._view.setInputs({label: getattr(sim, name) for label, name in PARAM_LABEL_TO_ATTRIBUTE_NAME.items()})
+        self._displayRun(sim)
+
+    def _displayRun(self, sim: Simulator) -> None:
+        """Display a simulation which has already finished."""
+        self._displayModel(sim)
+        self._view.updateOrbitPlots()
+
+        if self._view.autoPlotConserved.isChecked():
+            self._plotConservedQuantities()
 
     def _enableButtons(self) -> None:
         for btn in self._view.buttons.values():
             btn.setEnabled(True)
 
-    def _disableButtons(self) -> None:
-        for btn in self._view.buttons.values():
-            btn.setEnabled(False)
+        self._updateRunButtons()
+
+    def _updateRunButtons(self) -> None:
+        """Only enable the buttons which use all of the displayed run's arrays if it has finished and isn't
+        being used by a calculation. Conserved quantities also aren't calculated while a simulation is running.
+        """
+        finished = not self._displayingPartialRun and not self._calculating
+
+        self._view.buttons[SAVE_RUN].setEnabled(finished)
+        self._view.buttons[PLOT_CONSERVED].setEnabled(finished and self._cancellationToken is None)
 
     def _disableButtonsExceptToggleAnimation(self) -> None:
         for btnText, btn in self._view.buttons.items():
@@ -320,6 +721,9 @@ class _SimCtrl:
         self._view.toggleAnimation()
 
     def _plotConservedQuantities(self) -> None:
+        if self._calculating or self._displayingPartialRun:
+            return
+
         self._disableButtonsExceptToggleAnimation()
         self._runInThread(self._view.calcConservedQuantities, [self._view.plotConservedQuantities])
 
@@ -328,21 +732,40 @@ class _SimCtrl:
         """Run an expensive function in a separate thread."""
         runnable = ExpensiveFuncRunner(expensiveFunc)
 
-        runnable.signals.finished.connect(self._enableButtons)
+        # the calculation is finished before the buttons are enabled so that they all are
         runnable.signals.finished.connect(self._setCalculatingFalse)
+        runnable.signals.finished.connect(self._enableButtons)
         for onFinishFunc in onFinishFuncs:
             runnable.signals.finished.connect(onFinishFunc)
 
-        if not (pool := QThreadPool.globalInstance()):
-            msg = "Unable to find thread pool."
-            raise RuntimeError(msg)
-        pool.start(runnable)
+        runnable.signals.error.connect(self._setCalculatingFalse)
+        runnable.signals.error.connect(self._enableButtons)
+        runnable.signals.error.connect(_displayErrorMessage)
+
+        _startInThreadPool(runnable)
         self._calculating = True
 
     def _setCalculatingFalse(self) -> None:
         self._calculating = False
 
 
+def _paramErrorMessage(error: Exception) -> str:
+    """The message of an error raised by setting a Simulator attribute, with parameter labels instead of names."""
+    msg = str(error)
+    for paramLabel, attributeName in PARAM_LABEL_TO_ATTRIBUTE_NAME.items():
+        msg = msg.replace(attributeName, paramLabel)
+
+    return msg
+
+
+def _startInThreadPool(runnable: QRunnable) -> None:
+    if not (pool := QThreadPool.globalInstance()):
+        msg = "Unable to find thread pool."
+        raise RuntimeError(msg)
+
+    pool.start(runnable)
+
+
 def _displayErrorMessage(message: str) -> None:
     """Display an error message in a dialog box."""
     errorMsg = QErrorMessage()
@@ -360,7 +783,9 @@ def main() -> None:
     view = _SimUi(plotter)
     view.show()
 
-    _ = _SimCtrl(sim, view)
+    ctrl = _SimCtrl(sim, view)
+    # noinspection PyUnresolvedReferences
+    simApp.aboutToQuit.connect(ctrl.shutdown)
 
     sys.exit(simApp.exec())
 
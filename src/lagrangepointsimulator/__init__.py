@@ -1,2 +1,30 @@
-from src.lagrangepointsimulator import constants, sim_types
-from src.lagrangepointsimulator.simulator import Simulator
+"""Simulates satellite orbits near Lagrange points.
+The Simulator class and sim_types are imported on first access
+so that importing constants or descriptors doesn't import NumPy or Numba.
+"""
+from typing import TYPE_CHECKING, Any
+
+from src.lagrangepointsimulator import constants
+from src.lagrangepointsimulator.cancellation import CancellationToken, SimulationCancelledError
+
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator import sim_types  # noqa: TCH004
+    from src.lagrangepointsimulator.simulator import Simulator  # noqa: TCH004
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    if name == "Simulator":
+        from src.lagrangepointsimulator.simulator import Simulator
+
+        return Simulator
+
+    if name == "sim_types":
+        from src.lagrangepointsimulator import sim_types
+
+        return sim_types
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+__all__ = ["CancellationToken", "SimulationCancelledError", "Simulator", "constants", "sim_types"]
@@ -0,0 +1,42 @@
+"""This script compiles the kernels in numba_funcs ahead of time into the extension module _aot_kernels,
+which is placed next to this file. It is run by build.sh before the app is packaged
+so that the packaged app doesn't have to compile the kernels every time it is started.
+The extension module is used by kernels.py whenever it is present.
+"""
+from pathlib import Path
+
+from numba.pycc import CC  # type: ignore
+
+from src.lagrangepointsimulator import numba_funcs
+
+MODULE_NAME = "_aot_kernels"
+
+# The kernels which are called by the Simulator class. Their callees are compiled into the module with them.
+# Ahead-of-time compilation doesn't support parallel=True
+# so transform_to_corotating and propagate_test_particles are compiled serially.
+# It also doesn't support fastmath so integrate_fastmath isn't exported and is compiled just-in-time when it's used.
+# The serial variants of the parallel kernels aren't exported since every exported kernel is already serial.
+EXPORTED_KERNELS = (
+    (numba_funcs.integrate, numba_funcs.INTEGRATE_SIGNATURE),
+    (numba_funcs.transform_to_corotating, numba_funcs.TRANSFORM_TO_COROTATING_SIGNATURE),
+    (numba_funcs.propagate_test_particles, numba_funcs.PROPAGATE_TEST_PARTICLES_SIGNATURE),
+    (numba_funcs.integrate_poincare_section, numba_funcs.POINCARE_SECTION_SIGNATURE),
+    (numba_funcs.integrate_events, numba_funcs.EVENTS_SIGNATURE),
+    (numba_funcs.calc_jacobi_constant, numba_funcs.CALC_JACOBI_CONSTANT_SIGNATURE),
+    (numba_funcs.integrate_slices, numba_funcs.INTEGRATE_SLICES_SIGNATURE),
+)
+
+
+def build(output_dir: Path = Path(__file__).parent) -> None:
+    cc = CC(MODULE_NAME)
+    cc.output_dir = str(output_dir)
+    cc.verbose = True
+
+    for kernel, signature in EXPORTED_KERNELS:
+        cc.export(kernel.__name__, signature)(kernel.py_func)
+
+    cc.compile()
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,32 @@
+"""Contains the types used to observe and cancel a running simulation."""
+from collections.abc import Callable
+from threading import Event
+from typing import TypeAlias
+
+# called with the number of steps completed and the total number of steps
+ProgressCallback: TypeAlias = Callable[[int, int], None]
+
+
+class SimulationCancelledError(Exception):
+    """Raised when a simulation is stopped by its CancellationToken."""
+
+
+class CancellationToken:
+    """Passed to a simulation to stop it from another thread.
+    The simulation checks the token in between chunks of integration steps.
+    """
+
+    def __init__(self) -> None:
+        self._cancelled = Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            msg = "Simulation was cancelled."
+            raise SimulationCancelledError(msg)
@@ -0,0 +1,91 @@
+"""Contains the Checkpoint class which holds everything needed to continue an interrupted simulation.
+Simulator.simulate saves checkpoints periodically when given a checkpoint_path
+and Simulator.resume continues a simulation from one.
+"""
+import json
+import os
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import Path
+from typing import Any, Self, cast
+
+import numpy as np
+
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+
+FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """The state of a simulation after step of its num_steps steps.
+    The integrator only uses the positions and velocities of the previous step
+    so they are all that is needed to continue the simulation exactly.
+    """
+
+    # arguments of Simulator's constructor
+    params: dict[str, Any]
+    num_steps: int
+    step: int
+    # rows are the positions and velocities of the star, planet, and satellite at step,
+    # in the order of simulator.POSITION_AND_VELOCITY_NAMES
+    state: Array2D
+    lagrange_point_trans: Array1D
+    # settings of the Simulator which aren't parameters but change its results.
+    # checkpoints from before they were saved were made with the defaults
+    kernel_variant: str = "precise"
+    record_dtype: str = "float64"
+
+    @property
+    def completed(self) -> bool:
+        return self.step == self.num_steps
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Saves the checkpoint to path. The file is replaced atomically
+        so that an interruption while saving leaves the previous checkpoint intact.
+        """
+        path = Path(path)
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "params": self.params,
+            "num_steps": self.num_steps,
+            "step": self.step,
+            "kernel_variant": self.kernel_variant,
+            "record_dtype": self.record_dtype,
+        }
+
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with Path.open(temp_path, "wb") as file:
+            np.savez(
+                file,
+                metadata=np.array(json.dumps(metadata)),
+                state=self.state,
+                lagrange_point_trans=self.lagrange_point_trans,
+            )
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        Path.replace(temp_path, path)
+
+    @classmethod
+    def load(cls: type[Self], path: str | PathLike[str]) -> Self:
+        with np.load(path, allow_pickle=False) as file:
+            metadata = json.loads(str(file["metadata"]))
+
+            if metadata["format_version"] > FORMAT_VERSION:
+                msg = (
+                    f"{path} was saved with format version {metadata['format_version']} "
+                    f"but only versions up to {FORMAT_VERSION} can be loaded."
+                )
+                raise ValueError(msg)
+
+            return cls(
+                params=cast(dict[str, Any], metadata["params"]),
+                num_steps=cast(int, metadata["num_steps"]),
+                step=cast(int, metadata["step"]),
+                state=file["state"],
+                lagrange_point_trans=file["lagrange_point_trans"],
+                kernel_variant=cast(str, metadata.get("kernel_variant", "precise")),
+                record_dtype=cast(str, metadata.get("record_dtype", "float64")),
+            )
@@ -0,0 +1,149 @@
+"""Dense output: the positions and velocities of a simulation at any time, interpolated between its stored rows,
+so a simulation only needs to store 1 in every few steps, see the storage module, to be evaluated at every step.
+
+Between two consecutive rows the positions are interpolated with the cubic Hermite polynomial through the positions
+and velocities at the rows, and the velocities with the one through the velocities and the accelerations,
+which are calculated from the positions. Over an interval of length h the error of cubic Hermite interpolation is at
+most h^4 / 384 times the largest fourth derivative in the interval, so it shrinks as the fourth power of the stride.
+interpolation_error_bound estimates that bound for the positions from the stored rows. The fourth derivatives are
+estimated at the rows rather than maximized over the intervals, so the estimate is multiplied by a safety factor.
+"""
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from src.lagrangepointsimulator.constants import G
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator.simulator import Simulator
+
+BODY_NAMES = ("star", "planet", "sat")
+
+# the largest error measured over the presets was 1.4 times the unscaled estimate, with 200 steps in between rows
+ERROR_BOUND_SAFETY_FACTOR = 2.0
+
+
+def _rows_in_double(sim: "Simulator", name: str, rows: NDArray[np.int64]) -> Array2D:
+    return getattr(sim, name)[rows].astype(np.double, copy=False)
+
+
+def _inverse_norms_cubed(vectors: Array2D) -> Array2D:
+    return np.linalg.norm(vectors, axis=1, keepdims=True) ** -3
+
+
+def calc_accelerations(sim: "Simulator", rows: NDArray[np.int64]) -> list[Array2D]:
+    """Returns the accelerations of the star, planet and satellite at rows of sim's arrays,
+    calculated from their positions in the same way as in the integrator.
+    """
+    star_pos, planet_pos, sat_pos = (_rows_in_double(sim, f"{body}_pos", rows) for body in BODY_NAMES)
+
+    planet_to_star = star_pos - planet_pos
+    sat_to_star = star_pos - sat_pos
+    sat_to_planet = planet_pos - sat_pos
+
+    g_star = G * sim.star_mass
+    g_planet = G * sim.planet_mass
+
+    planet_to_star_inverse_cubed = _inverse_norms_cubed(planet_to_star)
+
+    return [
+        -g_planet * planet_to_star_inverse_cubed * planet_to_star,
+        g_star * planet_to_star_inverse_cubed * planet_to_star,
+        g_star * _inverse_norms_cubed(sat_to_star) * sat_to_star
+        + g_planet * _inverse_norms_cubed(sat_to_planet) * sat_to_planet,
+    ]
+
+
+def _steps_of_rows(sim: "Simulator", rows: NDArray[np.int64]) -> NDArray[np.int64]:
+    return np.minimum(rows * sim.record_every, sim.num_steps)
+
+
+def _integrated_intervals(sim: "Simulator", rows: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Returns the numbers of steps between rows and the rows after them."""
+    return _steps_of_rows(sim, rows + 1) - _steps_of_rows(sim, rows)
+
+
+def interpolate_states(sim: "Simulator", times: ArrayLike) -> NDArray[np.double]:
+    """Returns the positions and velocities of a simulated Simulator at times, in seconds from the start,
+    with shape (6, number of times, 3) and rows in the order of POSITION_AND_VELOCITY_NAMES.
+    Times of stored rows give the stored positions and velocities, and other times are interpolated.
+    Raises a ValueError if a time is outside the simulation or the simulator hasn't been simulated.
+    """
+    times = np.asarray(times, dtype=np.double)
+    row_times = sim.time_points()
+
+    if len(row_times) != len(sim.star_pos) or len(row_times) < 2:  # noqa: PLR2004
+        msg = "The simulator must be simulated for at least one step before its states can be interpolated."
+        raise ValueError(msg)
+
+    if np.any((times < 0) | (times > row_times[-1])):
+        msg = f"The times must be between 0 and {row_times[-1]} seconds."
+        raise ValueError(msg)
+
+    starts = np.clip(np.searchsorted(row_times, times, side="right") - 1, 0, len(row_times) - 2)
+    ends = starts + 1
+
+    theta = ((times - row_times[starts]) / (row_times[ends] - row_times[starts]))[:, np.newaxis, np.newaxis]
+    theta_2 = theta * theta
+    theta_3 = theta_2 * theta
+
+    h00 = 2 * theta_3 - 3 * theta_2 + 1
+    h01 = -2 * theta_3 + 3 * theta_2
+    # the velocities are derivatives with respect to the integrated time, which runs backwards if the time step does.
+    # the row times are spread evenly over sim_time, but the integrator advances by the time step,
+    # so the lengths of the intervals in the integrated time are their numbers of steps times the time step.
+    # they're folded into the basis polynomials of the derivatives
+    signed_intervals = (_integrated_intervals(sim, starts) * sim.time_step_in_seconds)[:, np.newaxis, np.newaxis]
+    h10 = (theta_3 - 2 * theta_2 + theta) * signed_intervals
+    h11 = (theta_3 - theta_2) * signed_intervals
+
+    rows, inverse = np.unique(np.concatenate((starts, ends)), return_inverse=True)
+
+    # positions, velocities and accelerations of the bodies at the rows, with shape (rows, 3, bodies, 3),
+    # so that those at the ends of each time's interval are gathered at once
+    rows_data = np.stack(
+        (
+            np.stack([_rows_in_double(sim, f"{body}_pos", rows) for body in BODY_NAMES], axis=1),
+            np.stack([_rows_in_double(sim, f"{body}_vel", rows) for body in BODY_NAMES], axis=1),
+            np.stack(calc_accelerations(sim, rows), axis=1),
+        ),
+        axis=1,
+    )
+    data_0 = rows_data[inverse[: len(times)]]
+    data_1 = rows_data[inverse[len(times) :]]
+
+    pos_0, vel_0, accel_0 = data_0[:, 0], data_0[:, 1], data_0[:, 2]
+    pos_1, vel_1, accel_1 = data_1[:, 0], data_1[:, 1], data_1[:, 2]
+
+    states = np.empty((6, len(times), 3), dtype=np.double)
+    states[0::2] = (h00 * pos_0 + h10 * vel_0 + h01 * pos_1 + h11 * vel_1).transpose(1, 0, 2)
+    states[1::2] = (h00 * vel_0 + h10 * accel_0 + h01 * vel_1 + h11 * accel_1).transpose(1, 0, 2)
+
+    return states
+
+
+def interpolation_error_bound(sim: "Simulator") -> float:
+    """Returns an estimate of the largest error, in meters, of the positions returned by interpolate_states:
+    ERROR_BOUND_SAFETY_FACTOR times h^4 / 384 times the largest fourth derivative of a position,
+    where h is the time between rows. The fourth derivatives are the second derivatives of the accelerations,
+    which are estimated by finite differences of the accelerations at the stored rows,
+    so the estimate is only reliable if the rows resolve the orbits.
+    With only a few steps in between rows the difference from the steps the integrator would have stored
+    is dominated by its own error in each step, which isn't included.
+    Returns infinity if there are too few rows to estimate it.
+    """
+    # the last row can be closer to the one before it than the others are to each other
+    num_rows = len(sim.star_pos) if sim.num_steps % sim.record_every == 0 else len(sim.star_pos) - 1
+    if num_rows < 3:  # noqa: PLR2004
+        return float("inf")
+
+    interval = abs(sim.time_step_in_seconds) * sim.record_every
+
+    largest_fourth_derivative = 0.0
+    for accelerations in calc_accelerations(sim, np.arange(num_rows)):
+        second_differences: Array1D = np.linalg.norm(np.diff(accelerations, n=2, axis=0), axis=1)
+        largest_fourth_derivative = max(largest_fourth_derivative, float(np.nanmax(second_differences)) / interval**2)
+
+    return ERROR_BOUND_SAFETY_FACTOR * largest_fourth_derivative * interval**4 / 384
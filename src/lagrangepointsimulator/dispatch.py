@@ -0,0 +1,167 @@
+"""Chooses between the serial and parallel variants of the kernels by the size of the problem,
+and caps the number of threads used by the parallel kernels.
+
+Starting the threads of a parallel kernel takes a fixed time, which is longer than a short loop takes in one thread,
+so the kernels with a serial variant are run serially below a threshold number of rows. The thresholds start at
+DEFAULT_THRESHOLDS and calibrate measures them on this machine, which the kernel warm-up does after compiling.
+While the parallel kernels only have one thread the serial variants are always used.
+
+The number of threads of the parallel kernels is capped by set_thread_cap, or by the LAGRANGE_SIM_NUM_THREADS
+environment variable, so that processes running side by side, such as the GUI and the workers of the batch runner
+or the simulation service, don't each use a thread for every core. Numba's limit on the number of threads
+is per thread, so the cap is applied to the calling thread every time a parallel kernel is returned by kernel.
+The ahead-of-time compiled kernels are all serial so neither the thresholds nor the cap affect them.
+"""
+import os
+import sys
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+
+from src.lagrangepointsimulator import kernels
+
+NUM_THREADS_ENV_VAR = "LAGRANGE_SIM_NUM_THREADS"
+
+# parallel kernel: its serial variant
+SERIAL_VARIANTS = {
+    "calc_jacobi_constant": "calc_jacobi_constant_serial",
+    "transform_to_corotating": "transform_to_corotating_serial",
+}
+
+# number of rows below which the serial variants are used until the thresholds are calibrated
+DEFAULT_THRESHOLDS = {name: 2**15 for name in SERIAL_VARIANTS}
+
+# numbers of rows the variants are timed at by calibrate
+CALIBRATION_SIZES = tuple(2**i for i in range(8, 19))
+
+CALIBRATION_REPEATS = 5
+
+thresholds = dict(DEFAULT_THRESHOLDS)
+
+_thread_cap: int | None = None
+
+
+def set_thread_cap(num_threads: int | None) -> None:
+    """Caps the number of threads of the parallel kernels in this process at num_threads,
+    or at the LAGRANGE_SIM_NUM_THREADS environment variable if it's None.
+    If Numba hasn't been imported yet, it doesn't start more threads than the cap either.
+    """
+    global _thread_cap  # noqa: PLW0603
+
+    if num_threads is not None and num_threads < 1:
+        msg = f"The number of threads must be positive, not {num_threads}."
+        raise ValueError(msg)
+
+    _thread_cap = num_threads
+
+    if (cap := thread_cap()) is not None and "numba" not in sys.modules:
+        os.environ["NUMBA_NUM_THREADS"] = str(min(cap, os.cpu_count() or 1))
+
+
+def init_worker() -> None:
+    """Initializer of the worker processes of the batch runner and the simulation service.
+    Every worker runs its own simulations so the parallel kernels are limited to one thread each
+    to avoid oversubscribing the cores.
+    """
+    set_thread_cap(1)
+
+
+def thread_cap() -> int | None:
+    """Returns the cap set by set_thread_cap or in the environment, or None if there isn't one."""
+    if _thread_cap is not None:
+        return _thread_cap
+
+    try:
+        return max(1, int(os.environ[NUM_THREADS_ENV_VAR]))
+    except (KeyError, ValueError):
+        return None
+
+
+def num_threads() -> int:
+    """Returns the number of threads the parallel kernels use, which with the ahead-of-time compiled kernels
+    is the number of threads they would use if they were compiled just-in-time.
+    """
+    cap = thread_cap()
+
+    if kernels.using_aot():
+        available = os.cpu_count() or 1
+    else:
+        from numba import config  # type: ignore
+
+        available = int(config.NUMBA_NUM_THREADS)
+
+    return available if cap is None else min(cap, available)
+
+
+def kernel(name: str, num_rows: int) -> Any:  # noqa: ANN401
+    """Returns the kernel in kernels called name, or its serial variant if it has one and either num_rows,
+    the number of rows of the kernel's arrays, is below its threshold or the parallel kernels only have one thread.
+    Parallel kernels use at most num_threads threads when they're called from the calling thread.
+    """
+    if kernels.using_aot():
+        return getattr(kernels, name)
+
+    threads = num_threads()
+
+    if name in SERIAL_VARIANTS and (num_rows < thresholds[name] or threads == 1):
+        return getattr(kernels, SERIAL_VARIANTS[name])
+
+    from numba import get_num_threads, set_num_threads
+
+    if get_num_threads() != threads:
+        set_num_threads(threads)
+
+    return getattr(kernels, name)
+
+
+def _calibration_args(name: str, num_rows: int, rng: np.random.Generator) -> tuple[Any, ...]:
+    positions = [np.ascontiguousarray(rng.random((num_rows, 3))) for _ in range(4)]
+    # the star and planet are kept away from the satellite
+    positions[0] += 10.0
+    positions[1] -= 10.0
+
+    if name == "transform_to_corotating":
+        return positions[2], rng.random(num_rows), 1.0
+
+    return 1.0, 1.0, 1.0, *positions
+
+
+def _best_time(func: Any, args: tuple[Any, ...]) -> float:  # noqa: ANN401
+    # the first call is excluded in case it compiles the kernel
+    func(*args)
+
+    times = []
+    for _ in range(CALIBRATION_REPEATS):
+        start = perf_counter()
+        func(*args)
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def calibrate() -> dict[str, int]:
+    """Times the serial and parallel variants of each kernel at CALIBRATION_SIZES and sets its threshold to the
+    smallest size from which the parallel variant is always faster, or to twice the largest size if it isn't faster
+    at the largest size. The thresholds are left as they are if the parallel kernels only have one thread,
+    since kernel doesn't use them then. Returns the thresholds.
+    """
+    if kernels.using_aot() or num_threads() == 1:
+        return dict(thresholds)
+
+    rng = np.random.default_rng(0)
+
+    for name, serial_name in SERIAL_VARIANTS.items():
+        threshold = 2 * CALIBRATION_SIZES[-1]
+
+        for num_rows in reversed(CALIBRATION_SIZES):
+            args = _calibration_args(name, num_rows, rng)
+
+            if _best_time(kernel(name, sys.maxsize), args) >= _best_time(getattr(kernels, serial_name), args):
+                break
+
+            threshold = num_rows
+
+        thresholds[name] = threshold
+
+    return dict(thresholds)
@@ -0,0 +1,301 @@
+"""Propagates an ensemble of satellites whose initial conditions are sampled around the parameters of a Simulator
+and reduces their positions into statistics over time while they're integrated,
+so the trajectory of each satellite is only stored if it's asked for, to be plotted.
+
+The satellites don't affect the star and planet, or each other, so the star and planet are integrated once
+for the whole ensemble and the satellites are integrated in parallel as test particles.
+The integration is done in windows of steps. Only the positions and velocities of the star and planet
+in the current window and the satellites' positions at the window's output steps are held in memory.
+
+Example:
+    sim = Simulator(num_years=50, perturbation_size=0.01, lagrange_label="L4")
+    spread = InitialConditionSpread(perturbation_size=0.001, speed=1e-4)
+    stats = run_ensemble(sim, spread, num_samples=1000, seed=0)
+    stats.percentiles  # percentiles of the satellites' positions relative to the Lagrange point over time
+"""
+from collections.abc import Sequence
+from dataclasses import dataclass
+from math import ceil
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.lagrangepointsimulator import dispatch, kernels
+from src.lagrangepointsimulator.cancellation import CancellationToken, ProgressCallback
+from src.lagrangepointsimulator.constants import AU
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+from src.lagrangepointsimulator.simulator import Simulator
+from src.lagrangepointsimulator.storage import output_steps
+
+DEFAULT_PERCENTILE_LEVELS = (5.0, 25.0, 50.0, 75.0, 95.0)
+
+# number of times the statistics are calculated at if no output stride is given
+DEFAULT_NUM_OUTPUTS = 1000
+
+# maximum number of bytes used for the satellites' positions at the output steps of a window
+WINDOW_MEMORY = 64 * 2**20
+
+# maximum number of steps in a window, which is also the number of steps in between progress reports
+WINDOW_STEPS = Simulator.CHUNK_SIZE
+
+
+@dataclass(frozen=True)
+class InitialConditionSpread:
+    """Standard deviations of the normal distributions that the satellites' initial conditions are sampled from.
+    The distributions are centered on the Simulator's values and the units are the same as its parameters:
+    AU for perturbation_size, degrees for the angles, and a factor of the planet's speed for speed.
+    """
+
+    perturbation_size: float = 0.0
+    perturbation_angle: float = 0.0
+    speed: float = 0.0
+    vel_angle: float = 0.0
+
+
+@dataclass(frozen=True)
+class EnsembleSamples:
+    """The initial conditions of each satellite in an ensemble."""
+
+    perturbation_size: Array1D
+    perturbation_angle: Array1D
+    speed: Array1D
+    vel_angle: Array1D
+
+    @classmethod
+    def draw(
+        cls: "type[EnsembleSamples]",
+        sim: Simulator,
+        spread: InitialConditionSpread,
+        num_samples: int,
+        rng: np.random.Generator,
+    ) -> "EnsembleSamples":
+        return cls(
+            perturbation_size=rng.normal(sim.perturbation_size, spread.perturbation_size, num_samples),
+            perturbation_angle=rng.normal(sim.actual_perturbation_angle, spread.perturbation_angle, num_samples),
+            speed=rng.normal(sim.speed, spread.speed, num_samples),
+            vel_angle=rng.normal(sim.actual_vel_angle, spread.vel_angle, num_samples),
+        )
+
+    def __len__(self) -> int:
+        return len(self.perturbation_size)
+
+    def initial_positions_and_velocities(self, sim: Simulator) -> tuple[Array2D, Array2D]:
+        """Returns the initial positions and velocities of the satellites in sim's center of mass frame.
+        They're calculated the same way as in Simulator except that the center of mass of sim's satellite is used,
+        which differs from that of each satellite by a negligible amount since the satellites' mass is negligible.
+        """
+        state, lagrange_point_trans = sim.initial_state()
+
+        init_cm_pos = sim.calc_lagrange_point() - lagrange_point_trans
+
+        perturbation = (self.perturbation_size * AU)[:, np.newaxis] * _unit_vectors(self.perturbation_angle)
+
+        positions = sim.calc_lagrange_point() + perturbation - init_cm_pos
+
+        planet_speed = float(np.linalg.norm(state[3]))
+        velocities = (self.speed * planet_speed)[:, np.newaxis] * _unit_vectors(self.vel_angle)
+
+        return positions, velocities
+
+
+def _unit_vectors(angles_in_degrees: Array1D) -> Array2D:
+    """Returns the unit vector in the xy plane of each angle."""
+    angles = np.radians(angles_in_degrees)
+
+    return np.stack((np.cos(angles), np.sin(angles), np.zeros_like(angles)), axis=1)
+
+
+@dataclass(frozen=True)
+class EnsembleStats:
+    """Statistics of the satellites' positions relative to the Lagrange point, in meters,
+    in the frame co-rotating with the star and planet, at each output step.
+    Only the x and y components are included since the orbits are in the xy plane.
+    """
+
+    steps: NDArray[np.int64]
+    time_points: Array1D
+    # shape (number of outputs, 2)
+    mean: Array2D
+    # shape (number of outputs, 2, 2)
+    covariance: NDArray[np.double]
+    percentile_levels: tuple[float, ...]
+    # shape (number of percentile levels, number of outputs, 2)
+    percentiles: NDArray[np.double]
+    # position of the satellite with the Simulator's initial conditions, shape (number of outputs, 2)
+    nominal: Array2D
+    samples: EnsembleSamples
+    # positions of every satellite if they were kept, shape (number of satellites, number of outputs, 2)
+    trajectories: NDArray[np.double] | None = None
+
+    @property
+    def num_samples(self) -> int:
+        return len(self.samples)
+
+
+def run_ensemble(
+    sim: Simulator,
+    spread: InitialConditionSpread,
+    num_samples: int,
+    *,
+    seed: int | None = None,
+    output_stride: int | None = None,
+    percentile_levels: Sequence[float] = DEFAULT_PERCENTILE_LEVELS,
+    keep_trajectories: bool = False,
+    progress_callback: ProgressCallback | None = None,
+    cancellation_token: CancellationToken | None = None,
+) -> EnsembleStats:
+    """Samples num_samples sets of initial conditions from the distributions given by spread around sim's parameters,
+    integrates them with sim's time step and number of steps, and returns the statistics of their positions
+    every output_stride steps. By default, output_stride gives about DEFAULT_NUM_OUTPUTS outputs.
+    If keep_trajectories is True, every satellite's positions at the output steps are kept as well,
+    which needs num_samples * number of outputs * 16 bytes, so that they can be plotted.
+    sim isn't modified. progress_callback and cancellation_token are used like in Simulator.simulate.
+    """
+    if num_samples < 2:  # noqa: PLR2004
+        msg = "num_samples must be at least 2."
+        raise ValueError(msg)
+
+    num_steps = sim.num_steps
+
+    if output_stride is None:
+        output_stride = max(1, ceil(num_steps / DEFAULT_NUM_OUTPUTS))
+
+    if output_stride <= 0:
+        msg = "output_stride must be positive."
+        raise ValueError(msg)
+
+    steps = output_steps(num_steps, output_stride)
+    num_outputs = len(steps)
+    # the same times as Simulator.time_points
+    time_points = steps * (sim.sim_time / num_steps) if num_steps else np.zeros(num_outputs)
+
+    samples = EnsembleSamples.draw(sim, spread, num_samples, np.random.default_rng(seed))
+    sat_pos, sat_vel = samples.initial_positions_and_velocities(sim)
+
+    # star, planet, and sim's satellite
+    state, lagrange_point_trans = sim.initial_state()
+    window = np.empty((len(state), WINDOW_STEPS + 1, 3), dtype=np.double)
+    window[:, 0] = state
+
+    # each window's satellite positions are stored in the output steps' positions and their relative positions
+    outputs_per_window = max(1, WINDOW_MEMORY // (num_samples * (3 + 2) * 8))
+    output_buffer = np.empty(num_samples * min(outputs_per_window, num_outputs) * 3, dtype=np.double)
+
+    stats = EnsembleStats(
+        steps=steps,
+        time_points=time_points,
+        mean=np.empty((num_outputs, 2), dtype=np.double),
+        covariance=np.empty((num_outputs, 2, 2), dtype=np.double),
+        percentile_levels=tuple(percentile_levels),
+        percentiles=np.empty((len(percentile_levels), num_outputs, 2), dtype=np.double),
+        nominal=np.empty((num_outputs, 2), dtype=np.double),
+        samples=samples,
+        trajectories=np.empty((num_samples, num_outputs, 2), dtype=np.double) if keep_trajectories else None,
+    )
+
+    angular_speed = float(sim.angular_speed * np.sign(sim.time_step_in_seconds))
+
+    start = 0
+    first_output = 0
+    while True:
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        end = min(start + WINDOW_STEPS, num_steps)
+        last_output = int(np.searchsorted(steps, end, side="right"))
+
+        if last_output - first_output > outputs_per_window:
+            last_output = first_output + outputs_per_window
+            end = int(steps[last_output - 1])
+
+        rows = window[:, : end - start + 1]
+        kernels.integrate(
+            float(sim.time_step_in_seconds),
+            end - start,
+            float(sim.star_mass),
+            float(sim.planet_mass),
+            *rows,
+        )
+
+        outputs = slice(first_output, last_output)
+        output_rows = steps[outputs] - start
+        window_positions = output_buffer[: num_samples * len(output_rows) * 3].reshape(num_samples, -1, 3)
+
+        dispatch.kernel("propagate_test_particles", num_samples)(
+            float(sim.time_step_in_seconds),
+            float(sim.star_mass),
+            float(sim.planet_mass),
+            *rows[:4],
+            sat_pos,
+            sat_vel,
+            output_rows,
+            window_positions,
+        )
+
+        time_points_in_window = time_points[outputs]
+        relative_positions = _relative_to_lagrange_point(
+            window_positions,
+            time_points_in_window,
+            angular_speed,
+            lagrange_point_trans,
+        )
+        _record_statistics(stats, outputs, relative_positions)
+
+        nominal_positions = rows[4][output_rows][np.newaxis]
+        stats.nominal[outputs] = _relative_to_lagrange_point(
+            nominal_positions,
+            time_points_in_window,
+            angular_speed,
+            lagrange_point_trans,
+        )[0]
+
+        if progress_callback is not None:
+            progress_callback(end, num_steps)
+
+        if end == num_steps:
+            break
+
+        # the last step of this window is the first step of the next one
+        window[:, 0] = rows[:, -1]
+        start = end
+        first_output = last_output
+
+    return stats
+
+
+def _record_statistics(stats: EnsembleStats, outputs: slice, relative_positions: NDArray[np.double]) -> None:
+    """Calculates the statistics of relative_positions, with shape (number of satellites, number of outputs, 2),
+    and stores them in stats at outputs, along with relative_positions themselves if stats keeps the trajectories.
+    """
+    mean = relative_positions.mean(axis=0)
+    deviations = relative_positions - mean
+
+    stats.mean[outputs] = mean
+    stats.covariance[outputs] = np.einsum("sti,stj->tij", deviations, deviations) / (stats.num_samples - 1)
+    stats.percentiles[:, outputs] = np.percentile(relative_positions, stats.percentile_levels, axis=0)
+
+    if stats.trajectories is not None:
+        stats.trajectories[:, outputs] = relative_positions
+
+
+def _relative_to_lagrange_point(
+    positions: NDArray[np.double],
+    time_points: Array1D,
+    angular_speed: float,
+    lagrange_point_trans: Array1D,
+) -> NDArray[np.double]:
+    """Transforms positions, with shape (number of satellites, number of times, 3), to the co-rotating frame
+    the same way as transform_to_corotating and returns their x and y components relative to the Lagrange point.
+    """
+    angle = -angular_speed * time_points
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+
+    x = positions[..., 0]
+    y = positions[..., 1]
+
+    relative_positions = np.empty((*positions.shape[:-1], 2), dtype=np.double)
+    relative_positions[..., 0] = cos * x - sin * y - lagrange_point_trans[0]
+    relative_positions[..., 1] = sin * x + cos * y - lagrange_point_trans[1]
+
+    return relative_positions
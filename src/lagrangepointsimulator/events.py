@@ -0,0 +1,127 @@
+"""Finds events in a satellite's orbit while it's integrated, so the trajectory doesn't need to be stored and scanned.
+The kinds of events are:
+"closest_approach": a local minimum of the satellite's distance to the planet.
+"lagrange_point_passage": a local minimum of the satellite's distance to the Lagrange point in the co-rotating frame.
+"turning_point_x" and "turning_point_y": where the x or y component of the satellite's velocity
+in the co-rotating frame changes sign, i.e. the extremes of its x or y coordinate.
+Each event's time and state are refined by interpolating between the steps it happens in.
+
+Example:
+    sim = Simulator(num_years=100, perturbation_size=0.05, lagrange_label="L4")
+    events = find_events(sim, ("closest_approach", "turning_point_y"))
+    events.of_kind("closest_approach").distance  # distance to the planet at each closest approach
+"""
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.lagrangepointsimulator import kernels
+from src.lagrangepointsimulator.cancellation import CancellationToken, ProgressCallback
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+from src.lagrangepointsimulator.simulator import Simulator
+
+# in the order of the kinds' values in numba_funcs
+EVENT_KINDS = ("closest_approach", "lagrange_point_passage", "turning_point_x", "turning_point_y")
+
+# number of steps held in memory at a time while searching for events
+SCRATCH_STEPS = 4096
+
+
+@dataclass(frozen=True)
+class Events:
+    """The events found in an orbit in the order they happen.
+    kind holds indices into EVENT_KINDS. The satellite's position and velocity are in the co-rotating frame
+    with the center of mass as origin. distance is to the planet for closest approaches
+    and to the Lagrange point for the other kinds.
+    Times are in seconds, positions and distances in meters, and velocities in meters per second.
+    """
+
+    kind: NDArray[np.int64] = field(repr=False)
+    time: Array1D = field(repr=False)
+    position: Array2D = field(repr=False)
+    velocity: Array2D = field(repr=False)
+    distance: Array1D = field(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def of_kind(self, kind: str) -> "Events":
+        """Returns only the events of kind."""
+        mask = self.kind == _kind_index(kind)
+
+        return Events(
+            kind=self.kind[mask],
+            time=self.time[mask],
+            position=self.position[mask],
+            velocity=self.velocity[mask],
+            distance=self.distance[mask],
+        )
+
+
+def _kind_index(kind: str) -> int:
+    try:
+        return EVENT_KINDS.index(kind)
+    except ValueError:
+        msg = f"Unknown event kind {kind!r}. The kinds are {', '.join(EVENT_KINDS)}."
+        raise ValueError(msg) from None
+
+
+def find_events(
+    sim: Simulator,
+    kinds: Iterable[str] = EVENT_KINDS,
+    *,
+    progress_callback: ProgressCallback | None = None,
+    cancellation_token: CancellationToken | None = None,
+) -> Events:
+    """Integrates the orbit defined by sim's parameters and returns its events of kinds, by default all of them.
+    sim isn't modified and the trajectory isn't stored.
+    progress_callback and cancellation_token are used like in Simulator.simulate.
+    """
+    kind_indices = np.array(sorted({_kind_index(kind) for kind in kinds}), dtype=np.int64)
+
+    num_steps = sim.num_steps
+    # the same times as Simulator.time_points
+    time_per_step = sim.sim_time / num_steps if num_steps else 0.0
+    angular_speed = float(sim.angular_speed * np.sign(sim.time_step_in_seconds))
+
+    state, lagrange_point_trans = sim.initial_state()
+    scratch = np.empty((len(state), SCRATCH_STEPS + 1, 3), dtype=np.double)
+    scratch[:, 0] = state
+
+    chunks: list[Array2D] = []
+    for start in range(0, num_steps, Simulator.CHUNK_SIZE):
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        end = min(start + Simulator.CHUNK_SIZE, num_steps)
+
+        chunks.append(
+            kernels.integrate_events(
+                float(sim.time_step_in_seconds),
+                float(time_per_step),
+                angular_speed,
+                float(sim.star_mass),
+                float(sim.planet_mass),
+                start,
+                end - start,
+                *scratch,
+                float(lagrange_point_trans[0]),
+                float(lagrange_point_trans[1]),
+                kind_indices,
+            ),
+        )
+
+        if progress_callback is not None:
+            progress_callback(end, num_steps)
+
+    events = np.concatenate(chunks) if chunks else np.empty((0, 9), dtype=np.double)
+
+    return Events(
+        kind=events[:, 0].astype(np.int64),
+        time=events[:, 1],
+        position=events[:, 2:5],
+        velocity=events[:, 5:8],
+        distance=events[:, 8],
+    )
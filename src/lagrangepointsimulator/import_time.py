@@ -0,0 +1,81 @@
+"""This script measures how long it takes to import the modules of both packages and checks them against a budget.
+Each import is timed in a fresh interpreter. The script exits with a non-zero status if any module
+is over its budget or imports a module it should defer until first use.
+Run it from the repository root with: python -m src.lagrangepointsimulator.import_time
+"""
+import json
+import subprocess
+import sys
+from typing import NamedTuple
+
+NUM_SAMPLES = 5
+
+
+class ImportBudget(NamedTuple):
+    # maximum time in seconds for the fastest of NUM_SAMPLES imports
+    seconds: float
+    # modules which must not be imported as a side effect
+    deferred: tuple[str, ...]
+
+
+IMPORT_BUDGETS: dict[str, ImportBudget] = {
+    "src.lagrangepointsimulator.constants": ImportBudget(0.05, ("numpy", "numba")),
+    "src.lagrangepointsimulator.descriptors": ImportBudget(0.1, ("numpy", "numba")),
+    "src.lagrangepointsimulator": ImportBudget(0.05, ("numpy", "numba")),
+    "src.lagrangepointsimulator.simulator": ImportBudget(0.3, ("numba",)),
+    "src.lagrangepointgui.safe_eval": ImportBudget(0.05, ("numpy", "numba", "PyQt6")),
+    "src.lagrangepointgui.sim_gui": ImportBudget(0.8, ("numba",)),
+}
+
+# prints the import time and the modules which were imported as JSON
+TIMING_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, list(sys.modules)]))
+"""
+
+
+def time_import(module: str) -> tuple[float, set[str]]:
+    """Returns the time to import module in a fresh interpreter and the modules that were imported."""
+    completed = subprocess.run(
+        [sys.executable, "-c", TIMING_CODE.format(module=module)],  # noqa: S603
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    seconds, imported = json.loads(completed.stdout)
+
+    return seconds, set(imported)
+
+
+def check_budget(module: str, budget: ImportBudget) -> bool:
+    """Prints the import time of module and returns whether it's within budget."""
+    samples = [time_import(module) for _ in range(NUM_SAMPLES)]
+
+    seconds = min(sample_seconds for sample_seconds, _ in samples)
+    imported = samples[0][1]
+
+    eagerly_imported = [deferred for deferred in budget.deferred if deferred in imported]
+
+    within_budget = seconds <= budget.seconds and not eagerly_imported
+
+    status = "ok" if within_budget else "OVER BUDGET"
+    print(f"{module}: {seconds:.3f} s (budget {budget.seconds:.3f} s) {status}")
+
+    if eagerly_imported:
+        print(f"    imports {', '.join(eagerly_imported)} which should be deferred until first use")
+
+    return within_budget
+
+
+def main() -> None:
+    results = [check_budget(module, budget) for module, budget in IMPORT_BUDGETS.items()]
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
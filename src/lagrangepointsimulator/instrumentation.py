@@ -0,0 +1,113 @@
+"""Contains the classes used to record how long each phase of a simulation takes.
+The Simulator class stores the statistics of its last run in its last_run_stats attribute.
+"""
+import json
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+
+@dataclass
+class PhaseStats:
+    # seconds, summed over all calls
+    wall_time: float = 0.0
+    bytes_allocated: int = 0
+    # number of steps or positions processed, used for the throughput
+    num_steps: int = 0
+    calls: int = 0
+
+    @property
+    def steps_per_second(self) -> float | None:
+        if not self.num_steps or not self.wall_time:
+            return None
+
+        return self.num_steps / self.wall_time
+
+    def add(self, other: "PhaseStats") -> None:
+        self.wall_time += other.wall_time
+        self.bytes_allocated += other.bytes_allocated
+        self.num_steps += other.num_steps
+        self.calls += other.calls
+
+
+@dataclass
+class RunStats:
+    """Statistics of a single call to Simulator.simulate
+    and of the calls to transform_to_corotating and calc_conserved_quantities made on its results.
+    """
+
+    num_steps: int
+    started_at: str = field(default_factory=lambda: datetime.now(UTC).isoformat())
+    # phase name: statistics of that phase
+    phases: dict[str, PhaseStats] = field(default_factory=dict)
+    # whether any kernel had to be compiled, or loaded from Numba's cache, during the run
+    jit_compiled: bool = False
+    # False if the run was cancelled or raised an exception
+    completed: bool = False
+    # how the trajectory was stored, see the storage module. The arrays hold every record_every-th step
+    storage_mode: str | None = None
+    record_every: int = 1
+
+    @property
+    def total_time(self) -> float:
+        return sum(phase.wall_time for phase in self.phases.values())
+
+    @property
+    def bytes_allocated(self) -> int:
+        return sum(phase.bytes_allocated for phase in self.phases.values())
+
+    def add_phase(self, name: str, phase: PhaseStats) -> None:
+        self.phases.setdefault(name, PhaseStats()).add(phase)
+
+    def to_dict(self) -> dict[str, Any]:
+        stats = asdict(self)
+
+        for name, phase in self.phases.items():
+            stats["phases"][name]["steps_per_second"] = phase.steps_per_second
+
+        return stats
+
+    def append_to_log(self, log_path: Path) -> None:
+        """Appends the statistics to log_path as a line of JSON."""
+        with Path.open(log_path, "a") as file:
+            file.write(json.dumps(self.to_dict()) + "\n")
+
+    def summary(self) -> str:
+        lines = [f"{self.num_steps} steps, JIT compiled: {self.jit_compiled}, completed: {self.completed}"]
+
+        if self.storage_mode is not None:
+            lines.append(f"storage: {self.storage_mode}, recording every {self.record_every} steps")
+
+        for name, phase in self.phases.items():
+            line = f"{name}: {phase.wall_time * 1000:.3f} ms, {phase.bytes_allocated / 2**20:.1f} MiB allocated"
+
+            if (steps_per_second := phase.steps_per_second) is not None:
+                line += f", {steps_per_second:.3e} steps/s"
+
+            lines.append(line)
+
+        lines.append(f"total: {self.total_time * 1000:.3f} ms")
+
+        return "\n".join(lines)
+
+
+@contextmanager
+def record_phase(stats: RunStats | None, name: str) -> Iterator[PhaseStats]:
+    """Times the body of the with statement and adds it to stats as the phase name.
+    The yielded PhaseStats can be used to record bytes allocated and steps processed.
+    Nothing is recorded if stats is None.
+    """
+    phase = PhaseStats(calls=1)
+    start = perf_counter()
+
+    try:
+        yield phase
+    finally:
+        phase.wall_time = perf_counter() - start
+
+        if stats is not None:
+            stats.add_phase(name, phase)
@@ -0,0 +1,101 @@
+"""Provides the simulation kernels used by the Simulator class.
+If the extension module built by aot_build.py is present its ahead-of-time compiled kernels are used,
+otherwise the kernels in numba_funcs are compiled just-in-time.
+Setting the environment variable LAGRANGE_SIM_USE_JIT to 1 forces the just-in-time kernels,
+which is useful when editing numba_funcs after the extension module has been built.
+
+The kernels are loaded on first access, so importing this module doesn't import Numba.
+"""
+import os
+from functools import cache
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator.numba_funcs import (  # noqa: TCH004
+        calc_jacobi_constant,
+        calc_jacobi_constant_serial,
+        integrate,
+        integrate_events,
+        integrate_fastmath,
+        integrate_poincare_section,
+        integrate_slices,
+        propagate_test_particles,
+        transform_to_corotating,
+        transform_to_corotating_serial,
+    )
+
+USE_JIT_ENV_VAR = "LAGRANGE_SIM_USE_JIT"
+
+KERNEL_NAMES = (
+    "calc_jacobi_constant",
+    "calc_jacobi_constant_serial",
+    "integrate",
+    "integrate_events",
+    "integrate_fastmath",
+    "integrate_poincare_section",
+    "integrate_slices",
+    "propagate_test_particles",
+    "transform_to_corotating",
+    "transform_to_corotating_serial",
+)
+
+
+@cache
+def _load_aot_module() -> ModuleType | None:
+    if os.environ.get(USE_JIT_ENV_VAR) == "1":
+        return None
+
+    try:
+        from src.lagrangepointsimulator import _aot_kernels
+    except ImportError:
+        return None
+
+    return _aot_kernels
+
+
+def using_aot() -> bool:
+    """Returns True if the ahead-of-time compiled kernels are used. Doesn't import Numba."""
+    return _load_aot_module() is not None
+
+
+def compiled_signature_count() -> int:
+    """Returns the number of signatures the kernels have been compiled for, or loaded from Numba's cache for.
+    The ahead-of-time compiled kernels are never compiled at runtime so this is always 0 for them.
+    """
+    if using_aot():
+        return 0
+
+    from src.lagrangepointsimulator import numba_funcs
+
+    return sum(len(kernel.signatures) for kernel, _ in numba_funcs.KERNELS_AND_SIGNATURES)
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    if name not in KERNEL_NAMES:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg)
+
+    # extension modules built before a kernel was added don't contain it
+    if (aot_module := _load_aot_module()) is not None and hasattr(aot_module, name):
+        return getattr(aot_module, name)
+
+    from src.lagrangepointsimulator import numba_funcs
+
+    return getattr(numba_funcs, name)
+
+
+__all__ = [
+    "calc_jacobi_constant",
+    "calc_jacobi_constant_serial",
+    "compiled_signature_count",
+    "integrate",
+    "integrate_events",
+    "integrate_fastmath",
+    "integrate_poincare_section",
+    "integrate_slices",
+    "propagate_test_particles",
+    "transform_to_corotating",
+    "transform_to_corotating_serial",
+    "using_aot",
+]
@@ -1,18 +1,83 @@
 from math import sqrt
+from types import FunctionType
+from typing import Any
 
 import numpy as np
 from numba import njit, prange  # type: ignore
+from numpy.typing import NDArray
 
 from src.lagrangepointsimulator.constants import G
 from src.lagrangepointsimulator.sim_types import Array1D, Array2D
 
+# explicit signatures of the kernels, used to compile them before their first call
+INVERSE_NORM_CUBED_SIGNATURE = "float64(float64[::1])"
 
-@njit()
+CALC_ACCELERATION_SIGNATURE = f"void(float64, float64, {', '.join(['float64[::1]'] * 9)})"
+
+INTEGRATE_SIGNATURE = f"void(float64, int64, float64, float64, {', '.join(['float64[:, ::1]'] * 6)})"
+
+TRANSFORM_TO_COROTATING_SIGNATURE = "float64[:, ::1](float64[:, ::1], float64[::1], float64)"
+
+SECTION_VALUE_SIGNATURE = "float64(float64[::1], float64, float64, float64, float64, float64)"
+
+HERMITE_INTERPOLATE_SIGNATURE = f"void(float64, float64, {', '.join(['float64[::1]'] * 6)})"
+
+REFINE_CROSSING_SIGNATURE = (
+    "float64(float64, float64, float64, float64, float64[::1], float64[::1], float64[::1], float64[::1], "
+    "float64, float64, float64, float64, float64, float64[::1], float64[::1])"
+)
+
+POINCARE_SECTION_SIGNATURE = (
+    "float64[:, ::1](float64, float64, float64, float64, float64, int64, int64, "
+    f"{', '.join(['float64[:, ::1]'] * 6)}, float64, float64, float64, int64)"
+)
+
+# number of columns of the crossings returned by integrate_poincare_section: time, position, and velocity
+CROSSING_COLUMNS = 7
+
+COROTATING_STATE_SIGNATURE = f"void(float64, float64, {', '.join(['float64[::1]'] * 4)})"
+
+EVENT_VALUE_SIGNATURE = f"float64(int64, {', '.join(['float64[::1]'] * 6)}, float64, float64)"
+
+REFINE_EVENT_SIGNATURE = (
+    "float64(int64, float64, float64, float64, float64, "
+    f"{', '.join(['float64[:, ::1]'] * 4)}, int64, float64, float64, float64, float64, float64[:, ::1])"
+)
+
+EVENTS_SIGNATURE = (
+    "float64[:, ::1](float64, float64, float64, float64, float64, int64, int64, "
+    f"{', '.join(['float64[:, ::1]'] * 6)}, float64, float64, int64[::1])"
+)
+
+# the kinds of events found by integrate_events, in the order of events.EVENT_KINDS
+CLOSEST_APPROACH = 0
+LAGRANGE_POINT_PASSAGE = 1
+TURNING_POINT_X = 2
+TURNING_POINT_Y = 3
+
+# number of columns of the events returned by integrate_events: kind, time, position, velocity, and distance
+EVENT_COLUMNS = 9
+
+CALC_JACOBI_CONSTANT_SIGNATURE = f"float64[::1](float64, float64, float64, {', '.join(['float64[:, ::1]'] * 4)})"
+
+INTEGRATE_SLICES_SIGNATURE = (
+    "void(float64, float64, float64, int64[::1], float64[:, :, ::1], "
+    f"{', '.join(['float64[:, ::1]'] * 6)}, float64[:, :, ::1])"
+)
+
+CALC_SAT_ACCELERATION_SIGNATURE = f"void(float64, float64, {', '.join(['float64[::1]'] * 6)})"
+
+PROPAGATE_TEST_PARTICLES_SIGNATURE = (
+    f"void(float64, float64, float64, {', '.join(['float64[:, ::1]'] * 6)}, int64[::1], float64[:, :, ::1])"
+)
+
+
+@njit(cache=True)
 def inverse_norm_cubed(vector: Array1D) -> float:
     return sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2]) ** -3
 
 
-@njit()
+@njit(cache=True)
 def calc_acceleration(
     g_star: float,
     g_planet: float,
@@ -49,7 +114,8 @@ def calc_acceleration(
         sat_accel[j] = sat_star_coeff * sat_to_star[j] + sat_planet_coeff * sat_to_planet[j]
 
 
-@njit(cache=True)
+# nogil lets the GUI thread keep running while a simulation is integrated in a worker thread
+@njit(cache=True, nogil=True)
 def integrate(
     time_step: float,
     num_steps: int,
@@ -115,6 +181,745 @@ def integrate(
             sat_pos[k, j] = sat_intermediate_pos[j] + sat_vel[k, j] * half_time_step
 
 
+def _fastmath_variant(kernel: Any, *callees: Any) -> Any:  # noqa: ANN401
+    """Returns a copy of kernel named kernel_fastmath and compiled with fastmath, which lets LLVM reorder, fuse and
+    vectorize floating point operations, and without checks for division by zero, so its results differ from
+    kernel's by rounding errors. The names of the callees refer to their fastmath variants in the copy.
+    Numba caches kernels by name regardless of their options, and compiles a callee once for each signature
+    whatever its caller's options are, so the copy and its callees have to be separate functions.
+    """
+    py_func = kernel.py_func
+    name = f"{py_func.__name__}_fastmath"
+
+    global_names = {**py_func.__globals__, **{callee.__name__.removesuffix("_fastmath"): callee for callee in callees}}
+    func = FunctionType(py_func.__code__, global_names, name, py_func.__defaults__)
+    func.__qualname__ = name
+    func.__doc__ = py_func.__doc__
+
+    return njit(cache=True, nogil=True, fastmath=True, error_model="numpy")(func)
+
+
+inverse_norm_cubed_fastmath = _fastmath_variant(inverse_norm_cubed)
+
+calc_acceleration_fastmath = _fastmath_variant(calc_acceleration, inverse_norm_cubed_fastmath)
+
+integrate_fastmath = _fastmath_variant(integrate, calc_acceleration_fastmath)
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def integrate_slices(
+    time_step: float,
+    star_mass: float,
+    planet_mass: float,
+    slice_bounds: NDArray[np.int64],
+    start_states: NDArray[np.double],
+    star_pos: Array2D,
+    star_vel: Array2D,
+    planet_pos: Array2D,
+    planet_vel: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+    end_states: NDArray[np.double],
+) -> None:
+    """Integrates the slices of steps between consecutive slice_bounds in parallel.
+    Slice i starts from start_states[i], with rows in the order of the arrays, which is written to row slice_bounds[i].
+    The last row of a slice is the first row of the next one so it isn't written to the arrays,
+    which would race with the next slice, but to end_states[i] instead.
+    The operations are the same as in integrate.
+    """
+    num_slices = start_states.shape[0]
+
+    for i in prange(num_slices):
+        start = slice_bounds[i]
+        end = slice_bounds[i + 1]
+
+        star_pos[start] = start_states[i, 0]
+        star_vel[start] = start_states[i, 1]
+        planet_pos[start] = start_states[i, 2]
+        planet_vel[start] = start_states[i, 3]
+        sat_pos[start] = start_states[i, 4]
+        sat_vel[start] = start_states[i, 5]
+
+        integrate(
+            time_step,
+            end - 1 - start,
+            star_mass,
+            planet_mass,
+            star_pos[start:end],
+            star_vel[start:end],
+            planet_pos[start:end],
+            planet_vel[start:end],
+            sat_pos[start:end],
+            sat_vel[start:end],
+        )
+
+        last_step = np.empty((6, 2, 3), dtype=np.double)
+        last_step[0, 0] = star_pos[end - 1]
+        last_step[1, 0] = star_vel[end - 1]
+        last_step[2, 0] = planet_pos[end - 1]
+        last_step[3, 0] = planet_vel[end - 1]
+        last_step[4, 0] = sat_pos[end - 1]
+        last_step[5, 0] = sat_vel[end - 1]
+
+        integrate(
+            time_step,
+            1,
+            star_mass,
+            planet_mass,
+            last_step[0],
+            last_step[1],
+            last_step[2],
+            last_step[3],
+            last_step[4],
+            last_step[5],
+        )
+
+        end_states[i] = last_step[:, 1]
+
+
+@njit(cache=True)
+def calc_sat_acceleration(
+    g_star: float,
+    g_planet: float,
+    star_pos: Array1D,
+    planet_pos: Array1D,
+    sat_pos: Array1D,
+    sat_accel: Array1D,
+    sat_to_star: Array1D,
+    sat_to_planet: Array1D,
+) -> None:
+    """Calculates only the satellite's acceleration. The operations are the same as in calc_acceleration
+    so the result is identical to the satellite's acceleration calculated by it.
+    """
+    for j in range(3):
+        sat_to_star[j] = star_pos[j] - sat_pos[j]
+        sat_to_planet[j] = planet_pos[j] - sat_pos[j]
+
+    sat_star_coeff = g_star * inverse_norm_cubed(sat_to_star)
+    sat_planet_coeff = g_planet * inverse_norm_cubed(sat_to_planet)
+
+    for j in range(3):
+        sat_accel[j] = sat_star_coeff * sat_to_star[j] + sat_planet_coeff * sat_to_planet[j]
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def propagate_test_particles(
+    time_step: float,
+    star_mass: float,
+    planet_mass: float,
+    star_pos: Array2D,
+    star_vel: Array2D,
+    planet_pos: Array2D,
+    planet_vel: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+    output_rows: NDArray[np.int64],
+    output: NDArray[np.double],
+) -> None:
+    """Integrates many satellites, which don't affect the star and planet or each other, in parallel.
+    star_pos, star_vel, planet_pos, and planet_vel are the already integrated positions and velocities
+    of the star and planet with a row per step.
+    sat_pos and sat_vel have a row per satellite and hold their positions and velocities at the first step.
+    They're updated in place to those at the last step.
+    The position of satellite i at step output_rows[j] is written to output[i, j]. output_rows must be ascending.
+    Each satellite is integrated with the same operations as integrate so the results are identical.
+    """
+    num_rows = star_pos.shape[0]
+    num_sats = sat_pos.shape[0]
+    num_outputs = output_rows.shape[0]
+
+    half_time_step = 0.5 * time_step
+
+    g_star = G * star_mass
+    g_planet = G * planet_mass
+
+    for i in prange(num_sats):
+        pos = sat_pos[i].copy()
+        vel = sat_vel[i].copy()
+
+        sat_accel = np.empty(3, dtype=np.double)
+        star_intermediate_pos = np.empty_like(sat_accel)
+        planet_intermediate_pos = np.empty_like(sat_accel)
+        sat_intermediate_pos = np.empty_like(sat_accel)
+        sat_to_star = np.empty_like(sat_accel)
+        sat_to_planet = np.empty_like(sat_accel)
+
+        next_output = 0
+        while next_output < num_outputs and output_rows[next_output] == 0:
+            output[i, next_output] = pos
+            next_output += 1
+
+        for k in range(1, num_rows):
+            for j in range(3):
+                star_intermediate_pos[j] = star_pos[k - 1, j] + star_vel[k - 1, j] * half_time_step
+
+                planet_intermediate_pos[j] = planet_pos[k - 1, j] + planet_vel[k - 1, j] * half_time_step
+
+                sat_intermediate_pos[j] = pos[j] + vel[j] * half_time_step
+
+            calc_sat_acceleration(
+                g_star,
+                g_planet,
+                star_intermediate_pos,
+                planet_intermediate_pos,
+                sat_intermediate_pos,
+                sat_accel,
+                sat_to_star,
+                sat_to_planet,
+            )
+
+            for j in range(3):
+                vel[j] = vel[j] + sat_accel[j] * time_step
+
+                pos[j] = sat_intermediate_pos[j] + vel[j] * half_time_step
+
+            while next_output < num_outputs and output_rows[next_output] == k:
+                output[i, next_output] = pos
+                next_output += 1
+
+        sat_pos[i] = pos
+        sat_vel[i] = vel
+
+
+@njit(cache=True)
+def section_value(
+    pos: Array1D,
+    time: float,
+    angular_speed: float,
+    normal_x: float,
+    normal_y: float,
+    offset: float,
+) -> float:
+    """Returns normal · (x, y) - offset where x and y are the coordinates of pos in the co-rotating frame.
+    The surface of section is where this is 0.
+    """
+    angle = -angular_speed * time
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+
+    return normal_x * (cos * pos[0] - sin * pos[1]) + normal_y * (sin * pos[0] + cos * pos[1]) - offset
+
+
+@njit(cache=True)
+def hermite_interpolate(
+    theta: float,
+    time_step: float,
+    pos_0: Array1D,
+    vel_0: Array1D,
+    pos_1: Array1D,
+    vel_1: Array1D,
+    pos: Array1D,
+    vel: Array1D,
+) -> None:
+    """Interpolates the position and velocity at the fraction theta of the way through a step
+    with the cubic Hermite polynomial through the positions and velocities at its start and end.
+    The results are written to pos and vel.
+    """
+    theta_2 = theta * theta
+    theta_3 = theta_2 * theta
+
+    h00 = 2 * theta_3 - 3 * theta_2 + 1
+    h10 = theta_3 - 2 * theta_2 + theta
+    h01 = -2 * theta_3 + 3 * theta_2
+    h11 = theta_3 - theta_2
+
+    # derivatives of the basis polynomials with respect to theta
+    d00 = 6 * theta_2 - 6 * theta
+    d10 = 3 * theta_2 - 4 * theta + 1
+    d01 = -6 * theta_2 + 6 * theta
+    d11 = 3 * theta_2 - 2 * theta
+
+    for j in range(3):
+        pos[j] = h00 * pos_0[j] + h10 * time_step * vel_0[j] + h01 * pos_1[j] + h11 * time_step * vel_1[j]
+        vel[j] = (d00 * pos_0[j] + d01 * pos_1[j]) / time_step + d10 * vel_0[j] + d11 * vel_1[j]
+
+
+@njit(cache=True)
+def refine_crossing(
+    time_step: float,
+    time_0: float,
+    time_1: float,
+    angular_speed: float,
+    pos_0: Array1D,
+    vel_0: Array1D,
+    pos_1: Array1D,
+    vel_1: Array1D,
+    value_0: float,
+    value_1: float,
+    normal_x: float,
+    normal_y: float,
+    offset: float,
+    pos: Array1D,
+    vel: Array1D,
+) -> float:
+    """Finds the fraction of the step at which the interpolated position crosses the surface of section,
+    whose section values at the start and end of the step are value_0 and value_1 and have different signs,
+    with the Illinois variant of the false position method.
+    The interpolated position and velocity at the crossing are written to pos and vel. Returns the fraction.
+    """
+    low, high = 0.0, 1.0
+    value_low, value_high = value_0, value_1
+    theta = 0.0
+    # which end of the bracket was kept in the previous iteration, used to halve its value if it's kept again
+    side = 0
+
+    for _ in range(50):
+        theta = (low * value_high - high * value_low) / (value_high - value_low)
+
+        hermite_interpolate(theta, time_step, pos_0, vel_0, pos_1, vel_1, pos, vel)
+        time = time_0 + theta * (time_1 - time_0)
+        value = section_value(pos, time, angular_speed, normal_x, normal_y, offset)
+
+        if value == 0 or high - low < 1e-15:  # noqa: PLR2004
+            break
+
+        if (value < 0) == (value_low < 0):
+            low, value_low = theta, value
+            if side == -1:
+                value_high *= 0.5
+            side = -1
+        else:
+            high, value_high = theta, value
+            if side == 1:
+                value_low *= 0.5
+            side = 1
+
+    hermite_interpolate(theta, time_step, pos_0, vel_0, pos_1, vel_1, pos, vel)
+
+    return theta
+
+
+@njit(cache=True)
+def corotating_state(
+    time: float,
+    angular_speed: float,
+    pos: Array1D,
+    vel: Array1D,
+    corotating_pos: Array1D,
+    corotating_vel: Array1D,
+) -> None:
+    """Transforms pos and vel at time to the co-rotating frame the same way as transform_to_corotating.
+    The results are written to corotating_pos and corotating_vel.
+    """
+    angle = -angular_speed * time
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+
+    x = cos * pos[0] - sin * pos[1]
+    y = sin * pos[0] + cos * pos[1]
+
+    corotating_pos[0] = x
+    corotating_pos[1] = y
+    corotating_pos[2] = pos[2]
+    # the velocity in the co-rotating frame is the rotated velocity minus angular velocity x position
+    corotating_vel[0] = cos * vel[0] - sin * vel[1] + angular_speed * y
+    corotating_vel[1] = sin * vel[0] + cos * vel[1] - angular_speed * x
+    corotating_vel[2] = vel[2]
+
+
+@njit(cache=True, nogil=True)
+def integrate_poincare_section(
+    time_step: float,
+    time_per_step: float,
+    angular_speed: float,
+    star_mass: float,
+    planet_mass: float,
+    first_step: int,
+    num_steps: int,
+    star_pos: Array2D,
+    star_vel: Array2D,
+    planet_pos: Array2D,
+    planet_vel: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+    normal_x: float,
+    normal_y: float,
+    offset: float,
+    direction: int,
+) -> Array2D:
+    """Integrates num_steps steps from first_step and returns the time, and the satellite's position and velocity
+    in the co-rotating frame, each time it crosses the surface of section normal · (x, y) = offset in direction.
+    A direction of 1 only includes crossings where normal · (x, y) increases, -1 where it decreases, and 0 both.
+    star_pos, ..., sat_vel are scratch arrays with at least 2 rows. Their first rows must hold the state at first_step
+    and on return hold the state after the last step. Only the steps since the last scan are held in them
+    so the memory used doesn't depend on num_steps.
+    Each crossing is found by interpolating the satellite's position during the step in which the sign changes.
+    """
+    scratch_steps = star_pos.shape[0] - 1
+
+    crossings = np.empty((64, CROSSING_COLUMNS), dtype=np.double)
+    num_crossings = 0
+
+    pos = np.empty(3, dtype=np.double)
+    vel = np.empty_like(pos)
+    corotating_pos = np.empty_like(pos)
+    corotating_vel = np.empty_like(pos)
+
+    value_prev = section_value(sat_pos[0], first_step * time_per_step, angular_speed, normal_x, normal_y, offset)
+
+    steps_done = 0
+    while steps_done < num_steps:
+        block_steps = min(scratch_steps, num_steps - steps_done)
+
+        integrate(
+            time_step,
+            block_steps,
+            star_mass,
+            planet_mass,
+            star_pos,
+            star_vel,
+            planet_pos,
+            planet_vel,
+            sat_pos,
+            sat_vel,
+        )
+
+        for k in range(1, block_steps + 1):
+            step = first_step + steps_done + k
+            time = step * time_per_step
+            value = section_value(sat_pos[k], time, angular_speed, normal_x, normal_y, offset)
+
+            increasing = value_prev < 0 <= value
+            decreasing = value_prev > 0 >= value
+
+            if (increasing and direction >= 0) or (decreasing and direction <= 0):
+                if num_crossings == crossings.shape[0]:
+                    grown = np.empty((2 * num_crossings, CROSSING_COLUMNS), dtype=np.double)
+                    grown[:num_crossings] = crossings
+                    crossings = grown
+
+                time_prev = time - time_per_step
+                theta = refine_crossing(
+                    time_step,
+                    time_prev,
+                    time,
+                    angular_speed,
+                    sat_pos[k - 1],
+                    sat_vel[k - 1],
+                    sat_pos[k],
+                    sat_vel[k],
+                    value_prev,
+                    value,
+                    normal_x,
+                    normal_y,
+                    offset,
+                    pos,
+                    vel,
+                )
+
+                crossing_time = time_prev + theta * time_per_step
+                corotating_state(crossing_time, angular_speed, pos, vel, corotating_pos, corotating_vel)
+
+                row = crossings[num_crossings]
+                row[0] = crossing_time
+                row[1:4] = corotating_pos
+                row[4:7] = corotating_vel
+
+                num_crossings += 1
+
+            value_prev = value
+
+        star_pos[0] = star_pos[block_steps]
+        star_vel[0] = star_vel[block_steps]
+        planet_pos[0] = planet_pos[block_steps]
+        planet_vel[0] = planet_vel[block_steps]
+        sat_pos[0] = sat_pos[block_steps]
+        sat_vel[0] = sat_vel[block_steps]
+
+        steps_done += block_steps
+
+    return crossings[:num_crossings]
+
+
+@njit(cache=True)
+def event_value(
+    kind: int,
+    sat_pos: Array1D,
+    sat_vel: Array1D,
+    planet_pos: Array1D,
+    planet_vel: Array1D,
+    corotating_pos: Array1D,
+    corotating_vel: Array1D,
+    lagrange_x: float,
+    lagrange_y: float,
+) -> float:
+    """Returns the value of the event function of kind, whose events are where it crosses 0.
+    corotating_pos and corotating_vel are the satellite's position and velocity in the co-rotating frame.
+    The functions of closest approaches and Lagrange point passages are the rates of change of half the squared
+    distances to the planet and to the Lagrange point, so their minima are where they increase through 0.
+    """
+    if kind == CLOSEST_APPROACH:
+        value = 0.0
+        for j in range(3):
+            value += (sat_pos[j] - planet_pos[j]) * (sat_vel[j] - planet_vel[j])
+
+        return value
+
+    if kind == LAGRANGE_POINT_PASSAGE:
+        dx = corotating_pos[0] - lagrange_x
+        dy = corotating_pos[1] - lagrange_y
+
+        return dx * corotating_vel[0] + dy * corotating_vel[1]
+
+    if kind == TURNING_POINT_X:
+        return corotating_vel[0]
+
+    return corotating_vel[1]
+
+
+@njit(cache=True)
+def refine_event(
+    kind: int,
+    time_step: float,
+    time_0: float,
+    time_per_step: float,
+    angular_speed: float,
+    planet_pos: Array2D,
+    planet_vel: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+    k: int,
+    value_0: float,
+    value_1: float,
+    lagrange_x: float,
+    lagrange_y: float,
+    work: Array2D,
+) -> float:
+    """Finds the fraction of step k, which starts at time_0, at which the event function of kind crosses 0,
+    like refine_crossing but with the planet's position and velocity interpolated as well.
+    work has 6 rows, which the interpolated position and velocity of the satellite, the planet,
+    and the satellite in the co-rotating frame at the event are written to. Returns the fraction.
+    """
+    low, high = 0.0, 1.0
+    value_low, value_high = value_0, value_1
+    theta = 0.0
+    side = 0
+
+    for _ in range(50):
+        theta = (low * value_high - high * value_low) / (value_high - value_low)
+
+        hermite_interpolate(theta, time_step, sat_pos[k - 1], sat_vel[k - 1], sat_pos[k], sat_vel[k], work[0], work[1])
+        hermite_interpolate(
+            theta,
+            time_step,
+            planet_pos[k - 1],
+            planet_vel[k - 1],
+            planet_pos[k],
+            planet_vel[k],
+            work[2],
+            work[3],
+        )
+        corotating_state(time_0 + theta * time_per_step, angular_speed, work[0], work[1], work[4], work[5])
+        value = event_value(kind, work[0], work[1], work[2], work[3], work[4], work[5], lagrange_x, lagrange_y)
+
+        if value == 0 or high - low < 1e-15:  # noqa: PLR2004
+            break
+
+        if (value < 0) == (value_low < 0):
+            low, value_low = theta, value
+            if side == -1:
+                value_high *= 0.5
+            side = -1
+        else:
+            high, value_high = theta, value
+            if side == 1:
+                value_low *= 0.5
+            side = 1
+
+    return theta
+
+
+@njit(cache=True, nogil=True)
+def integrate_events(
+    time_step: float,
+    time_per_step: float,
+    angular_speed: float,
+    star_mass: float,
+    planet_mass: float,
+    first_step: int,
+    num_steps: int,
+    star_pos: Array2D,
+    star_vel: Array2D,
+    planet_pos: Array2D,
+    planet_vel: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+    lagrange_x: float,
+    lagrange_y: float,
+    kinds: NDArray[np.int64],
+) -> Array2D:
+    """Integrates num_steps steps from first_step and returns the events of kinds in the order they happen.
+    Each row is the kind, the time, the satellite's position and velocity in the co-rotating frame,
+    and its distance to the planet for closest approaches and to the Lagrange point otherwise.
+    Closest approaches and Lagrange point passages are local minima of the distances,
+    and turning points are where the x or y component of the velocity in the co-rotating frame changes sign.
+    (lagrange_x, lagrange_y) is the Lagrange point in the co-rotating frame.
+    The scratch arrays are used like in integrate_poincare_section and each event is refined like a crossing.
+    """
+    scratch_steps = star_pos.shape[0] - 1
+    num_kinds = kinds.shape[0]
+
+    events = np.empty((64, EVENT_COLUMNS), dtype=np.double)
+    num_events = 0
+
+    corotating_pos = np.empty(3, dtype=np.double)
+    corotating_vel = np.empty_like(corotating_pos)
+    work = np.empty((6, 3), dtype=np.double)
+
+    values_prev = np.empty(num_kinds, dtype=np.double)
+    corotating_state(first_step * time_per_step, angular_speed, sat_pos[0], sat_vel[0], corotating_pos, corotating_vel)
+    for i in range(num_kinds):
+        values_prev[i] = event_value(
+            kinds[i],
+            sat_pos[0],
+            sat_vel[0],
+            planet_pos[0],
+            planet_vel[0],
+            corotating_pos,
+            corotating_vel,
+            lagrange_x,
+            lagrange_y,
+        )
+
+    steps_done = 0
+    while steps_done < num_steps:
+        block_steps = min(scratch_steps, num_steps - steps_done)
+
+        integrate(
+            time_step,
+            block_steps,
+            star_mass,
+            planet_mass,
+            star_pos,
+            star_vel,
+            planet_pos,
+            planet_vel,
+            sat_pos,
+            sat_vel,
+        )
+
+        for k in range(1, block_steps + 1):
+            time = (first_step + steps_done + k) * time_per_step
+            corotating_state(time, angular_speed, sat_pos[k], sat_vel[k], corotating_pos, corotating_vel)
+
+            for i in range(num_kinds):
+                kind = kinds[i]
+                value = event_value(
+                    kind,
+                    sat_pos[k],
+                    sat_vel[k],
+                    planet_pos[k],
+                    planet_vel[k],
+                    corotating_pos,
+                    corotating_vel,
+                    lagrange_x,
+                    lagrange_y,
+                )
+                value_prev = values_prev[i]
+                values_prev[i] = value
+
+                increasing = value_prev < 0 <= value
+                decreasing = value_prev > 0 >= value
+
+                # only minima of the distances are events
+                if not (increasing or (decreasing and kind >= TURNING_POINT_X)):
+                    continue
+
+                if num_events == events.shape[0]:
+                    grown = np.empty((2 * num_events, EVENT_COLUMNS), dtype=np.double)
+                    grown[:num_events] = events
+                    events = grown
+
+                time_prev = time - time_per_step
+                theta = refine_event(
+                    kind,
+                    time_step,
+                    time_prev,
+                    time_per_step,
+                    angular_speed,
+                    planet_pos,
+                    planet_vel,
+                    sat_pos,
+                    sat_vel,
+                    k,
+                    value_prev,
+                    value,
+                    lagrange_x,
+                    lagrange_y,
+                    work,
+                )
+
+                row = events[num_events]
+                row[0] = kind
+                row[1] = time_prev + theta * time_per_step
+                row[2:5] = work[4]
+                row[5:8] = work[5]
+
+                if kind == CLOSEST_APPROACH:
+                    row[8] = sqrt(
+                        (work[0, 0] - work[2, 0]) ** 2
+                        + (work[0, 1] - work[2, 1]) ** 2
+                        + (work[0, 2] - work[2, 2]) ** 2,
+                    )
+                else:
+                    row[8] = sqrt((work[4, 0] - lagrange_x) ** 2 + (work[4, 1] - lagrange_y) ** 2)
+
+                num_events += 1
+
+        star_pos[0] = star_pos[block_steps]
+        star_vel[0] = star_vel[block_steps]
+        planet_pos[0] = planet_pos[block_steps]
+        planet_vel[0] = planet_vel[block_steps]
+        sat_pos[0] = sat_pos[block_steps]
+        sat_vel[0] = sat_vel[block_steps]
+
+        steps_done += block_steps
+
+    events = events[:num_events]
+
+    # events of different kinds in the same step are found in the order of kinds rather than time
+    return events[np.argsort(events[:, 1], kind="mergesort")]
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def calc_jacobi_constant(
+    angular_speed: float,
+    star_mass: float,
+    planet_mass: float,
+    star_pos: Array2D,
+    planet_pos: Array2D,
+    sat_pos: Array2D,
+    sat_vel: Array2D,
+) -> Array1D:
+    """Returns the satellite's Jacobi integral per unit mass at each step, calculated in the inertial frame as
+    v^2 / 2 - G * star_mass / (distance to star) - G * planet_mass / (distance to planet) - angular_speed * L_z
+    where L_z is the z component of its angular momentum per unit mass.
+    It's constant when the star and planet orbit the center of mass in circles at angular_speed.
+    """
+    num_rows = sat_pos.shape[0]
+
+    jacobi_constant = np.empty(num_rows, dtype=np.double)
+
+    g_star = G * star_mass
+    g_planet = G * planet_mass
+
+    for i in prange(num_rows):
+        x, y, z = sat_pos[i, 0], sat_pos[i, 1], sat_pos[i, 2]
+        vx, vy, vz = sat_vel[i, 0], sat_vel[i, 1], sat_vel[i, 2]
+
+        star_dx, star_dy, star_dz = x - star_pos[i, 0], y - star_pos[i, 1], z - star_pos[i, 2]
+        planet_dx, planet_dy, planet_dz = x - planet_pos[i, 0], y - planet_pos[i, 1], z - planet_pos[i, 2]
+
+        kinetic_energy = 0.5 * (vx * vx + vy * vy + vz * vz)
+        potential_energy = -g_star / sqrt(star_dx * star_dx + star_dy * star_dy + star_dz * star_dz) - g_planet / sqrt(
+            planet_dx * planet_dx + planet_dy * planet_dy + planet_dz * planet_dz,
+        )
+
+        jacobi_constant[i] = kinetic_energy + potential_energy - angular_speed * (x * vy - y * vx)
+
+    return jacobi_constant
+
+
 @njit(parallel=True, cache=True)
 def transform_to_corotating(position: Array2D, times: Array1D, angular_speed: float) -> Array2D:
     """Transforms pos_trans to a frame of reference that rotates at a rate of angular_speed counter-clockwise.
@@ -147,3 +952,48 @@ def transform_to_corotating(position: Array2D, times: Array1D, angular_speed: fl
         corotating_position[i, 1] = sin * x + cos * y
 
     return corotating_position
+
+
+def _serial_variant(kernel: Any) -> Any:  # noqa: ANN401
+    """Returns a copy of kernel named kernel_serial and compiled without parallel, so that its prange loops run
+    in the calling thread. Starting the threads of a parallel kernel takes longer than short loops take in one thread.
+    """
+    py_func = kernel.py_func
+    name = f"{py_func.__name__}_serial"
+
+    func = FunctionType(py_func.__code__, py_func.__globals__, name, py_func.__defaults__)
+    func.__qualname__ = name
+    func.__doc__ = py_func.__doc__
+
+    return njit(cache=True, nogil=True)(func)
+
+
+calc_jacobi_constant_serial = _serial_variant(calc_jacobi_constant)
+
+transform_to_corotating_serial = _serial_variant(transform_to_corotating)
+
+
+# kernels in the order they should be compiled, callees first
+KERNELS_AND_SIGNATURES = (
+    (inverse_norm_cubed, INVERSE_NORM_CUBED_SIGNATURE),
+    (calc_acceleration, CALC_ACCELERATION_SIGNATURE),
+    (integrate, INTEGRATE_SIGNATURE),
+    (inverse_norm_cubed_fastmath, INVERSE_NORM_CUBED_SIGNATURE),
+    (calc_acceleration_fastmath, CALC_ACCELERATION_SIGNATURE),
+    (integrate_fastmath, INTEGRATE_SIGNATURE),
+    (integrate_slices, INTEGRATE_SLICES_SIGNATURE),
+    (transform_to_corotating, TRANSFORM_TO_COROTATING_SIGNATURE),
+    (transform_to_corotating_serial, TRANSFORM_TO_COROTATING_SIGNATURE),
+    (calc_sat_acceleration, CALC_SAT_ACCELERATION_SIGNATURE),
+    (propagate_test_particles, PROPAGATE_TEST_PARTICLES_SIGNATURE),
+    (section_value, SECTION_VALUE_SIGNATURE),
+    (hermite_interpolate, HERMITE_INTERPOLATE_SIGNATURE),
+    (refine_crossing, REFINE_CROSSING_SIGNATURE),
+    (corotating_state, COROTATING_STATE_SIGNATURE),
+    (integrate_poincare_section, POINCARE_SECTION_SIGNATURE),
+    (event_value, EVENT_VALUE_SIGNATURE),
+    (refine_event, REFINE_EVENT_SIGNATURE),
+    (integrate_events, EVENTS_SIGNATURE),
+    (calc_jacobi_constant, CALC_JACOBI_CONSTANT_SIGNATURE),
+    (calc_jacobi_constant_serial, CALC_JACOBI_CONSTANT_SIGNATURE),
+)
@@ -0,0 +1,167 @@
+"""Parallel-in-time integration of a single trajectory with the Parareal method.
+
+The steps are split into slices. A coarse propagator, the same integrator with a time step COARSE_RATIO times
+larger, cheaply estimates the state at the start of every slice, one after the other. The fine integrator then
+integrates all the slices in parallel from those states, and the differences between the fine and coarse results
+correct the states at the starts of the slices. This is repeated until the corrections are smaller than tolerance.
+After k iterations the first k slices are exact, so the method never needs more iterations than slices,
+but it usually converges in far fewer so the wall time shrinks with the number of cores.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.lagrangepointsimulator import dispatch, kernels
+from src.lagrangepointsimulator.cancellation import CancellationToken, ProgressCallback
+from src.lagrangepointsimulator.instrumentation import record_phase
+
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator.simulator import Simulator
+
+# ratio of the coarse propagator's time step to the simulation's
+# satellites near the Lagrange points are sensitive enough that larger ratios converge slowly or not at all
+COARSE_RATIO = 4
+
+# largest change in the states at the starts of the slices for which the iterations have converged,
+# relative to the planet's distance from the center of mass for positions and to its speed for velocities
+TOLERANCE = 1e-10
+
+
+@dataclass(frozen=True)
+class PararealStats:
+    num_slices: int
+    iterations: int
+    converged: bool
+    # largest relative change in the states at the starts of the slices in the last iteration
+    max_relative_change: float
+
+
+class _CoarsePropagator:
+    """Propagates a state across a slice with fewer, larger steps."""
+
+    def __init__(self, sim: "Simulator", slice_bounds: NDArray[np.int64], coarse_ratio: int) -> None:
+        self._star_mass = float(sim.star_mass)
+        self._planet_mass = float(sim.planet_mass)
+
+        slice_steps = np.diff(slice_bounds)
+        self._num_steps = [max(1, round(steps / coarse_ratio)) for steps in slice_steps]
+        self._time_steps = [
+            float(steps * sim.time_step_in_seconds / num_steps)
+            for steps, num_steps in zip(slice_steps, self._num_steps, strict=True)
+        ]
+
+        self._scratch = np.empty((6, max(self._num_steps) + 1, 3), dtype=np.double)
+
+    def __call__(self, slice_index: int, state: NDArray[np.double]) -> NDArray[np.double]:
+        num_steps = self._num_steps[slice_index]
+        rows = self._scratch[:, : num_steps + 1]
+        rows[:, 0] = state
+
+        kernels.integrate(self._time_steps[slice_index], num_steps, self._star_mass, self._planet_mass, *rows)
+
+        return rows[:, -1].copy()
+
+
+def integrate_parareal(
+    sim: "Simulator",
+    num_slices: int,
+    *,
+    coarse_ratio: int = COARSE_RATIO,
+    tolerance: float = TOLERANCE,
+    max_iterations: int | None = None,
+    progress_callback: ProgressCallback | None = None,
+    cancellation_token: CancellationToken | None = None,
+) -> PararealStats:
+    """Integrates sim, whose first rows must already be initialized, with num_slices slices.
+    By default, the iterations continue until they converge, which is at most num_slices iterations.
+    If max_iterations is given and reached first, the arrays hold the result of the last iteration.
+    progress_callback is called after each iteration with the number of steps known to be exact.
+    """
+    num_steps = sim.num_steps
+    num_slices = max(1, min(num_slices, num_steps))
+    max_iterations = num_slices if max_iterations is None else min(max_iterations, num_slices)
+
+    slice_bounds = np.linspace(0, num_steps, num_slices + 1).round().astype(np.int64)
+    arrays = (sim.star_pos, sim.star_vel, sim.planet_pos, sim.planet_vel, sim.sat_pos, sim.sat_vel)
+
+    coarse = _CoarsePropagator(sim, slice_bounds, coarse_ratio)
+
+    # states at the starts of the slices, and at the end of the last one
+    states = np.empty((num_slices + 1, 6, 3), dtype=np.double)
+    states[0] = [arr[0] for arr in arrays]
+
+    with record_phase(sim.last_run_stats, "parareal_coarse"):
+        coarse_states = np.empty((num_slices, 6, 3), dtype=np.double)
+        for i in range(num_slices):
+            coarse_states[i] = coarse(i, states[i])
+            states[i + 1] = coarse_states[i]
+
+    fine_states = np.empty_like(coarse_states)
+
+    # changes in the positions and velocities are relative to the planet's distance from the center of mass and speed
+    scales = np.tile(np.linalg.norm(states[0, 2:4], axis=1), 3)
+
+    iterations = 0
+    converged = False
+    max_relative_change = np.inf
+
+    while iterations < max_iterations:
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        # the slices before first started from exact states in the previous iteration so they're already done
+        first = iterations
+        iterations += 1
+
+        with record_phase(sim.last_run_stats, "parareal_fine") as phase:
+            dispatch.kernel("integrate_slices", num_slices)(
+                float(sim.time_step_in_seconds),
+                float(sim.star_mass),
+                float(sim.planet_mass),
+                slice_bounds[first:],
+                states[first:num_slices],
+                *arrays,
+                fine_states[first:],
+            )
+
+            phase.num_steps = int(num_steps - slice_bounds[first])
+
+        if iterations == num_slices:
+            converged = True
+            max_relative_change = 0.0
+            break
+
+        with record_phase(sim.last_run_stats, "parareal_coarse"):
+            previous_states = states[first + 2 :].copy()
+
+            # the slice first started from an exact state so its fine result is exact
+            states[first + 1] = fine_states[first]
+            for i in range(first + 1, num_slices):
+                coarse_state = coarse(i, states[i])
+                states[i + 1] = coarse_state + fine_states[i] - coarse_states[i]
+                coarse_states[i] = coarse_state
+
+        max_relative_change = float(np.max(np.linalg.norm(states[first + 2 :] - previous_states, axis=2) / scales))
+
+        if progress_callback is not None:
+            progress_callback(int(slice_bounds[iterations]), num_steps)
+
+        if max_relative_change <= tolerance:
+            converged = True
+            break
+
+    # the last row isn't the start of a slice so it isn't written by integrate_slices
+    for arr, row in zip(arrays, fine_states[-1], strict=True):
+        arr[-1] = row
+
+    if progress_callback is not None:
+        progress_callback(num_steps, num_steps)
+
+    return PararealStats(num_slices, iterations, converged, max_relative_change)
+
+
+def default_num_slices() -> int:
+    """Returns the number of threads used by the parallel kernels, with which each slice gets its own thread."""
+    return dispatch.num_threads()
@@ -0,0 +1,121 @@
+"""Computes Poincaré sections of a satellite's orbit: its state each time it crosses a surface of section
+in the frame co-rotating with the star and planet.
+The crossings are found while integrating so the trajectory is never stored, only the crossings.
+
+Example:
+    sim = Simulator(num_years=1000, perturbation_size=0.05, lagrange_label="L4")
+    section = compute_poincare_section(sim, SurfaceOfSection(normal=(0.0, 1.0), offset=0.0, direction=1))
+    section.position[:, 0], section.velocity[:, 0]  # x and its rate of change each time y = 0 with y increasing
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.lagrangepointsimulator import kernels
+from src.lagrangepointsimulator.cancellation import CancellationToken, ProgressCallback
+from src.lagrangepointsimulator.constants import AU
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+from src.lagrangepointsimulator.simulator import Simulator
+
+# number of steps held in memory at a time while searching for crossings
+SCRATCH_STEPS = 4096
+
+
+@dataclass(frozen=True)
+class SurfaceOfSection:
+    """The line normal · (x, y) = offset in the co-rotating frame, where offset is in AU
+    and the origin is the center of mass.
+    direction is 1 to only include crossings in the direction of normal, -1 for the opposite direction, or 0 for both.
+    The default is the x-axis, crossed in the direction of increasing y.
+    """
+
+    normal: tuple[float, float] = (0.0, 1.0)
+    offset: float = 0.0
+    direction: int = 1
+
+    def __post_init__(self) -> None:
+        if self.direction not in (-1, 0, 1):
+            msg = "direction must be -1, 0, or 1."
+            raise ValueError(msg)
+
+        if self.normal == (0.0, 0.0):
+            msg = "normal must be non-zero."
+            raise ValueError(msg)
+
+
+@dataclass(frozen=True)
+class PoincareSection:
+    """The satellite's state at each crossing of surface, in the co-rotating frame with the center of mass as origin.
+    Times are in seconds, positions in meters, and velocities in meters per second.
+    """
+
+    surface: SurfaceOfSection
+    time: Array1D = field(repr=False)
+    position: Array2D = field(repr=False)
+    velocity: Array2D = field(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+def compute_poincare_section(
+    sim: Simulator,
+    surface: SurfaceOfSection | None = None,
+    *,
+    progress_callback: ProgressCallback | None = None,
+    cancellation_token: CancellationToken | None = None,
+) -> PoincareSection:
+    """Integrates the orbit defined by sim's parameters and returns its crossings of surface,
+    which by default is the x-axis crossed in the direction of increasing y.
+    sim isn't modified and the trajectory isn't stored.
+    progress_callback and cancellation_token are used like in Simulator.simulate.
+    """
+    if surface is None:
+        surface = SurfaceOfSection()
+
+    num_steps = sim.num_steps
+    # the same times as Simulator.time_points
+    time_per_step = sim.sim_time / num_steps if num_steps else 0.0
+    angular_speed = float(sim.angular_speed * np.sign(sim.time_step_in_seconds))
+
+    normal_x, normal_y = np.array(surface.normal, dtype=np.double) / np.linalg.norm(surface.normal)
+
+    state, _ = sim.initial_state()
+    scratch = np.empty((len(state), SCRATCH_STEPS + 1, 3), dtype=np.double)
+    scratch[:, 0] = state
+
+    chunks: list[Array2D] = []
+    for start in range(0, num_steps, Simulator.CHUNK_SIZE):
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        end = min(start + Simulator.CHUNK_SIZE, num_steps)
+
+        chunks.append(
+            kernels.integrate_poincare_section(
+                float(sim.time_step_in_seconds),
+                float(time_per_step),
+                angular_speed,
+                float(sim.star_mass),
+                float(sim.planet_mass),
+                start,
+                end - start,
+                *scratch,
+                float(normal_x),
+                float(normal_y),
+                float(surface.offset * AU),
+                surface.direction,
+            ),
+        )
+
+        if progress_callback is not None:
+            progress_callback(end, num_steps)
+
+    crossings = np.concatenate(chunks) if chunks else np.empty((0, 7), dtype=np.double)
+
+    return PoincareSection(
+        surface=surface,
+        time=crossings[:, 0],
+        position=crossings[:, 1:4],
+        velocity=crossings[:, 4:7],
+    )
@@ -1,4 +1,6 @@
-"""This script creates a profile of the simulate method."""
+"""This script creates a profile of the simulate method.
+cProfile can't see inside the Numba kernels so the time taken by each phase, recorded by the Simulator, is also printed.
+"""
 import cProfile
 import pstats
 
@@ -12,3 +14,8 @@ cProfile.runctx("sim.simulate()", globals(), locals(), "Profile.prof")
 
 s = pstats.Stats("Profile.prof")
 s.strip_dirs().sort_stats("cumtime").print_stats(20)
+
+sim.calc_conserved_quantities()
+
+if sim.last_run_stats is not None:
+    print(sim.last_run_stats.summary())
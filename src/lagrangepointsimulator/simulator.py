@@ -4,22 +4,62 @@ that orbit.
 It ensures that both the star and planet are undergoing uniform circular motion.
 """
 
+import copy
+import os
+from collections.abc import Callable
 from math import ceil, sqrt
-from typing import TypeVar, cast
+from os import PathLike
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, TypeVar, cast
 
 import numpy as np
 from numpy.linalg import norm
+from numpy.typing import ArrayLike, NDArray
 
-from src.lagrangepointsimulator import descriptors
+from src.lagrangepointsimulator import dense_output, descriptors, dispatch, kernels, parareal, step_selection, storage
+from src.lagrangepointsimulator.cancellation import CancellationToken, ProgressCallback
+from src.lagrangepointsimulator.checkpoint import Checkpoint
 from src.lagrangepointsimulator.constants import AU, EARTH_MASS, HOURS, SUN_MASS, YEARS, G
-from src.lagrangepointsimulator.numba_funcs import integrate as nb_integrate
-from src.lagrangepointsimulator.numba_funcs import transform_to_corotating as nb_transform_to_corotating
+from src.lagrangepointsimulator.instrumentation import RunStats, record_phase
 from src.lagrangepointsimulator.sim_types import Array1D, Array2D
 
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator.trajectory_io import RunWriter
+
+# if set, the statistics of every completed simulation are appended to this file
+METRICS_LOG_ENV_VAR = "LAGRANGE_SIM_METRICS_LOG"
+
+# arguments of Simulator's constructor
+PARAM_NAMES = (
+    "num_years",
+    "time_step",
+    "perturbation_size",
+    "perturbation_angle",
+    "speed",
+    "vel_angle",
+    "lagrange_label",
+    "star_mass",
+    "planet_mass",
+    "planet_distance",
+)
+
+POSITION_AND_VELOCITY_NAMES = ("star_pos", "star_vel", "planet_pos", "planet_vel", "sat_pos", "sat_vel")
+
+# kernel variant: name of the kernel in kernels which integrates the steps with it
+INTEGRATION_KERNELS = {"precise": "integrate", "fastmath": "integrate_fastmath"}
+
+
+def as_double(arr: Array2D) -> Array2D:
+    """Returns arr, or a double precision copy of it if it was recorded in single precision,
+    since the kernels are compiled for double precision.
+    """
+    return cast(Array2D, np.ascontiguousarray(arr, dtype=np.double))
+
 
 def array_of_norms(arr_2d: Array2D) -> Array1D:
     """Returns an array of the norm of each element of the input array"""
-    return norm(arr_2d, axis=1)
+    return norm(arr_2d.astype(np.double, copy=False), axis=1)
 
 
 def unit_vector(angle: float) -> Array1D:
@@ -44,6 +84,7 @@ class Simulator:
 
     time_step: float. Time inbetween simulation steps in hours. the default is 1.0.
     A negative value will cause the simulation to run backwards in time.
+    choose_time_step sets it to the largest time step which is accurate to within a tolerance.
 
     #### Satellite Parameters
 
@@ -79,12 +120,41 @@ class Simulator:
     Distance between the planet and the star in AU. The default is 1.0.
 
     The time to simulate will take longer than usual on the first call to the simulate method.
+    This can be avoided by first compiling the kernels with warmup.kernel_warmup.run or, in the background, start.
+
+    The time taken by each phase of the last simulation is recorded in the last_run_stats attribute.
+    If metrics_log_path is set, which defaults to the environment variable LAGRANGE_SIM_METRICS_LOG,
+    the statistics of each completed simulation are appended to that file as a line of JSON.
+
+    If simulate is given a checkpoint_path, the state of the simulation is saved to it
+    every checkpoint_interval seconds, which defaults to 60, and when the simulation is complete.
+    An interrupted simulation can be continued from that file with Simulator.resume.
+
+    Before a simulation the memory its arrays need is compared with memory_budget, in bytes, which defaults to
+    the environment variable LAGRANGE_SIM_MEMORY_BUDGET or half of the physical memory. If they don't fit,
+    only every record_every-th step is stored, or the arrays are memory-mapped from a file in memmap_dir,
+    or every step is streamed to the run file stream_path. The storage attribute can force one of these modes
+    and the mode chosen for the last simulation is in storage_plan. See the storage module.
+    Setting record_dtype to "float32" records the steps in single precision, which halves the memory needed,
+    and layout chooses whether the arrays are separate or rows of one contiguous block.
+    Setting output_stride stores at most 1 in that many steps, and states_at interpolates the positions and
+    velocities at any time in between, see the dense_output module.
+
+    kernel_variant chooses the kernel simulate and resume_from integrate with. The default, "precise", gives
+    the same results on every machine, while "fastmath" lets the compiler reorder floating point operations
+    so its results differ by rounding errors. The steps are always integrated in double precision.
     """
 
     # mass of satellite in kilograms
     # must be negligible compared to other masses
     SAT_MASS = 1.0
 
+    # number of integration steps in between progress reports and cancellation checks
+    CHUNK_SIZE = 250_000
+
+    # default minimum number of seconds in between checkpoints
+    CHECKPOINT_INTERVAL = 60.0
+
     num_years = descriptors.positive_float()
     time_step = descriptors.float_desc()
     perturbation_size = descriptors.float_desc()
@@ -131,6 +201,42 @@ class Simulator:
         self.sat_pos: Array2D = np.empty_like(self.star_pos)
         self.sat_vel: Array2D = np.empty_like(self.star_pos)
 
+        self.last_run_stats: RunStats | None = None
+
+        self.checkpoint_interval = self.CHECKPOINT_INTERVAL
+
+        # how the trajectory is stored, one of storage.STORAGE_MODES
+        self.storage = "auto"
+        self.memory_budget = storage.default_memory_budget()
+        self.memmap_dir: Path | None = None
+        self.stream_path: Path | None = None
+        # one of storage.RECORD_DTYPES and storage.LAYOUTS
+        self.record_dtype = "float64"
+        self.layout = "separate"
+        self.output_stride = 1
+
+        # one of the keys of INTEGRATION_KERNELS
+        self.kernel_variant = "precise"
+
+        # how the last simulation was stored. The arrays hold every record_every-th step and the last step.
+        self.storage_plan: storage.StoragePlan | None = None
+        self.record_every = 1
+        # the file the current simulation is streamed to, and the buffer the steps are integrated in
+        # if they aren't integrated in place in the arrays, which is kept for the next simulation like the arrays.
+        # They're integrated in place if every step is recorded in double precision
+        self._stream_writer: RunWriter | None = None
+        self._scratch: Array2D | None = None
+
+        # step the last simulation was resumed from. The rows of the arrays before it are NaN.
+        self.resumed_from_step = 0
+
+        metrics_log = os.environ.get(METRICS_LOG_ENV_VAR)
+        self.metrics_log_path: Path | None = Path(metrics_log) if metrics_log else None
+
+    def params(self) -> dict[str, Any]:
+        """Returns the arguments of the constructor which would create a Simulator with the same parameters."""
+        return {name: getattr(self, name) for name in PARAM_NAMES}
+
     @property
     def sim_time(self) -> float:
         """Time to simulate in seconds"""
@@ -145,7 +251,42 @@ class Simulator:
         return 0 if self.time_step_in_seconds == 0 else ceil(abs(self.sim_time / self.time_step_in_seconds))
 
     def time_points(self) -> Array1D:
-        return np.linspace(0, self.sim_time, self.num_steps + 1)
+        """Returns the times of the rows of the arrays."""
+        if self.record_every == 1:
+            return np.linspace(0, self.sim_time, self.num_steps + 1)
+
+        return self.time_points_of_rows(np.arange(len(self.star_pos)))
+
+    def time_points_of_rows(self, rows: NDArray[np.int64]) -> Array1D:
+        """Returns the times of rows of the arrays, which are the same as those returned by time_points."""
+        return self._time_points_of_steps(np.minimum(rows * self.record_every, self.num_steps))
+
+    def _time_points_of_steps(self, steps: NDArray[np.int64]) -> Array1D:
+        num_steps = self.num_steps
+
+        times = steps * (self.sim_time / num_steps) if num_steps else np.zeros(len(steps))
+        # the last time is exactly sim_time, as it is in time_points
+        times[steps == num_steps] = self.sim_time
+
+        return cast(Array1D, times)
+
+    def last_row_of_step(self, step: int) -> int:
+        """Returns the index of the last row of the arrays which is filled in once step is integrated."""
+        if step >= self.num_steps:
+            return len(self.star_pos) - 1
+
+        return step // self.record_every
+
+    def states_at(self, times: ArrayLike) -> NDArray[np.double]:
+        """Returns the positions and velocities at times, in seconds, interpolated between the stored rows,
+        with shape (6, number of times, 3) and rows in the order of POSITION_AND_VELOCITY_NAMES.
+        See dense_output.interpolate_states.
+        """
+        return dense_output.interpolate_states(self, times)
+
+    def interpolation_error_bound(self) -> float:
+        """Returns an estimate of the largest error, in meters, of the positions returned by states_at."""
+        return dense_output.interpolation_error_bound(self)
 
     def time_points_in_years(self) -> Array1D:
         return self.time_points() / YEARS
@@ -202,33 +343,292 @@ class Simulator:
     def angular_speed(self) -> float:
         return 2 * np.pi / self.orbital_period
 
-    def simulate(self) -> None:
-        self._initialize_arrays()
-        self._integrate()
+    def simulate(
+        self,
+        progress_callback: ProgressCallback | None = None,
+        cancellation_token: CancellationToken | None = None,
+        checkpoint_path: str | PathLike[str] | None = None,
+    ) -> None:
+        """Simulates the orbit. The integration is done in chunks of CHUNK_SIZE steps.
+        After each chunk progress_callback is called with the number of steps completed and the total number of steps.
+        Raises a SimulationCancelledError if cancellation_token is cancelled in between chunks.
+        If checkpoint_path is given, a Checkpoint is saved to it after the first chunk that finishes
+        at least checkpoint_interval seconds after the previous checkpoint, and after the last chunk.
+        """
+        self.resumed_from_step = 0
+        self._run(
+            lambda: self._initialize_arrays(every_step=False),
+            lambda: self._integrate(0, progress_callback, cancellation_token, checkpoint_path),
+        )
+
+    def choose_time_step(self, tolerance: float = step_selection.DEFAULT_TOLERANCE) -> step_selection.TimeStepChoice:
+        """Sets time_step to the largest time step whose Jacobi constant changes by at most tolerance,
+        relative to its initial value, in short pilot simulations, see the step_selection module.
+        The sign of time_step is kept. Returns the choice and the pilots' results.
+        """
+        choice = step_selection.choose_time_step(self, tolerance)
+        self.time_step = choice.time_step
+
+        return choice
+
+    def simulate_parareal(
+        self,
+        num_slices: int | None = None,
+        progress_callback: ProgressCallback | None = None,
+        cancellation_token: CancellationToken | None = None,
+        *,
+        coarse_ratio: int = parareal.COARSE_RATIO,
+        tolerance: float = parareal.TOLERANCE,
+        max_iterations: int | None = None,
+    ) -> parareal.PararealStats:
+        """Simulates the orbit with the parallel-in-time Parareal method, see the parareal module,
+        which uses multiple cores for a single trajectory. The steps are split into num_slices slices,
+        by default one per thread of the parallel kernels. The result matches that of simulate to within tolerance.
+        progress_callback and cancellation_token are used like in simulate but are only called between iterations.
+        Returns the number of iterations and whether they converged. kernel_variant isn't used.
+        """
+        if self.record_dtype != "float64":
+            msg = "Parareal simulations integrate in the arrays so they must be recorded in double precision."
+            raise ValueError(msg)
+
+        if num_slices is None:
+            num_slices = parareal.default_num_slices()
+
+        self.resumed_from_step = 0
+
+        stats: list[parareal.PararealStats] = []
+        self._run(
+            lambda: self._initialize_arrays(every_step=True),
+            lambda: stats.append(
+                parareal.integrate_parareal(
+                    self,
+                    num_slices,
+                    coarse_ratio=coarse_ratio,
+                    tolerance=tolerance,
+                    max_iterations=max_iterations,
+                    progress_callback=progress_callback,
+                    cancellation_token=cancellation_token,
+                ),
+            ),
+        )
+
+        return stats[0]
+
+    @classmethod
+    def resume(
+        cls: "type[Simulator]",
+        checkpoint: Checkpoint | str | PathLike[str],
+        progress_callback: ProgressCallback | None = None,
+        cancellation_token: CancellationToken | None = None,
+        checkpoint_path: str | PathLike[str] | None = None,
+    ) -> "Simulator":
+        """Returns a new Simulator which continues the simulation saved in checkpoint. See resume_from."""
+        if not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint.load(checkpoint)
+
+        sim = cls(**checkpoint.params)
+        sim.resume_from(checkpoint, progress_callback, cancellation_token, checkpoint_path)
+
+        return sim
+
+    def resume_from(
+        self,
+        checkpoint: Checkpoint | str | PathLike[str],
+        progress_callback: ProgressCallback | None = None,
+        cancellation_token: CancellationToken | None = None,
+        checkpoint_path: str | PathLike[str] | None = None,
+    ) -> None:
+        """Continues the simulation saved in checkpoint, or the file it was saved to, from the step it was saved at.
+        The checkpoint must have the same parameters as this Simulator, whose kernel_variant and record_dtype
+        are set to the checkpoint's. The results from that step onwards are identical to those of a simulation
+        which wasn't interrupted.
+        The rows of the arrays before that step are filled with NaN, and every step is stored.
+        The remaining arguments are the same as those of simulate. checkpoint_path can be the file being resumed.
+        """
+        if not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint.load(checkpoint)
+
+        if checkpoint.params != self.params():
+            msg = "The checkpoint's parameters don't match the simulator's parameters."
+            raise ValueError(msg)
+
+        self.kernel_variant = checkpoint.kernel_variant
+        self.record_dtype = checkpoint.record_dtype
+
+        self._run(
+            lambda: self._restore_checkpoint(checkpoint),
+            lambda: self._integrate(checkpoint.step, progress_callback, cancellation_token, checkpoint_path),
+        )
+
+    def checkpoint(self, step: int) -> Checkpoint:
+        """Returns a Checkpoint of the simulation after step.
+        The step must already have been integrated and stored in the arrays in double precision.
+        """
+        if step % self.record_every and step != self.num_steps:
+            msg = f"Step {step} isn't stored since only 1 in {self.record_every} steps is."
+            raise ValueError(msg)
+
+        if self.star_pos.dtype != np.double:
+            msg = "The steps are recorded in single precision so they can't be resumed from exactly."
+            raise ValueError(msg)
+
+        row = self.last_row_of_step(step)
+
+        return self._checkpoint(step, np.array([getattr(self, name)[row] for name in POSITION_AND_VELOCITY_NAMES]))
+
+    def _checkpoint(self, step: int, state: Array2D) -> Checkpoint:
+        return Checkpoint(
+            params=self.params(),
+            num_steps=self.num_steps,
+            step=step,
+            state=state,
+            lagrange_point_trans=self.lagrange_point_trans.copy(),
+            kernel_variant=self.kernel_variant,
+            record_dtype=self.record_dtype,
+        )
+
+    def _restore_checkpoint(self, checkpoint: Checkpoint) -> None:
+        self._allocate_storage(every_step=True)
+
+        for name, row in zip(POSITION_AND_VELOCITY_NAMES, checkpoint.state, strict=True):
+            arr = getattr(self, name)
+            arr[: checkpoint.step] = np.nan
+            arr[checkpoint.step] = row
 
-    def _initialize_arrays(self) -> None:
+        if self._scratch is not None:
+            self._scratch[:, 0] = checkpoint.state
+
+        self.lagrange_point_trans = checkpoint.lagrange_point_trans.copy()
+        self.resumed_from_step = checkpoint.step
+
+    def _run(self, initialize: Callable[[], None], integrate: Callable[[], None]) -> None:
+        """Initializes the arrays with initialize then calls integrate, recording the run's statistics."""
+        stats = RunStats(self.num_steps)
+        self.last_run_stats = stats
+
+        compiled_signatures = kernels.compiled_signature_count()
+
+        try:
+            initialize()
+            integrate()
+            stats.completed = True
+
+        finally:
+            stats.jit_compiled = kernels.compiled_signature_count() > compiled_signatures
+
+            if self._stream_writer is not None:
+                self._stream_writer.close(completed=stats.completed)
+                self._stream_writer = None
+
+        if self.metrics_log_path is not None:
+            stats.append_to_log(self.metrics_log_path)
+
+    def initial_state(self) -> tuple[Array2D, Array1D]:
+        """Returns the initial positions and velocities, with rows in the order of POSITION_AND_VELOCITY_NAMES,
+        and the position of the Lagrange point in the center of mass frame, without simulating.
+        """
+        # a shallow copy with arrays of a single row is initialized so that this Simulator's arrays aren't modified
+        sim = copy.copy(self)
+        sim.last_run_stats = None
+
+        for name in POSITION_AND_VELOCITY_NAMES:
+            setattr(sim, name, np.empty((1, 3), dtype=np.double))
+
+        sim._initialize_first_row()  # noqa: SLF001
+
+        return np.array([getattr(sim, name)[0] for name in POSITION_AND_VELOCITY_NAMES]), sim.lagrange_point_trans
+
+    def _initialize_arrays(self, *, every_step: bool) -> None:
         # Initializes the arrays of positions and velocities
         # so that their initial values correspond to the input parameters
 
-        if len(self.star_pos) != self.num_steps + 1:
-            self._allocate_arrays()
+        self._allocate_storage(every_step=every_step)
+
+        if self.star_pos.dtype == np.double:
+            self._initialize_first_row()
+            state = np.array([getattr(self, name)[0] for name in POSITION_AND_VELOCITY_NAMES])
+        else:
+            # the first row is calculated in double precision, like the steps, and then rounded
+            state, self.lagrange_point_trans = self.initial_state()
 
-        self._initialize_positions()
+            for name, row in zip(POSITION_AND_VELOCITY_NAMES, state, strict=True):
+                getattr(self, name)[0] = row
+
+        if self._scratch is not None:
+            self._scratch[:, 0] = state
+
+    def _initialize_first_row(self) -> None:
+        with record_phase(self.last_run_stats, "initialize_positions"):
+            self._initialize_positions()
 
         # we set up conditions so that the star and planet have circular orbits about the center of mass
         # so velocities have to be defined relative to the CM
         init_cm_pos = self.calc_center_of_mass(self.star_pos[0], self.planet_pos[0], self.sat_pos[0])
 
-        self._initialize_velocities(init_cm_pos)
-        self._transform_to_cm_ref_frame(init_cm_pos)
+        with record_phase(self.last_run_stats, "initialize_velocities"):
+            self._initialize_velocities(init_cm_pos)
+
+        with record_phase(self.last_run_stats, "transform_to_cm_ref_frame"):
+            self._transform_to_cm_ref_frame(init_cm_pos)
+
+    def _allocate_storage(self, *, every_step: bool) -> None:
+        """Chooses how to store the simulation within the memory budget and allocates the arrays,
+        reusing the previous ones if they were stored in the same way,
+        and the scratch buffer and stream if the steps aren't integrated in place.
+        """
+        num_steps = self.num_steps
+
+        plan = storage.plan_storage(
+            num_steps,
+            self.memory_budget,
+            self.storage,
+            every_step=every_step,
+            stream=self.stream_path is not None,
+            memmap=self.memmap_dir is not None,
+            record_dtype=self.record_dtype,
+            layout=self.layout,
+            output_stride=self.output_stride,
+        )
+
+        previous_plan = self.storage_plan
+        self.storage_plan = plan
+        self.record_every = plan.record_every
 
-    def _allocate_arrays(self) -> None:
-        self.star_pos = np.empty((self.num_steps + 1, 3), dtype=np.double)
-        self.star_vel = np.empty_like(self.star_pos)
-        self.planet_pos = np.empty_like(self.star_pos)
-        self.planet_vel = np.empty_like(self.star_pos)
-        self.sat_pos = np.empty_like(self.star_pos)
-        self.sat_vel = np.empty_like(self.star_pos)
+        if self.last_run_stats is not None:
+            self.last_run_stats.storage_mode = plan.mode
+            self.last_run_stats.record_every = plan.record_every
+
+        if plan.mode == "streaming":
+            if self.stream_path is None:
+                msg = "stream_path must be set to stream a simulation."
+                raise ValueError(msg)
+
+            # trajectory_io imports this module
+            from src.lagrangepointsimulator.trajectory_io import RunWriter
+
+            self._stream_writer = RunWriter(self, self.stream_path)
+
+        if plan.mode not in ("decimated", "streaming") and plan.record_dtype == "float64":
+            self._scratch = None
+        elif self._scratch is None or self._scratch.shape[1] != min(num_steps, self.CHUNK_SIZE) + 1:
+            self._scratch = np.empty((6, min(num_steps, self.CHUNK_SIZE) + 1, 3), dtype=np.double)
+
+        reusable = previous_plan is not None and all(
+            getattr(previous_plan, field) == getattr(plan, field) for field in ("mode", "record_dtype", "layout")
+        )
+        if not reusable or len(self.star_pos) != plan.num_rows:
+            self._allocate_arrays(plan)
+
+    def _allocate_arrays(self, plan: storage.StoragePlan) -> None:
+        with record_phase(self.last_run_stats, "allocate_arrays") as phase:
+            if plan.mode == "memmap":
+                arrays = storage.allocate_memmap(plan.num_rows, self.memmap_dir, plan.record_dtype)
+            else:
+                arrays = storage.allocate_arrays(plan.num_rows, plan.record_dtype, plan.layout)
+                phase.bytes_allocated = sum(arr.nbytes for arr in arrays)
+
+            for name, arr in zip(POSITION_AND_VELOCITY_NAMES, arrays, strict=True):
+                setattr(self, name, arr)
 
     def _initialize_positions(self) -> None:
         self.star_pos[0] = np.array((0, 0, 0))
@@ -268,20 +668,104 @@ class Simulator:
 
         self.lagrange_point_trans = self.calc_lagrange_point() - init_cm_pos
 
-    def _integrate(self) -> None:
-        nb_integrate(
-            self.time_step_in_seconds,
-            self.num_steps,
-            self.star_mass,
-            self.planet_mass,
-            self.star_pos,
-            self.star_vel,
-            self.planet_pos,
-            self.planet_vel,
-            self.sat_pos,
-            self.sat_vel,
+    def _integrate(
+        self,
+        start_step: int = 0,
+        progress_callback: ProgressCallback | None = None,
+        cancellation_token: CancellationToken | None = None,
+        checkpoint_path: str | PathLike[str] | None = None,
+    ) -> None:
+        num_steps = self.num_steps
+        last_checkpoint_time = perf_counter()
+
+        with record_phase(self.last_run_stats, "integrate") as phase:
+            for start in range(start_step, num_steps, self.CHUNK_SIZE):
+                if cancellation_token is not None:
+                    cancellation_token.raise_if_cancelled()
+
+                end = min(start + self.CHUNK_SIZE, num_steps)
+                state = self._integrate_chunk(start, end)
+                phase.num_steps = end - start_step
+
+                if checkpoint_path is not None and (
+                    end == num_steps or perf_counter() - last_checkpoint_time >= self.checkpoint_interval
+                ):
+                    self._checkpoint(end, state).save(checkpoint_path)
+                    last_checkpoint_time = perf_counter()
+
+                if progress_callback is not None:
+                    progress_callback(end, num_steps)
+
+    def _integrate_chunk(self, start: int, end: int) -> Array2D:
+        """Integrates from step start to step end. The row of step start must already be filled in.
+        Returns the positions and velocities after step end, with rows in the order of POSITION_AND_VELOCITY_NAMES.
+        """
+        if self._scratch is not None:
+            return self._integrate_chunk_in_scratch(start, end, self._scratch)
+
+        # slicing rows of a C-contiguous array gives a C-contiguous view
+        # so this doesn't trigger a recompilation of the kernel
+        rows = slice(start, end + 1)
+        arrays = [getattr(self, name)[rows] for name in POSITION_AND_VELOCITY_NAMES]
+
+        # the scalars are converted to floats so that they match the signature compiled by the warm-up
+        self._integration_kernel()(
+            float(self.time_step_in_seconds),
+            end - start,
+            float(self.star_mass),
+            float(self.planet_mass),
+            *arrays,
+        )
+
+        return np.array([arr[-1] for arr in arrays])
+
+    def _integrate_chunk_in_scratch(self, start: int, end: int, scratch: Array2D) -> Array2D:
+        """Integrates from step start, whose row is the first of scratch, to step end in scratch,
+        then copies the recorded steps to the arrays, rounding them to the arrays' precision,
+        and writes every step to the stream.
+        """
+        num_steps = end - start
+        rows = scratch[:, : num_steps + 1]
+
+        self._integration_kernel()(
+            float(self.time_step_in_seconds),
+            num_steps,
+            float(self.star_mass),
+            float(self.planet_mass),
+            *rows,
         )
 
+        # the recorded steps after start, and the last step.
+        # they're copied as slices, since copying with an index array is several times slower
+        record_every = self.record_every
+        first_step = -(-(start + 1) // record_every) * record_every
+        first_row = first_step // record_every
+        for name, arr in zip(POSITION_AND_VELOCITY_NAMES, rows, strict=True):
+            recorded = arr[first_step - start :: record_every]
+            getattr(self, name)[first_row : first_row + len(recorded)] = recorded
+
+            if end == self.num_steps:
+                getattr(self, name)[-1] = arr[-1]
+
+        if self._stream_writer is not None:
+            # the last row is the first of the next chunk, except after the last step
+            written = rows if end == self.num_steps else rows[:, :-1]
+            self._stream_writer.write(
+                self._time_points_of_steps(np.arange(start, start + written.shape[1])), list(written)
+            )
+
+        state = rows[:, -1].copy()
+        scratch[:, 0] = state
+
+        return state
+
+    def _integration_kernel(self) -> Callable[..., None]:
+        if self.kernel_variant not in INTEGRATION_KERNELS:
+            msg = f"Unknown kernel variant '{self.kernel_variant}'. Must be one of {tuple(INTEGRATION_KERNELS)}."
+            raise ValueError(msg)
+
+        return cast(Callable[..., None], getattr(kernels, INTEGRATION_KERNELS[self.kernel_variant]))
+
     A = TypeVar("A", Array1D, Array2D)
 
     def calc_center_of_mass(
@@ -298,27 +782,57 @@ class Simulator:
             self.star_mass * star_pos_or_vel + self.planet_mass * planet_pos_or_vel + self.SAT_MASS * sat_pos_or_vel
         ) / (self.star_mass + self.planet_mass + self.SAT_MASS)
 
-    def transform_to_corotating(self, pos_trans: Array2D) -> Array2D:
-        angular_speed = self.angular_speed * np.sign(self.time_step_in_seconds)
-        return nb_transform_to_corotating(pos_trans, self.time_points(), angular_speed)
+    def transform_to_corotating(
+        self,
+        pos_trans: Array2D,
+        time_points: Array1D | None = None,
+        *,
+        record: bool = True,
+    ) -> Array2D:
+        """Transforms pos_trans to the frame co-rotating with the star and planet.
+        time_points are the times of each position. By default, they are the result of the time_points method.
+        record is whether the call is added to last_run_stats. Previews of a simulation which is still running,
+        from another thread, shouldn't be, since they would be counted as part of its run.
+        """
+        with record_phase(self.last_run_stats if record else None, "transform_to_corotating") as phase:
+            if time_points is None:
+                time_points = self.time_points()
+
+            angular_speed = float(self.angular_speed * np.sign(self.time_step_in_seconds))
+            transform = dispatch.kernel("transform_to_corotating", len(pos_trans))
+            corotating_pos = transform(as_double(pos_trans), time_points, angular_speed)
+
+            phase.num_steps = len(pos_trans)
+            phase.bytes_allocated = corotating_pos.nbytes
+
+        return corotating_pos
 
     def calc_conserved_quantities(self) -> tuple[Array2D, Array2D, Array1D]:
-        total_momentum = self.calc_total_linear_momentum()
-        total_angular_momentum = self.calc_total_angular_momentum()
-        total_energy = self.calc_total_energy()
+        with record_phase(self.last_run_stats, "calc_conserved_quantities") as phase:
+            total_momentum = self.calc_total_linear_momentum()
+            total_angular_momentum = self.calc_total_angular_momentum()
+            total_energy = self.calc_total_energy()
+
+            phase.num_steps = len(total_energy)
+            phase.bytes_allocated = total_momentum.nbytes + total_angular_momentum.nbytes + total_energy.nbytes
 
         return total_momentum, total_angular_momentum, total_energy
 
+    # the quantities are calculated in double precision since they overflow single precision
     def calc_total_linear_momentum(self) -> Array2D:
-        return self.star_mass * self.star_vel + self.planet_mass * self.planet_vel + self.SAT_MASS * self.sat_vel
+        return (
+            self.star_mass * as_double(self.star_vel)
+            + self.planet_mass * as_double(self.planet_vel)
+            + self.SAT_MASS * as_double(self.sat_vel)
+        )
 
     # noinspection PyUnreachableCode,PyUnusedLocal
     def calc_total_angular_momentum(self) -> Array2D:
-        star_angular_momentum = np.cross(self.star_pos, self.star_mass * self.star_vel)
+        star_angular_momentum = np.cross(as_double(self.star_pos), self.star_mass * as_double(self.star_vel))
 
-        planet_angular_momentum = np.cross(self.planet_pos, self.planet_mass * self.planet_vel)
+        planet_angular_momentum = np.cross(as_double(self.planet_pos), self.planet_mass * as_double(self.planet_vel))
 
-        sat_angular_momentum = np.cross(self.sat_pos, self.SAT_MASS * self.sat_vel)
+        sat_angular_momentum = np.cross(as_double(self.sat_pos), self.SAT_MASS * as_double(self.sat_vel))
 
         return star_angular_momentum + planet_angular_momentum + sat_angular_momentum  # type: ignore[return-value]
 
@@ -344,3 +858,47 @@ class Simulator:
         )
 
         return potential_energy + kinetic_energy
+
+    def calc_jacobi_constant(self) -> Array1D:
+        """Returns the satellite's Jacobi integral per unit mass at each step.
+        Unlike the total energy, which is dominated by the star and planet, it only depends on the satellite
+        so it's far more sensitive to the error in the satellite's orbit.
+        """
+        with record_phase(self.last_run_stats, "calc_jacobi_constant") as phase:
+            jacobi_constant = dispatch.kernel("calc_jacobi_constant", len(self.sat_pos))(
+                float(self.angular_speed),
+                float(self.star_mass),
+                float(self.planet_mass),
+                as_double(self.star_pos),
+                as_double(self.planet_pos),
+                as_double(self.sat_pos),
+                as_double(self.sat_vel),
+            )
+
+            phase.num_steps = len(jacobi_constant)
+            phase.bytes_allocated = jacobi_constant.nbytes
+
+        return jacobi_constant
+
+    def calc_jacobi_drift(self) -> dict[str, float]:
+        """Summarizes the relative change in the Jacobi constant from the step the simulation started,
+        or was resumed, from: its largest and final absolute values, and its rate of change per year
+        fitted by least squares, which separates a steady drift from oscillations.
+        Sweeps can use these to pick the largest time step whose drift is acceptable.
+        """
+        start = self.resumed_from_step
+
+        jacobi_constant = self.calc_jacobi_constant()[start:]
+        relative_change = jacobi_constant / jacobi_constant[0] - 1
+        times_in_years = self.time_points_in_years()[start:]
+
+        drift_per_year = 0.0
+        if len(relative_change) > 1:
+            drift_per_year = float(np.polyfit(times_in_years, relative_change, 1)[0])
+
+        return {
+            "initial": float(jacobi_constant[0]),
+            "max_relative_change": float(np.abs(relative_change).max()),
+            "final_relative_change": float(relative_change[-1]),
+            "relative_drift_per_year": drift_per_year,
+        }
@@ -0,0 +1,176 @@
+"""Chooses the largest time step which integrates a simulation to within a tolerance,
+from short pilot integrations instead of a guess.
+
+The accuracy of a step is measured by the largest relative change in the satellite's Jacobi constant,
+which is conserved by the exact orbit and is far more sensitive to the error in the satellite's orbit than
+the total energy. The pilots integrate the first PILOT_ORBITS orbits of the planet, or the whole simulation if it's
+shorter, with PILOT_STEPS_PER_ORBIT steps per orbit. The drift of a method of order p shrinks as the p-th power
+of the time step, so the order is fitted to the pilots' drifts and the step which would meet the tolerance is
+extrapolated from the pilot closest to it. The fitted order is kept between the integrator's order, 2,
+and twice that, since near the Lagrange points the drift can shrink faster than the order for a while.
+The extrapolated step is checked with one more pilot, and made smaller until it meets the tolerance.
+
+The pilots only cover the first few orbits, so a satellite which later passes closer to the star or planet
+than it does in them can drift by more than the tolerance.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from src.lagrangepointsimulator.constants import HOURS, YEARS
+
+if TYPE_CHECKING:
+    from src.lagrangepointsimulator.simulator import Simulator
+
+# largest relative change in the Jacobi constant
+DEFAULT_TOLERANCE = 1e-7
+
+# drifts below this are dominated by rounding errors rather than the time step, so tolerances must be larger
+ROUNDING_FLOOR = 1e-12
+
+# order of the drift-kick-drift integrator
+INTEGRATOR_ORDER = 2
+
+PILOT_ORBITS = 10
+
+PILOT_STEPS_PER_ORBIT = (250, 500, 1000)
+
+# the time step is kept between these numbers of steps per orbit of the planet
+MIN_STEPS_PER_ORBIT = 100
+
+MAX_STEPS_PER_ORBIT = 10**6
+
+# factor the extrapolated time steps are multiplied by so that they meet the tolerance despite small fitting errors
+SAFETY_FACTOR = 0.9
+
+# number of times the time step is made smaller if it doesn't meet the tolerance
+MAX_REFINEMENTS = 5
+
+# smallest factor the time step is made smaller by in one refinement
+MIN_REFINEMENT_FACTOR = 0.1
+
+
+@dataclass(frozen=True)
+class TimeStepChoice:
+    # in hours, with the sign of the simulation's time step
+    time_step: float
+    tolerance: float
+    # largest relative change in the Jacobi constant in the pilot with time_step
+    drift: float
+    # fitted order of the drift
+    order: float
+    steps_per_orbit: float
+    # in hours, the pilots with PILOT_STEPS_PER_ORBIT and those checking the chosen time step
+    pilot_time_steps: tuple[float, ...]
+    pilot_drifts: tuple[float, ...]
+
+    @property
+    def met_tolerance(self) -> bool:
+        """False if even MAX_STEPS_PER_ORBIT steps per orbit, or MAX_REFINEMENTS refinements, weren't enough."""
+        return self.drift <= self.tolerance
+
+    def describe(self) -> str:
+        chosen = (
+            f"Chose a time step of {self.time_step:.4g} hours, {self.steps_per_orbit:.0f} steps per orbit, "
+            f"which changed the Jacobi constant by {self.drift:.2g} in the pilot simulations"
+        )
+
+        if self.met_tolerance:
+            return f"{chosen}."
+
+        return f"{chosen}, more than the tolerance of {self.tolerance:.2g}. The simulation may be less accurate."
+
+
+def pilot_drift(sim: "Simulator", time_step_in_seconds: float, num_years: float) -> float:
+    """Returns the largest relative change in the Jacobi constant when sim's parameters are simulated
+    for num_years with time_step_in_seconds, or infinity if the orbit isn't finite. sim isn't modified.
+    """
+    pilot = type(sim)(**sim.params())
+    pilot.num_years = num_years
+    pilot.time_step = time_step_in_seconds / HOURS
+    pilot.kernel_variant = sim.kernel_variant
+
+    pilot.simulate()
+
+    drift = pilot.calc_jacobi_drift()["max_relative_change"]
+
+    return drift if np.isfinite(drift) else np.inf
+
+
+def fit_order(time_steps: list[float], drifts: list[float]) -> float:
+    """Returns the order of the drifts fitted by least squares in log space, kept between INTEGRATOR_ORDER and
+    twice that. Drifts below ROUNDING_FLOOR, or infinite, are ignored,
+    and INTEGRATOR_ORDER is returned if fewer than 2 are left.
+    """
+    usable = [(time_step, drift) for time_step, drift in zip(time_steps, drifts, strict=True) if _usable(drift)]
+
+    if len(usable) < 2:  # noqa: PLR2004
+        return float(INTEGRATOR_ORDER)
+
+    log_time_steps, log_drifts = np.log(np.array(usable)).T
+    order = float(np.polyfit(log_time_steps, log_drifts, 1)[0])
+
+    return float(np.clip(order, INTEGRATOR_ORDER, 2 * INTEGRATOR_ORDER))
+
+
+def _usable(drift: float) -> bool:
+    return ROUNDING_FLOOR < drift < np.inf
+
+
+def choose_time_step(sim: "Simulator", tolerance: float = DEFAULT_TOLERANCE) -> TimeStepChoice:
+    """Returns the largest time step for sim's parameters whose pilot's Jacobi constant changes by at most tolerance,
+    relative to its initial value, as described in the module's docstring. sim isn't modified.
+    Raises a ValueError if tolerance isn't larger than ROUNDING_FLOOR.
+    """
+    if tolerance <= ROUNDING_FLOOR:
+        msg = f"The tolerance must be larger than {ROUNDING_FLOOR:g}, below which rounding errors dominate."
+        raise ValueError(msg)
+
+    period = sim.orbital_period
+    num_years = min(sim.num_years, PILOT_ORBITS * period / YEARS)
+    direction = -1.0 if sim.time_step < 0 else 1.0
+
+    time_steps = [period / steps_per_orbit for steps_per_orbit in PILOT_STEPS_PER_ORBIT]
+    drifts = [pilot_drift(sim, direction * time_step, num_years) for time_step in time_steps]
+
+    order = fit_order(time_steps, drifts)
+
+    # the step is extrapolated from the pilot whose drift is closest to the tolerance, since the order is only fitted
+    usable = [i for i, drift in enumerate(drifts) if _usable(drift)]
+    if usable:
+        closest = min(usable, key=lambda i: abs(np.log(drifts[i] / tolerance)))
+        time_step = SAFETY_FACTOR * time_steps[closest] * (tolerance / drifts[closest]) ** (1 / order)
+    else:
+        time_step = period / MIN_STEPS_PER_ORBIT
+
+    min_time_step = period / MAX_STEPS_PER_ORBIT
+    max_time_step = min(period / MIN_STEPS_PER_ORBIT, sim.num_years * YEARS)
+
+    time_step = float(np.clip(time_step, min_time_step, max_time_step))
+    drift = pilot_drift(sim, direction * time_step, num_years)
+    time_steps.append(time_step)
+    drifts.append(drift)
+
+    # the chosen time step is always the last one piloted
+    for _ in range(MAX_REFINEMENTS):
+        if drift <= tolerance or time_step == min_time_step:
+            break
+
+        # the integrator's order is the slowest the drift can shrink so it makes the step small enough soonest
+        time_step *= max(SAFETY_FACTOR * (tolerance / drift) ** (1 / INTEGRATOR_ORDER), MIN_REFINEMENT_FACTOR)
+        time_step = float(np.clip(time_step, min_time_step, max_time_step))
+
+        drift = pilot_drift(sim, direction * time_step, num_years)
+        time_steps.append(time_step)
+        drifts.append(drift)
+
+    return TimeStepChoice(
+        time_step=direction * time_step / HOURS,
+        tolerance=tolerance,
+        drift=drift,
+        order=order,
+        steps_per_orbit=period / time_step,
+        pilot_time_steps=tuple(direction * step / HOURS for step in time_steps),
+        pilot_drifts=tuple(drifts),
+    )
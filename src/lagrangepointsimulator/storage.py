@@ -0,0 +1,238 @@
+"""Chooses how a Simulator stores its trajectory so that a simulation doesn't need more memory than a budget.
+The storage modes are:
+"full": every step is stored in memory.
+"decimated": every record_every-th step, and the last step, are stored in memory,
+with record_every as small as the budget allows.
+"memmap": every step is stored in a temporary file which is memory-mapped, so the operating system writes
+the parts which don't fit in memory to disk instead of swapping.
+"streaming": every step is written to a run file, see trajectory_io, while it's integrated
+and a decimated copy is stored in memory.
+
+With "auto", every step is stored in memory if it fits in the budget. Otherwise, the run is streamed
+if a stream path is given, memory-mapped if a memmap directory is given, and decimated if neither is.
+Simulations which need every step, which are resumed and Parareal simulations, are memory-mapped instead.
+An output stride larger than 1 stores at most 1 in output_stride steps even if every step fits, by decimating
+or streaming, for simulations which are evaluated between their rows with dense_output instead.
+
+The steps are always integrated in double precision but can be recorded in single precision, "float32",
+which halves the memory the arrays need. Single precision has about 7 significant digits, which rounds positions
+near 1 AU to within about 10 km, so it's enough for plotting but not for measuring the conserved quantities' drift.
+With the "contiguous" layout the six arrays are rows of a single block, as they are when memory-mapped,
+instead of separate allocations.
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from math import ceil
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.lagrangepointsimulator.sim_types import Array2D
+
+STORAGE_MODES = ("auto", "full", "decimated", "memmap", "streaming")
+
+RECORD_DTYPES = ("float64", "float32")
+
+LAYOUTS = ("separate", "contiguous")
+
+# if set, the default memory budget in bytes
+MEMORY_BUDGET_ENV_VAR = "LAGRANGE_SIM_MEMORY_BUDGET"
+
+# default memory budget if the amount of physical memory can't be found
+FALLBACK_MEMORY_BUDGET = 4 * 2**30
+
+
+def bytes_per_row(record_dtype: str = "float64") -> int:
+    """Returns the bytes per step of the positions and velocities of the star, planet and satellite."""
+    return 6 * 3 * np.dtype(record_dtype).itemsize
+
+
+BYTES_PER_ROW = bytes_per_row()
+
+
+@dataclass(frozen=True)
+class StoragePlan:
+    mode: str
+    # the arrays hold every record_every-th step and the last step
+    record_every: int
+    num_rows: int
+    # bytes needed to store every step
+    bytes_required: int
+    memory_budget: int
+    record_dtype: str = "float64"
+    layout: str = "separate"
+
+    def describe(self) -> str:
+        required = _format_bytes(self.bytes_required)
+        budget = _format_bytes(self.memory_budget)
+        stored = _format_bytes(self.num_rows * bytes_per_row(self.record_dtype))
+        precision = " in single precision" if self.record_dtype == "float32" else ""
+
+        match self.mode:
+            case "full":
+                return f"Stored every step in memory{precision}, {required}."
+
+            case "decimated" if self.bytes_required <= self.memory_budget:
+                return f"Stored 1 in {self.record_every} steps in memory{precision}, {stored} of {required}."
+
+            case "decimated":
+                return (
+                    f"Stored 1 in {self.record_every} steps in memory{precision}, {stored} of {required}, "
+                    f"to fit in {budget}."
+                )
+
+            case "memmap":
+                return (
+                    f"Stored every step in a memory-mapped file{precision}, {required}, "
+                    f"since it doesn't fit in {budget}."
+                )
+
+            case _:
+                return (
+                    f"Streamed every step to a file, {required}, and stored 1 in {self.record_every} "
+                    f"in memory{precision}."
+                )
+
+
+def _format_bytes(num_bytes: int) -> str:
+    if num_bytes < 2**30:
+        return f"{num_bytes / 2**20:.3g} MiB"
+
+    return f"{num_bytes / 2**30:.3g} GiB"
+
+
+def default_memory_budget() -> int:
+    """Returns the budget in bytes set in the environment variable MEMORY_BUDGET_ENV_VAR
+    or otherwise half of the physical memory.
+    """
+    if budget := os.environ.get(MEMORY_BUDGET_ENV_VAR):
+        return int(float(budget))
+
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        # sysconf isn't available on Windows
+        return FALLBACK_MEMORY_BUDGET
+
+
+def output_steps(num_steps: int, output_stride: int) -> NDArray[np.int64]:
+    """Returns every output_stride-th step, including the first and last steps."""
+    steps = np.arange(0, num_steps + 1, output_stride, dtype=np.int64)
+
+    if steps[-1] != num_steps:
+        steps = np.append(steps, np.int64(num_steps))
+
+    return steps
+
+
+def num_output_steps(num_steps: int, output_stride: int) -> int:
+    """Returns the length of output_steps(num_steps, output_stride) without creating it."""
+    return num_steps // output_stride + 1 + (num_steps % output_stride != 0)
+
+
+def plan_storage(
+    num_steps: int,
+    memory_budget: int,
+    storage: str = "auto",
+    *,
+    every_step: bool = False,
+    stream: bool = False,
+    memmap: bool = False,
+    record_dtype: str = "float64",
+    layout: str = "separate",
+    output_stride: int = 1,
+) -> StoragePlan:
+    """Returns how to store a simulation of num_steps steps, either in the storage mode or,
+    if it's "auto", in the mode chosen as described in the module's docstring.
+    every_step is whether the simulation needs every step stored,
+    and stream and memmap are whether a stream path and a memmap directory are given.
+    The steps are recorded in record_dtype, one of RECORD_DTYPES, in arrays with layout, one of LAYOUTS.
+    The decimated and streaming modes store at most 1 in output_stride steps, which the full and memmap modes ignore.
+    Raises a ValueError if the mode, dtype or layout is unknown, output_stride isn't positive, or the mode
+    doesn't store every step when every_step is True.
+    """
+    if storage not in STORAGE_MODES:
+        msg = f"Unknown storage mode '{storage}'. Must be one of {STORAGE_MODES}."
+        raise ValueError(msg)
+
+    if record_dtype not in RECORD_DTYPES:
+        msg = f"Unknown record dtype '{record_dtype}'. Must be one of {RECORD_DTYPES}."
+        raise ValueError(msg)
+
+    if layout not in LAYOUTS:
+        msg = f"Unknown layout '{layout}'. Must be one of {LAYOUTS}."
+        raise ValueError(msg)
+
+    if output_stride < 1:
+        msg = f"The output stride must be positive, not {output_stride}."
+        raise ValueError(msg)
+
+    row_bytes = bytes_per_row(record_dtype)
+    bytes_required = (num_steps + 1) * row_bytes
+
+    mode = storage
+    if storage == "auto":
+        mode = _auto_mode(
+            fits=bytes_required <= memory_budget,
+            every_step=every_step,
+            stream=stream,
+            memmap=memmap,
+            output_stride=output_stride,
+        )
+
+    if every_step and mode in ("decimated", "streaming"):
+        msg = f"This simulation needs every step to be stored so it can't use the storage mode '{mode}'."
+        raise ValueError(msg)
+
+    record_every = 1
+    if mode in ("decimated", "streaming"):
+        # the first and last steps can be extra rows
+        max_rows = max(memory_budget // row_bytes - 2, 1)
+        record_every = max(1, min(max(ceil(num_steps / max_rows), output_stride), num_steps))
+
+    return StoragePlan(
+        mode,
+        record_every,
+        num_output_steps(num_steps, record_every),
+        bytes_required,
+        memory_budget,
+        record_dtype,
+        layout,
+    )
+
+
+def _auto_mode(*, fits: bool, every_step: bool, stream: bool, memmap: bool, output_stride: int) -> str:
+    if fits and (every_step or output_stride == 1):
+        return "full"
+
+    if every_step:
+        return "memmap"
+
+    if stream:
+        return "streaming"
+
+    return "memmap" if memmap and output_stride == 1 else "decimated"
+
+
+def allocate_arrays(num_rows: int, record_dtype: str = "float64", layout: str = "separate") -> list[Array2D]:
+    """Returns six C-contiguous arrays of num_rows rows of record_dtype,
+    which are rows of a single block if layout is "contiguous".
+    """
+    if layout == "contiguous":
+        return list(np.empty((6, num_rows, 3), dtype=record_dtype))
+
+    return [np.empty((num_rows, 3), dtype=record_dtype) for _ in range(6)]
+
+
+def allocate_memmap(num_rows: int, directory: Path | None = None, record_dtype: str = "float64") -> list[Array2D]:
+    """Returns six C-contiguous arrays of num_rows rows of record_dtype which are memory-mapped from a temporary file
+    in directory, by default the system's temporary directory. The file is deleted once the arrays are no longer used.
+    """
+    with tempfile.TemporaryFile(dir=directory) as file:
+        block = np.memmap(file, dtype=record_dtype, mode="w+", shape=(6, num_rows, 3))
+
+    # the map stays valid after the file is closed.
+    # the kernels are compiled for plain arrays so the rows of the block are viewed as them
+    return [np.asarray(arr) for arr in block]
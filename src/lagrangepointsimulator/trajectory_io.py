@@ -0,0 +1,434 @@
+"""Saves the results of a Simulator to, and loads them from, a single file
+so that a run can be replayed or shared without simulating it again.
+
+The file is a zip archive, like NumPy's npz files, containing:
+
+    metadata.json: the format version, the Simulator's parameters, the number of steps,
+    a summary of how well the conserved quantities were conserved and the statistics of the run.
+
+    lagrange_point_trans.npy: the position of the Lagrange point in the center of mass frame.
+
+    <array name>/<chunk index>.npy: consecutive chunks of rows of the time points, positions and velocities.
+
+The chunks are compressed by default. Uncompressed files with a single chunk per array
+can be memory-mapped when they're loaded so that only the parts that are used are read from disk.
+
+A decimated run, which only stores every record_every-th step, is saved and loaded as it is.
+RunWriter saves every step of a run while it's simulated, which Simulator uses to stream runs which don't fit
+in its memory budget.
+"""
+import copy
+import json
+import zipfile
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import Path
+from typing import IO, Any, Self, cast
+
+import numpy as np
+from numpy.linalg import norm
+
+from src.lagrangepointsimulator.sim_types import Array1D, Array2D
+from src.lagrangepointsimulator.simulator import POSITION_AND_VELOCITY_NAMES, Simulator
+from src.lagrangepointsimulator.storage import num_output_steps
+
+FORMAT_NAME = "lagrange-simulator-run"
+
+FORMAT_VERSION = 1
+
+METADATA_NAME = "metadata.json"
+
+LAGRANGE_POINT_NAME = "lagrange_point_trans.npy"
+
+ARRAY_NAMES = ("time_points", *POSITION_AND_VELOCITY_NAMES)
+
+# low compression levels are much faster and the positions and velocities barely compress further at higher levels
+COMPRESS_LEVEL = 1
+
+# size of a zip file's local file header before the file name and extra field
+_LOCAL_HEADER_SIZE = 30
+
+
+def summarize_invariants(sim: Simulator, chunk_size: int = Simulator.CHUNK_SIZE) -> dict[str, dict[str, float]]:
+    """Returns the initial and final values of the conserved quantities of a simulated Simulator,
+    including the satellite's Jacobi constant, and the largest relative change in each of them.
+    The linear momentum is normalized by the initial momentum of the planet, as it is in the plots,
+    since the total linear momentum is initially approximately 0.
+    The quantities are calculated chunk_size steps at a time so that the full arrays of them are never allocated.
+    The summary of a resumed simulation starts at the step it was resumed from, since the rows before it aren't
+    available.
+    """
+    summary = _InvariantSummary(sim)
+
+    for start in range(sim.resumed_from_step, len(sim.star_pos), chunk_size):
+        summary.add([getattr(sim, name)[start : start + chunk_size] for name in POSITION_AND_VELOCITY_NAMES])
+
+    return summary.result()
+
+
+class _InvariantSummary:
+    """Accumulates the summary returned by summarize_invariants over consecutive chunks of a Simulator's rows."""
+
+    def __init__(self, sim: Simulator) -> None:
+        # shallow copies share the parameters of sim but their arrays can be replaced with a chunk of rows
+        self._chunk_sim = copy.copy(sim)
+
+        self._init_planet_momentum = 0.0
+        self._initial: dict[str, float] = {}
+        self._final: dict[str, float] = {}
+        self._max_relative_change = dict.fromkeys(
+            ("linear_momentum", "angular_momentum", "energy", "jacobi_constant"),
+            0.0,
+        )
+
+    def add(self, arrays: Sequence[Array2D]) -> None:
+        """Adds the next rows of the positions and velocities, in the order of POSITION_AND_VELOCITY_NAMES."""
+        chunk_sim = self._chunk_sim
+        for name, arr in zip(POSITION_AND_VELOCITY_NAMES, arrays, strict=True):
+            setattr(chunk_sim, name, arr)
+
+        if not self._initial:
+            self._init_planet_momentum = float(norm(chunk_sim.planet_mass * chunk_sim.planet_vel[0]))
+
+        total_momentum, total_angular_momentum, total_energy = chunk_sim.calc_conserved_quantities()
+
+        quantities = {
+            "linear_momentum": norm(total_momentum, axis=1) / self._init_planet_momentum,
+            "angular_momentum": total_angular_momentum[:, 2],
+            "energy": total_energy,
+            "jacobi_constant": chunk_sim.calc_jacobi_constant(),
+        }
+
+        if not self._initial:
+            self._initial = {name: float(quantity[0]) for name, quantity in quantities.items()}
+
+        for name, quantity in quantities.items():
+            # the linear momentum is already relative to the planet's momentum
+            change = quantity if name == "linear_momentum" else quantity / self._initial[name] - 1
+            self._max_relative_change[name] = max(self._max_relative_change[name], float(np.abs(change).max()))
+
+            self._final[name] = float(quantity[-1])
+
+    def result(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {"initial": self._initial[name], "final": self._final[name], "max_relative_change": change}
+            for name, change in self._max_relative_change.items()
+        }
+
+
+def save_run(
+    sim: Simulator,
+    path: str | PathLike[str],
+    *,
+    compress: bool = True,
+    chunk_size: int | None = None,
+) -> None:
+    """Saves the parameters and results of a simulated Simulator to path.
+    Arrays are split into chunks of chunk_size rows which by default is Simulator.CHUNK_SIZE if compress is True.
+    Otherwise, each array is saved as a single chunk, which allows the file to be memory-mapped when loaded.
+    """
+    num_rows = num_output_steps(sim.num_steps, sim.record_every)
+    if len(sim.star_pos) != num_rows:
+        msg = "The simulator's results don't match its parameters. It must be simulated before it can be saved."
+        raise ValueError(msg)
+
+    if chunk_size is None:
+        chunk_size = Simulator.CHUNK_SIZE if compress else num_rows
+
+    if chunk_size <= 0:
+        msg = "chunk_size must be positive."
+        raise ValueError(msg)
+
+    metadata = _metadata(sim, chunk_size, -(-num_rows // chunk_size), summarize_invariants(sim))
+
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+
+    with zipfile.ZipFile(path, "w", compression=compression, compresslevel=COMPRESS_LEVEL) as archive:
+        archive.writestr(METADATA_NAME, json.dumps(metadata, indent=2))
+
+        _write_array(archive, LAGRANGE_POINT_NAME, sim.lagrange_point_trans)
+
+        time_points = sim.time_points()
+        for name in ARRAY_NAMES:
+            arr = time_points if name == "time_points" else getattr(sim, name)
+
+            for chunk_index, start in enumerate(range(0, num_rows, chunk_size)):
+                _write_array(archive, _chunk_name(name, chunk_index), arr[start : start + chunk_size])
+
+
+def _metadata(
+    sim: Simulator,
+    chunk_size: int,
+    num_chunks: int,
+    invariants: dict[str, dict[str, float]],
+) -> dict[str, Any]:
+    return {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "params": sim.params(),
+        "num_steps": sim.num_steps,
+        # the arrays hold every record_every-th step and the last step. Files from before decimation don't have it
+        "record_every": sim.record_every,
+        # the rows before it are NaN. Files from before this was saved don't have it
+        "resumed_from_step": sim.resumed_from_step,
+        "chunk_size": chunk_size,
+        "num_chunks": num_chunks,
+        "invariants": invariants,
+        "run_stats": sim.last_run_stats.to_dict() if sim.last_run_stats is not None else None,
+    }
+
+
+class RunWriter:
+    """Writes every step of a Simulator's run to path, in the format of save_run, chunk by chunk
+    while it is integrated so that the whole trajectory never has to be held in memory.
+    The file is only complete once close is called, after the last step was written.
+    """
+
+    def __init__(self, sim: Simulator, path: str | PathLike[str], *, compress: bool = True) -> None:
+        self.path = Path(path)
+        self._sim = sim
+        self._num_chunks = 0
+        self._num_rows = 0
+        self._invariants = _InvariantSummary(sim)
+
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._archive = zipfile.ZipFile(self.path, "w", compression=compression, compresslevel=COMPRESS_LEVEL)
+
+    def write(self, time_points: Array1D, arrays: Sequence[Array2D]) -> None:
+        """Writes the next rows of the time points, positions and velocities,
+        in the order of POSITION_AND_VELOCITY_NAMES, as a chunk.
+        """
+        for name, arr in zip(ARRAY_NAMES, (time_points, *arrays), strict=True):
+            _write_array(self._archive, _chunk_name(name, self._num_chunks), arr)
+
+        self._invariants.add(arrays)
+        self._num_chunks += 1
+        self._num_rows += len(time_points)
+
+    def close(self, *, completed: bool = True) -> None:
+        """Finishes the file, or deletes it if the run wasn't completed."""
+        sim = self._sim
+
+        if not completed:
+            self._archive.close()
+            self.path.unlink(missing_ok=True)
+            return
+
+        if self._num_rows != sim.num_steps + 1:
+            self._archive.close()
+            msg = f"Only {self._num_rows} of the {sim.num_steps + 1} rows of the run were written to {self.path}."
+            raise ValueError(msg)
+
+        # every step is written so the file isn't decimated, whatever the simulator's arrays are
+        metadata = _metadata(sim, Simulator.CHUNK_SIZE, self._num_chunks, self._invariants.result())
+        metadata["record_every"] = 1
+
+        with self._archive:
+            self._archive.writestr(METADATA_NAME, json.dumps(metadata, indent=2))
+            _write_array(self._archive, LAGRANGE_POINT_NAME, sim.lagrange_point_trans)
+
+
+def load_run(path: str | PathLike[str], *, mmap: bool = True) -> Simulator:
+    """Returns a Simulator with the parameters and results saved in path.
+    It can be plotted straight away without calling its simulate method.
+    If mmap is True, arrays saved uncompressed in a single chunk are memory-mapped copy-on-write
+    so that they are only read as they are used and modifying them doesn't modify the file.
+    """
+    with TrajectoryFile(path) as trajectory:
+        return trajectory.to_simulator(mmap=mmap)
+
+
+@dataclass(frozen=True)
+class _ChunkLocation:
+    # offset of the array's data from the start of the file
+    offset: int
+    shape: tuple[int, ...]
+    dtype: np.dtype[Any]
+    fortran_order: bool
+
+
+class TrajectoryFile:
+    """A file written by save_run. Only the metadata is read when it's opened.
+    Arrays are read when requested, either in full or chunk by chunk.
+    """
+
+    def __init__(self, path: str | PathLike[str]) -> None:
+        self.path = Path(path)
+
+        try:
+            self._archive = zipfile.ZipFile(self.path)
+        except zipfile.BadZipFile as e:
+            msg = f"{self.path} is not a saved simulation."
+            raise ValueError(msg) from e
+
+        try:
+            self.metadata: dict[str, Any] = json.loads(self._archive.read(METADATA_NAME))
+        except KeyError as e:
+            self._archive.close()
+            msg = f"{self.path} is not a saved simulation."
+            raise ValueError(msg) from e
+
+        if self.metadata.get("format") != FORMAT_NAME:
+            self._archive.close()
+            msg = f"{self.path} is not a saved simulation."
+            raise ValueError(msg)
+
+        if self.format_version > FORMAT_VERSION:
+            self._archive.close()
+            msg = (
+                f"{self.path} was saved with format version {self.format_version} "
+                f"but only versions up to {FORMAT_VERSION} can be loaded."
+            )
+            raise ValueError(msg)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._archive.close()
+
+    @property
+    def format_version(self) -> int:
+        return cast(int, self.metadata["format_version"])
+
+    @property
+    def params(self) -> dict[str, Any]:
+        return cast(dict[str, Any], self.metadata["params"])
+
+    @property
+    def num_steps(self) -> int:
+        return cast(int, self.metadata["num_steps"])
+
+    @property
+    def record_every(self) -> int:
+        return cast(int, self.metadata.get("record_every", 1))
+
+    @property
+    def resumed_from_step(self) -> int:
+        return cast(int, self.metadata.get("resumed_from_step", 0))
+
+    @property
+    def num_chunks(self) -> int:
+        return cast(int, self.metadata["num_chunks"])
+
+    @property
+    def invariants(self) -> dict[str, dict[str, float]]:
+        return cast(dict[str, dict[str, float]], self.metadata["invariants"])
+
+    @property
+    def run_stats(self) -> dict[str, Any] | None:
+        return cast(dict[str, Any] | None, self.metadata["run_stats"])
+
+    def read_lagrange_point(self) -> Array1D:
+        return self._read_member(LAGRANGE_POINT_NAME)
+
+    def read_chunk(self, name: str, chunk_index: int) -> Array2D:
+        return self._read_member(_chunk_name(name, chunk_index))
+
+    def iter_chunks(self, name: str) -> Iterator[Array2D]:
+        """Yields the chunks of the array name in order. Only one chunk is held in memory at a time."""
+        for chunk_index in range(self.num_chunks):
+            yield self.read_chunk(name, chunk_index)
+
+    def read_array(self, name: str, *, mmap: bool = False) -> Array2D:
+        """Returns the full array name.
+        If mmap is True and the array is saved uncompressed in a single chunk, it is memory-mapped copy-on-write.
+        """
+        if name not in ARRAY_NAMES:
+            msg = f"Unknown array '{name}'. Must be one of {ARRAY_NAMES}."
+            raise ValueError(msg)
+
+        if mmap and self.num_chunks == 1 and (location := self._locate_stored_chunk(_chunk_name(name, 0))):
+            return cast(
+                Array2D,
+                np.memmap(
+                    self.path,
+                    dtype=location.dtype,
+                    mode="c",
+                    offset=location.offset,
+                    shape=location.shape,
+                    order="F" if location.fortran_order else "C",
+                ),
+            )
+
+        chunks = self.iter_chunks(name)
+        first_chunk = next(chunks)
+
+        num_rows = num_output_steps(self.num_steps, self.record_every)
+        arr = np.empty((num_rows, *first_chunk.shape[1:]), dtype=first_chunk.dtype)
+
+        arr[: len(first_chunk)] = first_chunk
+        start = len(first_chunk)
+        for chunk in chunks:
+            arr[start : start + len(chunk)] = chunk
+            start += len(chunk)
+
+        if start != num_rows:
+            msg = f"{self.path} is corrupt. Array '{name}' has {start} rows but {num_rows} were expected."
+            raise ValueError(msg)
+
+        return arr
+
+    def to_simulator(self, *, mmap: bool = True) -> Simulator:
+        """Returns a Simulator with the saved parameters and results. See load_run."""
+        try:
+            sim = Simulator(**self.params)
+        except TypeError as e:
+            msg = f"{self.path} has invalid parameters.\n{e}"
+            raise ValueError(msg) from e
+
+        sim.lagrange_point_trans = self.read_lagrange_point()
+        sim.record_every = self.record_every
+        sim.resumed_from_step = self.resumed_from_step
+
+        for name in POSITION_AND_VELOCITY_NAMES:
+            setattr(sim, name, self.read_array(name, mmap=mmap))
+
+        return sim
+
+    def _read_member(self, member_name: str) -> Array2D:
+        with self._archive.open(member_name) as file:
+            return cast(Array2D, np.lib.format.read_array(file, allow_pickle=False))
+
+    def _locate_stored_chunk(self, member_name: str) -> _ChunkLocation | None:
+        """Returns the location of the data of an uncompressed chunk in the file,
+        or None if the chunk is compressed.
+        """
+        info = self._archive.getinfo(member_name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+
+        with Path.open(self.path, "rb") as file:
+            # the local header's file name and extra field can differ from the ones in the central directory
+            file.seek(info.header_offset)
+            local_header = file.read(_LOCAL_HEADER_SIZE)
+            name_length = int.from_bytes(local_header[26:28], "little")
+            extra_length = int.from_bytes(local_header[28:30], "little")
+
+            file.seek(info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+            shape, fortran_order, dtype = _read_npy_header(file)
+
+            return _ChunkLocation(file.tell(), shape, dtype, fortran_order)
+
+
+def _read_npy_header(file: IO[bytes]) -> tuple[tuple[int, ...], bool, np.dtype[Any]]:
+    version = np.lib.format.read_magic(file)
+
+    if version == (1, 0):
+        return cast(tuple[tuple[int, ...], bool, np.dtype[Any]], np.lib.format.read_array_header_1_0(file))
+
+    return cast(tuple[tuple[int, ...], bool, np.dtype[Any]], np.lib.format.read_array_header_2_0(file))
+
+
+def _write_array(archive: zipfile.ZipFile, member_name: str, arr: Array2D) -> None:
+    # the size of the member isn't known in advance so zip64 is forced in case it is larger than 4 GiB
+    with archive.open(member_name, "w", force_zip64=True) as file:
+        np.lib.format.write_array(file, np.ascontiguousarray(arr), allow_pickle=False)
+
+
+def _chunk_name(name: str, chunk_index: int) -> str:
+    return f"{name}/{chunk_index:05d}.npy"
@@ -0,0 +1,113 @@
+"""Compiles the Numba kernels before their first use so that the first simulation is as fast as later ones.
+The shared instance kernel_warmup can compile them synchronously with run or in a background thread with start.
+Once the kernels are compiled, the thresholds at which the parallel kernels are used are calibrated, see dispatch.
+Nothing needs to be compiled when the ahead-of-time compiled kernels are used.
+"""
+from threading import Event, Lock, Thread
+from time import perf_counter
+
+from src.lagrangepointsimulator import dispatch
+from src.lagrangepointsimulator.kernels import using_aot
+
+
+def launch_threading_layer() -> None:
+    """Starts Numba's threading layer in the calling thread.
+    Should be called from the main thread before compiling in a background thread
+    because some threading layers, such as TBB, hang on exit if they are first started from another thread.
+    """
+    if using_aot():
+        return
+
+    from numba import get_num_threads  # type: ignore
+
+    # get_num_threads starts the threading layer if it isn't running
+    get_num_threads()
+
+
+class JitWarmup:
+    """Compiles every kernel in numba_funcs with its explicit signature.
+    Kernels that are already in Numba's on-disk cache are loaded instead of compiled.
+    """
+
+    def __init__(self) -> None:
+        self._ready = Event()
+        self._lock = Lock()
+        self._thread: Thread | None = None
+
+        # kernel name: seconds spent compiling or loading it from the cache
+        self.compile_times: dict[str, float] = {}
+        self.error: Exception | None = None
+
+    @property
+    def ready(self) -> bool:
+        """True once the warm-up has finished, even if compiling failed, see compiled."""
+        return self._ready.is_set()
+
+    @property
+    def compiled(self) -> bool:
+        """True once every kernel has been compiled, or if the ahead-of-time compiled kernels are used."""
+        return self.ready and self.error is None
+
+    @property
+    def total_compile_time(self) -> float:
+        return sum(self.compile_times.values())
+
+    def start(self) -> None:
+        """Compiles the kernels in a background thread. Does nothing if the warm-up has already been started."""
+        with self._lock:
+            if self._thread is not None or self.ready:
+                return
+
+            launch_threading_layer()
+
+            self._thread = Thread(target=self.run, name="jit-warmup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until the warm-up has finished or timeout seconds have passed. Returns ready,
+        so compiled should be checked to know whether the kernels were compiled.
+        """
+        return self._ready.wait(timeout)
+
+    def run(self) -> None:
+        """Compiles the kernels in the calling thread.
+        If compilation fails the error is stored and the kernels will be compiled on their first call instead.
+        """
+        if self.ready:
+            return
+
+        if using_aot():
+            self._ready.set()
+            return
+
+        from src.lagrangepointsimulator.numba_funcs import KERNELS_AND_SIGNATURES
+
+        try:
+            for kernel, signature in KERNELS_AND_SIGNATURES:
+                start = perf_counter()
+                kernel.compile(signature)
+                self.compile_times[kernel.__name__] = perf_counter() - start
+
+            # the kernels are compiled so only their run times are measured
+            dispatch.calibrate()
+
+        except Exception as e:  # noqa: BLE001
+            self.error = e
+
+        finally:
+            self._ready.set()
+
+    def summary(self) -> str:
+        if not self.ready:
+            return "Compiling simulation kernels..."
+
+        if using_aot():
+            return "Using precompiled simulation kernels"
+
+        if self.error is not None:
+            return f"Kernel warm-up failed, kernels will be compiled on first use: {self.error}"
+
+        return f"Simulation kernels ready ({self.total_compile_time:.2f} s)"
+
+
+kernel_warmup = JitWarmup()